@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Multi-process FastAGI listener
+
+Several worker processes bind the same AGI port with SO_REUSEPORT, so the
+kernel spreads incoming Asterisk connections across them and session handling
+scales with cores instead of sharing one GIL. Each worker answers its own
+sessions (including forwarding decisions) and forwards the call to the
+Flask/Socket.IO process over a multiprocessing queue, where the parent
+registers it exactly as the in-process AGIServer would.
+
+The spawn start method re-imports the parent's __main__ module in every child,
+which for app_direct_mysql.py would rebuild the Flask app, reconnect to the
+database and open another AMI session per worker. Workers are therefore
+started with this small module standing in as __main__.
+"""
+
+import logging
+import multiprocessing
+import queue
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+
+METRICS_INTERVAL = 5
+
+_main_lock = threading.Lock()
+
+
+def reuse_port_supported():
+    """SO_REUSEPORT load balancing needs Linux 3.9+ (or a BSD); Windows has no equivalent"""
+    return hasattr(socket, 'SO_REUSEPORT')
+
+
+@contextmanager
+def _worker_main():
+    """Make this module the __main__ that spawned children re-import, for the duration of a start()"""
+    with _main_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
+
+
+def run_agi_worker(index, host, port, backlog, max_sessions, events, stop_event,
+                   db_config=None, route_deadline=0.25, default_extension='1412'):
+    """Worker process entry point: serve FastAGI sessions and forward calls to the parent"""
+    from fastagi import FastAGIServer, DEFAULT_REPLY
+    from forwarding import ForwardingRouter, FALLBACK_ROUTE
+
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - agi-worker-{index} - %(levelname)s - %(message)s')
+    logger = logging.getLogger(f"agi-worker-{index}")
+
+    router = None
+    if db_config:
+        import pymysql
+        router = ForwardingRouter(partial(pymysql.connect, **db_config),
+                                  default_extension=default_extension, logger=logger)
+
+    def forward_call(agi_vars):
+        events.put({'type': 'call', 'worker': index, 'agi_vars': agi_vars, 'received_at': time.time()})
+        return DEFAULT_REPLY
+
+    server = FastAGIServer(
+        forward_call,
+        host=host,
+        port=port,
+        backlog=backlog,
+        max_sessions=max_sessions,
+        reuse_port=True,
+        route=router.route if router else None,
+        route_deadline=route_deadline,
+        fallback_commands=FALLBACK_ROUTE,
+        logger=logger
+    )
+    if not server.start():
+        events.put({'type': 'failed', 'worker': index})
+        return
+
+    events.put({'type': 'started', 'worker': index})
+    try:
+        while not stop_event.wait(METRICS_INTERVAL):
+            events.put({'type': 'metrics', 'worker': index, 'data': server.metrics()})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+class AGIWorkerPool:
+    """Run FastAGI worker processes on a shared SO_REUSEPORT port and relay their calls"""
+
+    def __init__(self, on_call, workers=2, host='0.0.0.0', port=5001, backlog=512, max_sessions=500,
+                 db_config=None, route_deadline=0.25, default_extension='1412', logger=None):
+        # Called in this process with each call's agi_* variables
+        self.on_call = on_call
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.max_sessions = max_sessions
+        # Workers open their own MySQL connections to read forwarding rules
+        self.db_config = db_config
+        self.route_deadline = route_deadline
+        self.default_extension = default_extension
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.calls_relayed = 0
+        self.worker_restarts = 0
+        self.worker_metrics = {}
+        self.relay_lag_max_ms = 0.0
+
+        # spawn keeps Flask, eventlet and open sockets out of the workers
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._stop_event = self._context.Event()
+        self._processes = {}
+        self._relay_thread = None
+
+    def start(self, timeout=15):
+        """Start the workers and wait until every one is listening"""
+        if not reuse_port_supported():
+            self.logger.error("SO_REUSEPORT is not available on this platform")
+            return False
+
+        for index in range(self.workers):
+            self._spawn(index)
+
+        started, deadline = set(), time.time() + timeout
+        while len(started) < self.workers and time.time() < deadline:
+            try:
+                event = self._events.get(timeout=max(deadline - time.time(), 0.01))
+            except queue.Empty:
+                break
+            if event['type'] == 'started':
+                started.add(event['worker'])
+            elif event['type'] == 'failed':
+                break
+            elif event['type'] == 'call':
+                self._relay(event)
+
+        if len(started) < self.workers:
+            self.logger.error(f"Only {len(started)}/{self.workers} AGI workers started on port {self.port}")
+            self.stop()
+            return False
+
+        self.running = True
+        self._relay_thread = threading.Thread(target=self._run, daemon=True, name="AGI-Relay-Thread")
+        self._relay_thread.start()
+        self.logger.info(f"{self.workers} AGI worker processes sharing {self.host}:{self.port}")
+        return True
+
+    def stop(self):
+        """Stop the workers and the relay thread"""
+        self.running = False
+        self._stop_event.set()
+        for process in self._processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
+        self.logger.info("AGI worker processes stopped")
+
+    def metrics(self):
+        """Totals across workers from their last periodic report"""
+        totals = {}
+        for data in self.worker_metrics.values():
+            for key in ('sessions_active', 'sessions_total', 'sessions_rejected', 'session_errors',
+                        'routes_decided', 'routes_fallback'):
+                totals[key] = totals.get(key, 0) + data.get(key, 0)
+        totals.update({
+            'running': self.running,
+            'host': self.host,
+            'port': self.port,
+            'workers': self.workers,
+            'workers_alive': sum(1 for process in self._processes.values() if process.is_alive()),
+            'worker_restarts': self.worker_restarts,
+            'calls_relayed': self.calls_relayed,
+            'relay_lag_max_ms': round(self.relay_lag_max_ms, 2),
+            'per_worker': self.worker_metrics
+        })
+        return totals
+
+    def _spawn(self, index):
+        process = self._context.Process(
+            target=run_agi_worker,
+            args=(index, self.host, self.port, self.backlog, self.max_sessions,
+                  self._events, self._stop_event),
+            kwargs={
+                'db_config': self.db_config,
+                'route_deadline': self.route_deadline,
+                'default_extension': self.default_extension
+            },
+            name=f"AGI-Worker-{index}",
+            daemon=True
+        )
+        with _worker_main():
+            process.start()
+        self._processes[index] = process
+
+    def _run(self):
+        checked_at = time.time()
+        while self.running:
+            if time.time() - checked_at >= 1:
+                self._check_workers()
+                checked_at = time.time()
+            try:
+                event = self._events.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if event['type'] == 'call':
+                self._relay(event)
+            elif event['type'] == 'metrics':
+                self.worker_metrics[event['worker']] = event['data']
+            elif event['type'] == 'failed':
+                self.logger.error(f"AGI worker {event['worker']} could not bind {self.host}:{self.port}")
+
+    def _relay(self, event):
+        self.calls_relayed += 1
+        self.relay_lag_max_ms = max(self.relay_lag_max_ms, (time.time() - event['received_at']) * 1000)
+        try:
+            self.on_call(event['agi_vars'])
+        except Exception as e:
+            self.logger.error(f"Error registering call from AGI worker {event['worker']}: {e}")
+
+    def _check_workers(self):
+        """Restart any worker that died so the port keeps its full capacity"""
+        for index, process in list(self._processes.items()):
+            if not process.is_alive() and self.running:
+                self.logger.warning(f"AGI worker {index} exited with {process.exitcode}, restarting")
+                self.worker_restarts += 1
+                self._spawn(index)
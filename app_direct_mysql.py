@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, send_from_directory
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, send_from_directory, Response, stream_with_context
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -13,6 +13,7 @@ import base64
 from io import BytesIO
 import subprocess
 import uuid
+import queue
 
 # Try to import audio libraries, but make them optional
 try:
@@ -38,130 +39,73 @@ except ImportError:
     RATE = 44100
 
 # Asterisk Manager Interface (AMI) integration
-class AsteriskAMI:
-    def __init__(self, host='127.0.0.1', port=5038, username='admin', secret='admin'):
-        self.host = host
-        self.port = port
-        self.username = username
-        self.secret = secret
-        self.connected = False
-        self.logger = logging.getLogger(__name__)
-    
-    def connect(self):
-        """Connect to Asterisk AMI"""
-        try:
-            import socket
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-            
-            # Login to AMI
-            login_msg = f"Action: Login\r\nUsername: {self.username}\r\nSecret: {self.secret}\r\n\r\n"
-            self.socket.send(login_msg.encode())
-            
-            response = self.socket.recv(1024).decode()
-            if "Success" in response:
-                self.connected = True
-                self.logger.info("Connected to Asterisk AMI")
-                return True
-            else:
-                self.logger.error(f"AMI login failed: {response}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"Failed to connect to AMI: {e}")
-            return False
-    
-    def send_action(self, action, params=None):
-        """Send an action to Asterisk AMI"""
-        if not self.connected:
-            if not self.connect():
-                return None
-        
-        try:
-            if params is None:
-                params = {}
-            
-            message = f"Action: {action}\r\n"
-            for key, value in params.items():
-                message += f"{key}: {value}\r\n"
-            message += "\r\n"
-            
-            self.socket.send(message.encode())
-            response = self.socket.recv(1024).decode()
-            return response
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send AMI action {action}: {e}")
-            self.connected = False
-            return None
-    
-    def originate_call(self, context, extension, caller_id, priority=1, timeout=30000):
-        """Originate a call using AMI"""
-        params = {
-            'Context': context,
-            'Extension': extension,
-            'Callerid': caller_id,
-            'Priority': priority,
-            'Timeout': timeout
-        }
-        return self.send_action('Originate', params)
-    
-    def get_channel_status(self, channel):
-        """Get status of a specific channel"""
-        return self.send_action('GetVar', {'Channel': channel, 'Variable': 'CHANNEL'})
-    
-    def hangup_channel(self, channel, cause=16):
-        """Hangup a specific channel"""
-        return self.send_action('Hangup', {'Channel': channel, 'Cause': str(cause)})
-    
-    def close(self):
-        """Close AMI connection"""
-        if self.connected:
-            try:
-                self.send_action('Logoff')
-                self.socket.close()
-                self.connected = False
-                self.logger.info("AMI connection closed")
-            except:
-                pass
+from asterisk_ami import AsteriskAMI, AMIHealthSupervisor
+from campaign_dialer import CampaignDialer
+from fastagi import FastAGIServer
+from forwarding import ForwardingRouter, FALLBACK_ROUTE
+from agi_workers import AGIWorkerPool, reuse_port_supported
+from write_behind import WriteBehindQueue
+from db_pool import ConnectionPool
+from call_stats import CallStatsTracker
+from call_rollup import CallRollup, load_timeseries, TIMESERIES_BUCKETS
+from call_archive import CallArchiver, ARCHIVE_TABLE
+from call_search import search_calls, search_incidents, SEARCH_PAGE_DEFAULT, SEARCH_PAGE_MAX, SEARCH_MAX_OFFSET
+from call_export import export_stream, EXPORT_FORMATS, PARQUET_AVAILABLE, CALL_EXPORT_COLUMNS, INCIDENT_EXPORT_COLUMNS
+from migrations import run_migrations
+from query_profiler import QueryProfiler
+from db_replica import ReplicaRouter
 
 # Asterisk Gateway Interface (AGI) Server
 class AGIServer:
-    def __init__(self, host='0.0.0.0', port=5001, logger=None, socketio_instance=None):
+    def __init__(self, host='0.0.0.0', port=5001, logger=None, socketio_instance=None,
+                 backlog=512, max_sessions=500, route_calls=True, route_deadline=0.25, workers=1):
         self.host = host
         self.port = port
         self.logger = logger or logging.getLogger(__name__)
         self.socketio_instance = socketio_instance
-        self.server_socket = None
+        # Forwarding rules cached for in-process routing decisions
+        self.router = ForwardingRouter(get_db_connection, default_extension=DEFAULT_EXTENSION, logger=self.logger)
+        
+        if workers > 1 and reuse_port_supported():
+            # Worker processes share the port and relay calls back to _process_agi_request
+            self.server = AGIWorkerPool(
+                self._process_agi_request,
+                workers=workers,
+                host=host,
+                port=port,
+                backlog=backlog,
+                max_sessions=max_sessions,
+                db_config=DB_CONFIG if route_calls else None,
+                route_deadline=route_deadline,
+                default_extension=DEFAULT_EXTENSION,
+                logger=self.logger
+            )
+        else:
+            if workers > 1:
+                self.logger.warning("SO_REUSEPORT unavailable, serving AGI from this process only")
+            # Sessions are served by one asyncio loop; see fastagi.FastAGIServer
+            self.server = FastAGIServer(
+                self._process_agi_request,
+                host=host,
+                port=port,
+                backlog=backlog,
+                max_sessions=max_sessions,
+                route=self.router.route if route_calls else None,
+                route_deadline=route_deadline,
+                fallback_commands=FALLBACK_ROUTE,
+                logger=self.logger
+            )
         self.running = False
         
     def start(self):
         """Start the AGI server"""
         try:
-            import socket
-            self.logger.info(f"Creating socket for AGI server on {self.host}:{self.port}")
-            
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
-            self.logger.info("Binding socket to address...")
-            self.server_socket.bind((self.host, self.port))
-            
-            self.logger.info("Setting socket to listen mode...")
-            self.server_socket.listen(5)
-            
-            self.running = True
-            self.logger.info(f"AGI Server started on {self.host}:{self.port}")
-            
-            # Start server in a separate thread
-            import threading
-            self.logger.info("Starting AGI server thread...")
-            server_thread = threading.Thread(target=self._accept_connections, daemon=True, name="AGI-Server-Thread")
-            server_thread.start()
-            self.logger.info(f"AGI server thread started successfully: {server_thread.name} (daemon: {server_thread.daemon})")
-            self.logger.info(f"Thread alive: {server_thread.is_alive()}")
-            
-            return True
+            self.logger.info(f"Starting FastAGI server on {self.host}:{self.port}")
+            self.running = self.server.start()
+            if self.running:
+                self.port = self.server.port
+                self.logger.info(f"AGI Server started on {self.host}:{self.port}")
+            return self.running
             
         except Exception as e:
             self.logger.error(f"Failed to start AGI server: {e}")
@@ -172,106 +116,16 @@ class AGIServer:
     def stop(self):
         """Stop the AGI server"""
         self.running = False
-        if self.server_socket:
-            self.server_socket.close()
+        self.server.stop()
         self.logger.info("AGI Server stopped")
     
-    def _accept_connections(self):
-        """Accept incoming AGI connections"""
-        import threading
-        import socket
-        current_thread = threading.current_thread()
-        self.logger.info(f"AGI server thread started: {current_thread.name} (daemon: {current_thread.daemon})")
-        self.logger.info("Waiting for connections...")
-        
-        while self.running:
-            try:
-                self.logger.info("Calling accept() on server socket...")
-                client_socket, address = self.server_socket.accept()
-                self.logger.info(f"AGI connection accepted from {address}")
-                
-                # Handle each connection in a separate thread
-                self.logger.info(f"Creating client thread for {address}")
-                client_thread = threading.Thread(
-                    target=self._handle_agi_connection, 
-                    args=(client_socket, address),
-                    daemon=True,
-                    name=f"AGI-Client-{address[0]}-{address[1]}"
-                )
-                client_thread.start()
-                self.logger.info(f"Client thread started for {address}: {client_thread.name}")
-                self.logger.info(f"Client thread alive: {client_thread.is_alive()}")
-                
-                # Wait a moment to see if the thread starts processing
-                time.sleep(0.1)
-                self.logger.info(f"Client thread still alive after delay: {client_thread.is_alive()}")
-                
-            except Exception as e:
-                if self.running:
-                    self.logger.error(f"Error accepting AGI connection: {e}")
-                    import traceback
-                    self.logger.error(f"Traceback: {traceback.format_exc()}")
-                else:
-                    self.logger.info("AGI server stopped, exiting accept loop")
-                    break
+    def metrics(self):
+        """Session counters of the FastAGI listener"""
+        return self.server.metrics()
     
-    def _handle_agi_connection(self, client_socket, address):
-        """Handle individual AGI connection"""
-        try:
-            self.logger.info(f"Starting to handle AGI connection from {address}")
-            
-            # Read AGI environment variables
-            agi_vars = {}
-            self.logger.info("Reading AGI environment variables...")
-            
-            # Read data line by line until empty line
-            buffer = ""
-            while True:
-                try:
-                    # Read one character at a time to build lines
-                    char = client_socket.recv(1).decode('utf-8')
-                    if not char:
-                        break
-                    
-                    buffer += char
-                    
-                    # Check if we have a complete line
-                    if char == '\n':
-                        line = buffer.strip()
-                        buffer = ""
-                        
-                        self.logger.info(f"Received line: '{line}'")
-                        
-                        if not line:  # Empty line marks end of environment variables
-                            self.logger.info("Empty line found, end of environment variables")
-                            break
-                        
-                        if ':' in line:
-                            key, value = line.split(':', 1)
-                            agi_vars[key.strip()] = value.strip()
-                            self.logger.info(f"Parsed AGI variable: {key.strip()} = {value.strip()}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error reading AGI data: {e}")
-                    break
-            
-            self.logger.info(f"AGI variables: {agi_vars}")
-            
-            # Process the AGI request
-            self.logger.info("Processing AGI request...")
-            response = self._process_agi_request(agi_vars)
-            
-            # Send response back to Asterisk
-            self.logger.info(f"Sending response to Asterisk: {response}")
-            client_socket.send(response.encode())
-            
-        except Exception as e:
-            self.logger.error(f"Error handling AGI connection: {e}")
-            import traceback
-            self.logger.error(f"Traceback: {traceback.format_exc()}")
-        finally:
-            self.logger.info("Closing AGI connection")
-            client_socket.close()
+    def invalidate_forwarding_rules(self):
+        """Make the next routed call reload forwarding rules (worker processes use their TTL)"""
+        self.router.invalidate()
     
     def _process_agi_request(self, agi_vars):
         """Process AGI request and return response"""
@@ -286,9 +140,14 @@ class AGIServer:
             self.logger.info(f"AGI call received - Caller: {caller_id}, Extension: {extension}, Channel: {channel}")
             self.logger.info(f"AGI variables received: {agi_vars}")
             
-            # Store call in database
-            self.logger.info(f"Storing call {unique_id} in database...")
-            self._store_call_in_db(caller_id, extension, unique_id, channel)
+            # The AMI event consumer may already have registered this channel
+            if unique_id in active_calls:
+                self.logger.info(f"Call {unique_id} already tracked from AMI events")
+                active_calls[unique_id]['extension'] = extension
+                return "200 result=0\n"
+            
+            # Register in memory and queue the row; Asterisk gets its reply without waiting on MySQL
+            self._register_call(caller_id, extension, unique_id, channel)
             
             # Emit Socket.IO event for real-time notification
             self.logger.info(f"Notifying Flask app about call {unique_id}...")
@@ -303,50 +162,37 @@ class AGIServer:
             self.logger.error(f"Traceback: {traceback.format_exc()}")
             return "200 result=-1\n"
     
-    def _store_call_in_db(self, caller_id, extension, unique_id, channel):
-        """Store call information in database"""
-        try:
-            connection = get_db_connection()
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, sip_channel, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    unique_id, 
-                    caller_id, 
-                    f'Caller {caller_id}', 
-                    'ringing', 
-                    'inbound', 
-                    datetime.now(),
-                    channel,
-                    datetime.now()
-                ))
-                connection.commit()
-                self.logger.info(f"Call {unique_id} stored in database")
-                
-                # Add to active calls for real-time management
-                active_calls[unique_id] = {
-                    'id': unique_id,
-                    'call_id': unique_id,
-                    'caller_id': caller_id,
-                    'caller_name': f'Caller {caller_id}',
-                    'caller_number': caller_id,
-                    'status': 'ringing',
-                    'direction': 'inbound',
-                    'start_time': datetime.now().isoformat(),
-                    'sip_channel': channel,
-                    'created_at': datetime.now().isoformat(),
-                    'source': 'ami'  # Mark as AMI call
-                }
-                
-                self.logger.info(f"Call {unique_id} added to active_calls: {active_calls[unique_id]}")
-                self.logger.info(f"Total active calls: {len(active_calls)}")
-                
-        except Exception as e:
-            self.logger.error(f"Error storing call in database: {e}")
-        finally:
-            if connection:
-                connection.close()
+    def _register_call(self, caller_id, extension, unique_id, channel):
+        """Add the call to active_calls and hand its row to the write-behind queue"""
+        now = datetime.now()
+        active_calls[unique_id] = {
+            'id': unique_id,
+            'call_id': unique_id,
+            'caller_id': caller_id,
+            'caller_name': f'Caller {caller_id}',
+            'caller_number': caller_id,
+            'status': 'ringing',
+            'direction': 'inbound',
+            'start_time': now.isoformat(),
+            'sip_channel': channel,
+            'created_at': now.isoformat(),
+            'extension': extension,
+            'persisted': False,
+            'source': 'ami'  # Mark as AMI call
+        }
+        call_writer.submit(unique_id, (
+            unique_id,
+            caller_id,
+            f'Caller {caller_id}',
+            'ringing',
+            'inbound',
+            now,
+            channel,
+            extension,
+            now
+        ))
+        call_stats.call_started(unique_id, caller_id, f'Caller {caller_id}', start_time=now)
+        self.logger.info(f"Call {unique_id} registered, total active calls: {len(active_calls)}")
     
     def _notify_flask_app(self, caller_id, extension, unique_id, channel):
         """Notify Flask app about incoming call via Socket.IO"""
@@ -391,9 +237,408 @@ class AGIServer:
             self.logger.error(f"Traceback: {traceback.format_exc()}")
 
 
+# AMI event stream consumer that drives call state
+class AMIEventConsumer:
+    """Keep active_calls and the calls table in sync with live AMI channel events"""
+
+    HANDLED_EVENTS = ('Newchannel', 'Newstate', 'DialBegin', 'DialEnd', 'Hangup', 'BridgeEnter')
+    OPEN_STATUSES = ('ringing', 'answered')
+
+    def __init__(self, ami_client, logger=None, socketio_instance=None, extensions=None):
+        self.ami = ami_client
+        self.logger = logger or logging.getLogger(__name__)
+        self.socketio_instance = socketio_instance
+        # Only channels dialed into these extensions become calls (None tracks all)
+        self.extensions = set(extensions) if extensions else None
+        self.channels = {}          # Uniqueid -> cached channel state
+        self.channel_index = {}     # Channel name -> Uniqueid
+        self.events = queue.Queue()
+        self.running = False
+        # Set on boot and after every disconnect; events may have been missed
+        self.resync_needed = True
+
+    def start(self):
+        """Subscribe to AMI events and start the state worker thread"""
+        if self.running:
+            return True
+        self.running = True
+        self.ami.add_event_listener(self._on_event)
+        self.ami.add_disconnect_listener(self._on_disconnect)
+        worker = threading.Thread(target=self._run, daemon=True, name="AMI-Event-Thread")
+        worker.start()
+        self.logger.info("AMI event consumer started")
+        return True
+
+    def stop(self):
+        """Stop consuming AMI events"""
+        self.running = False
+        self.ami.remove_event_listener(self._on_event)
+        self.events.put(None)
+        self.logger.info("AMI event consumer stopped")
+
+    def get_channel_state(self, channel=None, call_id=None):
+        """Return the cached state for a channel name or call/unique id without an AMI round trip"""
+        unique_id = call_id if call_id in self.channels else self.channel_index.get(channel)
+        return self.channels.get(unique_id)
+
+    def recover(self):
+        """Rebuild channel state and active_calls from CoreShowChannels and close orphaned call rows"""
+        self.resync_needed = False
+        started = time.time()
+
+        snapshot = {}
+        try:
+            # Stream the EventList straight into the snapshot as the reader receives it
+            self.ami.send_event_list(
+                'CoreShowChannels',
+                on_event=lambda event: snapshot.__setitem__(event.get('Uniqueid'), event)
+            ).result(timeout=self.ami.action_timeout)
+        except Exception as e:
+            self.logger.error(f"Call state recovery skipped, CoreShowChannels failed: {e}")
+            return False
+
+        now = datetime.now()
+        channels = {}
+        for unique_id, event in snapshot.items():
+            channels[unique_id] = {
+                'unique_id': unique_id,
+                'linked_id': event.get('Linkedid', unique_id),
+                'channel': event.get('Channel'),
+                'state': event.get('ChannelStateDesc'),
+                'caller_id': event.get('CallerIDNum') or 'Unknown',
+                'caller_name': event.get('CallerIDName'),
+                'exten': event.get('Exten'),
+                'context': event.get('Context'),
+                'bridge_id': event.get('BridgeId') or None,
+                'dial_status': None,
+                'updated_at': now
+            }
+        self.channels = channels
+        self.channel_index = {state['channel']: unique_id for unique_id, state in channels.items()}
+
+        live = {unique_id: state for unique_id, state in channels.items() if self._is_tracked_call(state)}
+        bridged = {state['linked_id'] for state in channels.values() if state['bridge_id']}
+
+        connection = None
+        try:
+            connection = get_db_connection()
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT call_id, caller_id, caller_name, status, direction, start_time, sip_channel, created_at
+                    FROM calls WHERE status IN (%s, %s)
+                """, self.OPEN_STATUSES)
+                open_rows = {row['call_id']: row for row in cursor.fetchall()}
+
+                missing_rows = []
+                newly_answered = []
+                for unique_id, state in live.items():
+                    row = open_rows.get(unique_id)
+                    status = 'answered' if unique_id in bridged else (row['status'] if row else 'ringing')
+                    if row is None:
+                        missing_rows.append((unique_id, state['caller_id'], self._caller_name(state), status,
+                                             'inbound', now, state['channel'], state['exten'], now))
+                    elif status != row['status']:
+                        newly_answered.append(unique_id)
+
+                    call = active_calls.get(unique_id)
+                    if call is not None:
+                        call['status'] = status
+                        continue
+                    start_time = row['start_time'] if row and row['start_time'] else now
+                    active_calls[unique_id] = {
+                        'id': unique_id,
+                        'call_id': unique_id,
+                        'caller_id': row['caller_id'] if row else state['caller_id'],
+                        'caller_name': row['caller_name'] if row else self._caller_name(state),
+                        'caller_number': row['caller_id'] if row else state['caller_id'],
+                        'status': status,
+                        'direction': row['direction'] if row else 'inbound',
+                        'start_time': start_time.isoformat(),
+                        'sip_channel': state['channel'],
+                        'created_at': (row['created_at'] if row and row['created_at'] else now).isoformat(),
+                        'source': 'ami'
+                    }
+
+                # Open rows Asterisk no longer knows about, unless a non-Asterisk call still owns them
+                orphans = set(call_id for call_id in open_rows if call_id not in live and
+                              active_calls.get(call_id, {}).get('source', 'ami') == 'ami')
+                orphans.update(call_id for call_id, call in active_calls.items()
+                               if call.get('source') == 'ami' and call_id not in live)
+
+                if missing_rows:
+                    cursor.executemany("""
+                        INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, sip_channel,
+                                           extension, created_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE status = VALUES(status), sip_channel = VALUES(sip_channel)
+                    """, missing_rows)
+                if newly_answered:
+                    cursor.execute(
+                        f"UPDATE calls SET status = 'answered' WHERE call_id IN ({', '.join(['%s'] * len(newly_answered))})",
+                        newly_answered
+                    )
+                if orphans:
+                    # duration is assigned before status so its CASE still sees the old status
+                    cursor.execute(f"""
+                        UPDATE calls
+                        SET end_time = %s,
+                            duration = CASE WHEN status = 'answered' THEN TIMESTAMPDIFF(SECOND, start_time, %s) ELSE 0 END,
+                            status = CASE WHEN status = 'answered' THEN 'ended' ELSE 'missed' END
+                        WHERE status IN (%s, %s) AND call_id IN ({', '.join(['%s'] * len(orphans))})
+                    """, [now, now, *self.OPEN_STATUSES, *orphans])
+                connection.commit()
+        except Exception as e:
+            self.logger.error(f"Call state recovery failed to reconcile the database: {e}")
+            return False
+        finally:
+            if connection:
+                connection.close()
+
+        for call_id in orphans:
+            self._close_orphan(call_id, now)
+        if missing_rows or newly_answered or orphans:
+            call_stats.refresh()
+
+        elapsed_ms = (time.time() - started) * 1000
+        self.logger.info(f"Call state recovered in {elapsed_ms:.0f}ms: {len(snapshot)} channels, "
+                         f"{len(live)} live calls, {len(missing_rows)} rows added, {len(orphans)} orphans closed")
+        return True
+
+    def _close_orphan(self, call_id, now):
+        """Drop an in-memory call whose channel is gone, saving any recording in progress"""
+        call = active_calls.get(call_id)
+        if not call:
+            return
+
+        if call_id in call_recordings and call_recordings[call_id].get('is_recording'):
+            try:
+                save_call_recording(call_id)
+            except Exception as e:
+                self.logger.error(f"Error saving recording for orphaned call {call_id}: {e}")
+
+        status = 'ended' if call.get('status') == 'answered' else 'missed'
+        call['status'] = status
+        call['end_time'] = now.isoformat()
+        if self.socketio_instance:
+            self.socketio_instance.emit('call_update', call)
+            self.socketio_instance.emit('call_ended', {
+                'call_id': call_id,
+                'status': status,
+                'reason': 'channel_gone',
+                'recording_saved': False,
+                'timestamp': now.isoformat()
+            }, room='general')
+        active_calls.pop(call_id, None)
+        call_recordings.pop(call_id, None)
+        audio_streams.pop(call_id, None)
+
+    def _on_event(self, message):
+        """AMI reader callback: only enqueue so the reader never blocks on DB or Socket.IO"""
+        if message.get('Event') in self.HANDLED_EVENTS:
+            self.events.put(message)
+
+    def _on_disconnect(self, error):
+        self.resync_needed = True
+
+    def _run(self):
+        # ami_supervisor owns the connection; listeners survive its reconnects
+        while self.running:
+            try:
+                message = self.events.get(timeout=0.5)
+            except queue.Empty:
+                message = False
+            if message is None:
+                break
+            # Snapshot before applying anything newer; later events replay idempotently on top
+            if self.resync_needed and self.ami.connected:
+                self.recover()
+            if not message:
+                continue
+            try:
+                handler = getattr(self, f"_handle_{message.get('Event').lower()}")
+                handler(message)
+            except Exception as e:
+                self.logger.error(f"Error handling AMI event {message.get('Event')}: {e}")
+                import traceback
+                self.logger.error(f"Traceback: {traceback.format_exc()}")
+
+    def _is_tracked_call(self, state):
+        if state['unique_id'] != state['linked_id']:
+            return False
+        return self.extensions is None or state['exten'] in self.extensions
+
+    def _handle_newchannel(self, message):
+        unique_id = message.get('Uniqueid')
+        state = {
+            'unique_id': unique_id,
+            'linked_id': message.get('Linkedid', unique_id),
+            'channel': message.get('Channel'),
+            'state': message.get('ChannelStateDesc'),
+            'caller_id': message.get('CallerIDNum') or 'Unknown',
+            'caller_name': message.get('CallerIDName'),
+            'exten': message.get('Exten'),
+            'context': message.get('Context'),
+            'bridge_id': None,
+            'dial_status': None,
+            'updated_at': datetime.now()
+        }
+        self.channels[unique_id] = state
+        self.channel_index[state['channel']] = unique_id
+
+        if not self._is_tracked_call(state) or unique_id in active_calls:
+            return
+
+        caller_name = self._caller_name(state)
+        now = datetime.now()
+        call_data = {
+            'id': unique_id,
+            'call_id': unique_id,
+            'caller_id': state['caller_id'],
+            'caller_name': caller_name,
+            'caller_number': state['caller_id'],
+            'status': 'ringing',
+            'direction': 'inbound',
+            'start_time': now.isoformat(),
+            'sip_channel': state['channel'],
+            'created_at': now.isoformat(),
+            'persisted': False,
+            'source': 'ami'
+        }
+        active_calls[unique_id] = call_data
+
+        # Push to the UI first; the row is written behind by call_writer
+        if self.socketio_instance:
+            self.socketio_instance.emit('new_call', call_data)
+            self.socketio_instance.emit('call_update', call_data)
+
+        call_writer.submit(unique_id, (unique_id, state['caller_id'], caller_name, 'ringing', 'inbound',
+                                       now, state['channel'], state['exten'], now))
+        call_stats.call_started(unique_id, state['caller_id'], caller_name, start_time=now)
+
+        self.logger.info(f"AMI call {unique_id} registered from {state['caller_id']} on {state['channel']}")
+
+    def _caller_name(self, state):
+        caller_name = state['caller_name']
+        if not caller_name or caller_name == '<unknown>':
+            caller_name = f"Caller {state['caller_id']}"
+        return caller_name
+
+    def _handle_newstate(self, message):
+        state = self.channels.get(message.get('Uniqueid'))
+        if state:
+            state['state'] = message.get('ChannelStateDesc')
+            state['updated_at'] = datetime.now()
+
+    def _handle_dialbegin(self, message):
+        state = self.channels.get(message.get('Uniqueid'))
+        if state:
+            state['dial_status'] = 'DIALING'
+            state['dest_channel'] = message.get('DestChannel')
+            state['updated_at'] = datetime.now()
+
+    def _handle_dialend(self, message):
+        state = self.channels.get(message.get('Uniqueid'))
+        if not state:
+            return
+        state['dial_status'] = message.get('DialStatus')
+        state['updated_at'] = datetime.now()
+        if state['dial_status'] == 'ANSWER':
+            self._mark_answered(state['linked_id'])
+
+    def _handle_bridgeenter(self, message):
+        state = self.channels.get(message.get('Uniqueid'))
+        if not state:
+            return
+        state['bridge_id'] = message.get('BridgeUniqueid')
+        state['updated_at'] = datetime.now()
+        self._mark_answered(state['linked_id'])
+
+    def _handle_hangup(self, message):
+        unique_id = message.get('Uniqueid')
+        state = self.channels.pop(unique_id, None)
+        if state:
+            self.channel_index.pop(state['channel'], None)
+
+        call = active_calls.get(unique_id)
+        if not call:
+            return
+
+        cause = message.get('Cause-txt') or message.get('Cause')
+        if call.get('status') == 'answered':
+            # Answered calls go through the normal path so recordings are saved
+            terminate_call(unique_id, 'asterisk_hangup')
+            return
+
+        now = datetime.now()
+        call['status'] = 'missed'
+        call['end_time'] = now.isoformat()
+        call['duration'] = 0
+        if self.socketio_instance:
+            self.socketio_instance.emit('call_update', call)
+            self.socketio_instance.emit('call_ended', {
+                'call_id': unique_id,
+                'status': 'missed',
+                'reason': cause,
+                'duration': 0,
+                'recording_saved': False,
+                'timestamp': now.isoformat()
+            }, room='general')
+        active_calls.pop(unique_id, None)
+        call_recordings.pop(unique_id, None)
+
+        connection = None
+        try:
+            call_writer.ensure_written(unique_id)
+            connection = get_db_connection()
+            with connection.cursor() as cursor:
+                execute_call_update(cursor, unique_id, """
+                    UPDATE calls SET status = 'missed', end_time = %s, duration = 0
+                    WHERE call_id = %s
+                """, (now, unique_id))
+                connection.commit()
+                call_stats.call_status(unique_id, 'missed')
+        except Exception as e:
+            self.logger.error(f"Error updating missed AMI call {unique_id}: {e}")
+        finally:
+            if connection:
+                connection.close()
+
+        self.logger.info(f"AMI call {unique_id} hung up before answer ({cause})")
+
+    def _mark_answered(self, call_id):
+        call = active_calls.get(call_id)
+        if not call or call.get('status') == 'answered':
+            return
+
+        now = datetime.now()
+        call['status'] = 'answered'
+        call['answered_time'] = now.isoformat()
+        if self.socketio_instance:
+            self.socketio_instance.emit('call_update', call)
+            self.socketio_instance.emit('call_status_update', {
+                'call_id': call_id,
+                'status': 'answered',
+                'timestamp': now.isoformat()
+            }, room='general')
+
+        connection = None
+        try:
+            call_writer.ensure_written(call_id)
+            connection = get_db_connection()
+            with connection.cursor() as cursor:
+                execute_call_update(cursor, call_id, "UPDATE calls SET status = 'answered' WHERE call_id = %s", (call_id,))
+                connection.commit()
+                call_stats.call_status(call_id, 'answered')
+        except Exception as e:
+            self.logger.error(f"Error updating answered AMI call {call_id}: {e}")
+        finally:
+            if connection:
+                connection.close()
+
+
 # Initialize AMI connection
 try:
-    from asterisk_ami_config import AMI_HOST, AMI_PORT, AMI_USERNAME, AMI_SECRET
+    from asterisk_ami_config import AMI_HOST, AMI_PORT, AMI_USERNAME, AMI_SECRET, DEFAULT_EXTENSION
     ami = AsteriskAMI(
         host=AMI_HOST,
         port=AMI_PORT,
@@ -409,6 +654,10 @@ except ImportError:
         username='admin',       # Change to your AMI username
         secret='jm1412'    # Change to your AMI secret
     )
+    DEFAULT_EXTENSION = '1412'
+
+# Keepalive pings and backoff reconnects for the shared AMI connection
+ami_supervisor = AMIHealthSupervisor(ami, ping_interval=15, ping_timeout=5)
 
 # Simple mock SIP service (replaces the deleted real_sip_integration.py)
 class MockSIPService:
@@ -485,114 +734,74 @@ DB_CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+# Per-statement timings for every pooled cursor; slow statements are logged with their EXPLAIN plan
+query_profiler = QueryProfiler(
+    slow_threshold_ms=float(os.environ.get('SLOW_QUERY_MS', '200')),
+    explain_factory=lambda: pymysql.connect(**DB_CONFIG),
+    logger=logger
+)
+
+# Shared connection pool; close() on a pooled connection returns it here
+db_pool = ConnectionPool(
+    lambda: pymysql.connect(**DB_CONFIG),
+    size=int(os.environ.get('DB_POOL_SIZE', '10')),
+    max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', '20')),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    recycle=int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+    cursor_wrapper=query_profiler.wrap_cursor if os.environ.get('QUERY_PROFILER', '1') == '1' else None,
+    logger=logger
+)
+
+# Optional read replica for read-only endpoints (DB_REPLICA_HOST); reads fall back to db_pool
+replica_pool = None
+if os.environ.get('DB_REPLICA_HOST'):
+    REPLICA_DB_CONFIG = dict(DB_CONFIG,
+                             host=os.environ['DB_REPLICA_HOST'],
+                             port=int(os.environ.get('DB_REPLICA_PORT', '3306')))
+    replica_pool = ConnectionPool(
+        lambda: pymysql.connect(**REPLICA_DB_CONFIG),
+        size=int(os.environ.get('DB_REPLICA_POOL_SIZE', '10')),
+        max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', '20')),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        recycle=int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+        cursor_wrapper=db_pool.cursor_wrapper,
+        logger=logger,
+        name="DB-Replica-Pool"
+    )
+read_router = ReplicaRouter(
+    db_pool,
+    replica_pool,
+    max_lag=float(os.environ.get('DB_REPLICA_MAX_LAG', '5')),
+    logger=logger
+)
+
 # Database helper functions
 def get_db_connection():
     """Get database connection"""
     try:
-        connection = pymysql.connect(**DB_CONFIG)
+        connection = db_pool.get()
+        return connection
+    except Exception as e:
+        logger.error(f"Database connection error: {e}")
+        raise
+
+def get_read_connection(max_lag=None):
+    """Get a connection for pure reads: the replica when it is fresh enough, else the primary"""
+    try:
+        connection = read_router.get(max_lag)
         return connection
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         raise
 
 def init_database():
-    """Initialize database tables"""
+    """Bring the database schema up to date (one version check when nothing is pending)"""
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # Skip users table creation - it already exists in resource_allocation database
-            
-            # Create calls table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS calls (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    call_id VARCHAR(50) UNIQUE NOT NULL,
-                    caller_id VARCHAR(20) NOT NULL,
-                    caller_name VARCHAR(100),
-                    status VARCHAR(20) DEFAULT 'ringing',
-                    direction VARCHAR(20) DEFAULT 'inbound',
-                    start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    end_time DATETIME,
-                    duration INT,
-                    user_id INT,
-                    sip_channel VARCHAR(100),
-                    recording_path VARCHAR(255),
-                    notes TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            """)
-            
-            # Add recording_path column if it doesn't exist
-            try:
-                cursor.execute("ALTER TABLE calls ADD COLUMN recording_path VARCHAR(255)")
-                logger.info("Added recording_path column to calls table")
-            except Exception as e:
-                # Column might already exist
-                logger.debug(f"recording_path column check: {e}")
-            
-            # Create forwarding_rules table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS forwarding_rules (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    pattern VARCHAR(50) NOT NULL,
-                    priority INT DEFAULT 100,
-                    enabled BOOLEAN DEFAULT TRUE,
-                    forward_to VARCHAR(20) DEFAULT 'mobile_app',
-                    forward_to_users TEXT,
-                    schedule_enabled BOOLEAN DEFAULT FALSE,
-                    schedule_start TIME,
-                    schedule_end TIME,
-                    schedule_days TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create incidents table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS incidents (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    incident_id VARCHAR(20) UNIQUE NOT NULL,
-                    category_id INT NOT NULL,
-                    title VARCHAR(200) NOT NULL,
-                    description TEXT NOT NULL,
-                    location_name VARCHAR(255) NOT NULL,
-                    latitude DECIMAL(10,8) NOT NULL,
-                    longitude DECIMAL(11,8) NOT NULL,
-                    reported_by INT,
-                    status ENUM('reported','assigned','in_progress','resolved','closed') DEFAULT 'reported',
-                    priority ENUM('low','medium','high','critical') DEFAULT 'medium',
-                    reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    resolved_at TIMESTAMP NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (reported_by) REFERENCES users(id)
-                )
-            """)
-            
-            # Create incident_categories table if it doesn't exist
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS incident_categories (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    priority_level ENUM('low','medium','high','critical') DEFAULT 'medium',
-                    response_time_minutes INT DEFAULT 60,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            connection.commit()
-            logger.info("Database tables created successfully")
-            
+        version = run_migrations(get_db_connection, logger=logger)
+        logger.info(f"Database schema at version {version}")
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
         raise
-    finally:
-        if connection:
-            connection.close()
 
 def init_default_data():
     """Initialize default users and rules"""
@@ -711,49 +920,158 @@ def index():
 @app.route('/dashboard')
 def dashboard():
     """Main dashboard"""
+    stats = call_stats.snapshot(active_calls=len(active_calls))
+    return render_template('dashboard.html', stats=stats)
+
+@app.route('/api/dashboard/stats', methods=['GET'])
+def get_dashboard_stats():
+    """Get dashboard counters (kept in memory, no table scans)"""
+    return jsonify({
+        'success': True,
+        'stats': call_stats.snapshot(active_calls=len(active_calls))
+    })
+
+@app.route('/api/stats/daily', methods=['GET'])
+@login_required
+def get_daily_stats():
+    """Get pre-aggregated per-day call statistics (?from=YYYY-MM-DD&to=YYYY-MM-DD, inclusive)"""
+    connection = None
+    try:
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else datetime.now().date()
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else end - timedelta(days=29)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    try:
+        connection = get_read_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT date, total_calls, answered_calls, missed_calls, rejected_calls, total_duration,
+                       avg_duration, recordings_count, incidents_count, peak_hour, peak_calls
+                FROM call_statistics
+                WHERE date BETWEEN %s AND %s
+                ORDER BY date
+            """, (start, end))
+            days = cursor.fetchall()
+        
+        for day in days:
+            day['date'] = day['date'].isoformat()
+            day['avg_duration'] = float(day['avg_duration'] or 0)
+        
+        return jsonify({
+            'success': True,
+            'days': days,
+            'count': len(days),
+            'rollup': call_rollup.metrics()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting daily stats: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+def parse_local_datetime(value):
+    """ISO datetime as the naive local time the database stores; aware input (Z, +02:00) is converted"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+@app.route('/api/stats/timeseries', methods=['GET'])
+@login_required
+def get_stats_timeseries():
+    """Get call volume, answer rate and durations per bucket (?from=&to=ISO datetimes, bucket=15m|1h|1d)"""
+    connection = None
+    bucket = request.args.get('bucket', '1h')
+    if bucket not in TIMESERIES_BUCKETS:
+        return jsonify({'success': False, 'error': f"bucket must be one of {', '.join(TIMESERIES_BUCKETS)}"}), 400
+    try:
+        end = parse_local_datetime(request.args['to']) if request.args.get('to') else datetime.now()
+        start = parse_local_datetime(request.args['from']) if request.args.get('from') else end - timedelta(days=1)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'from and to must be ISO datetimes'}), 400
+    
+    try:
+        connection = get_read_connection()
+        with connection.cursor() as cursor:
+            series = load_timeseries(cursor, start, end, bucket)
+        return jsonify({
+            'success': True,
+            'bucket': bucket,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'series': series,
+            'count': len(series)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting stats time series: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search():
+    """Ranked search over calls and incidents (?q=&type=all|calls|incidents&page=1&limit=20)"""
+    connection = None
+    query = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'all')
+    if not query:
+        return jsonify({'success': False, 'error': 'q is required'}), 400
+    if search_type not in ('all', 'calls', 'incidents'):
+        return jsonify({'success': False, 'error': 'type must be all, calls or incidents'}), 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = max(1, min(int(request.args.get('limit', SEARCH_PAGE_DEFAULT)), SEARCH_PAGE_MAX))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'page and limit must be integers'}), 400
+    offset = (page - 1) * limit
+    if offset > SEARCH_MAX_OFFSET:
+        return jsonify({'success': False, 'error': f'Results are limited to the first {SEARCH_MAX_OFFSET}; refine the search'}), 400
+    
     try:
-        connection = get_db_connection()
+        started = time.time()
+        result = {'success': True, 'query': query, 'type': search_type, 'page': page, 'limit': limit}
+        connection = get_read_connection()
         with connection.cursor() as cursor:
-            # Get total users
-            cursor.execute("SELECT COUNT(*) as count FROM users")
-            total_users = cursor.fetchone()['count']
-            
-            # Get active users (users who have been updated recently)
-            cursor.execute("SELECT COUNT(*) as count FROM users WHERE updated_at > DATE_SUB(NOW(), INTERVAL 1 HOUR)")
-            online_users = cursor.fetchone()['count']
-            
-            # Get total calls today
-            cursor.execute("SELECT COUNT(*) as count FROM calls WHERE DATE(start_time) = CURDATE()")
-            total_calls_today = cursor.fetchone()['count']
-            
-            # Get total calls
-            cursor.execute("SELECT COUNT(*) as count FROM calls")
-            total_calls = cursor.fetchone()['count']
-            
-            # Get total recordings
-            cursor.execute("SELECT COUNT(*) as count FROM calls WHERE recording_path IS NOT NULL")
-            total_recordings = cursor.fetchone()['count']
-            
+            if search_type in ('all', 'calls'):
+                calls, has_more = search_calls(cursor, query, limit, offset,
+                                               include_archive=call_archiver.needs_archive())
+                result['calls'] = [{
+                    'call_id': row['call_id'],
+                    'caller_id': row['caller_id'],
+                    'caller_name': row['caller_name'],
+                    'status': row['status'],
+                    'direction': row['direction'],
+                    'extension': row['extension'],
+                    'start_time': row['start_time'].isoformat() if row['start_time'] else None,
+                    'duration': row['duration'] or 0,
+                    'recording_path': row['recording_path'],
+                    'notes': row['notes'],
+                    'score': round(float(row['score']), 4)
+                } for row in calls]
+                result['calls_has_more'] = has_more
+            if search_type in ('all', 'incidents'):
+                incidents, has_more = search_incidents(cursor, query, limit, offset)
+                for incident in incidents:
+                    incident['score'] = round(float(incident['score']), 4)
+                    if incident['created_at']:
+                        incident['created_at'] = incident['created_at'].isoformat()
+                result['incidents'] = incidents
+                result['incidents_has_more'] = has_more
+        result['took_ms'] = round((time.time() - started) * 1000, 2)
+        return jsonify(result)
     except Exception as e:
-        logger.error(f"Error getting dashboard stats: {e}")
-        total_users = 0
-        online_users = 0
-        total_calls_today = 0
-        total_calls = 0
-        total_recordings = 0
+        logger.error(f"Error searching for {query!r}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         if connection:
             connection.close()
-    
-    stats = {
-        'active_calls': len(active_calls),
-        'total_users': total_users,
-        'online_users': online_users,
-        'total_calls_today': total_calls_today,
-        'total_calls': total_calls,
-        'total_recordings': total_recordings
-    }
-    return render_template('dashboard.html', stats=stats)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -837,7 +1155,7 @@ def forwarding_rules():
 def users():
     """Users management page"""
     try:
-        connection = get_db_connection()
+        connection = get_read_connection()
         with connection.cursor() as cursor:
             cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
             users = cursor.fetchall()
@@ -875,30 +1193,218 @@ def test_mediarecorder():
     """Serve the MediaRecorder API test page"""
     return send_from_directory('.', 'test_mediarecorder.html')
 
+# Call list pagination helpers
+CALL_LIST_COLUMNS = """
+    call_id, caller_id, caller_name, status, direction,
+    start_time, end_time, duration, recording_path, sip_channel, extension,
+    CASE
+        WHEN status = 'ringing' THEN 'incoming'
+        WHEN status = 'answered' THEN 'active'
+        WHEN status IN ('ended', 'rejected', 'missed') THEN 'ended'
+        ELSE status
+    END as display_status
+"""
+CALL_PAGE_DEFAULT = 50
+CALL_PAGE_MAX = 500
+
+def parse_call_filters(args):
+    """Read call list filters and the page cursor from query args; raises ValueError on bad input"""
+    def parse_time(name):
+        value = args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value.replace('Z', ''))
+        except ValueError:
+            raise ValueError(f"Invalid {name} date: {value}")
+    
+    try:
+        limit = int(args.get('limit', CALL_PAGE_DEFAULT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    
+    filters = {
+        'status': [status for status in args.get('status', '').split(',') if status],
+        'direction': args.get('direction') or None,
+        'extension': args.get('extension') or None,
+        'caller': args.get('caller') or None,
+        'from': parse_time('from'),
+        'to': parse_time('to'),
+        'limit': max(1, min(limit, CALL_PAGE_MAX)),
+        'cursor': None
+    }
+    if args.get('cursor'):
+        try:
+            start_time, call_id = base64.urlsafe_b64decode(args['cursor'].encode()).decode().split('|', 1)
+            filters['cursor'] = (datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S'), call_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+    return filters
+
+def encode_call_cursor(row):
+    """Opaque cursor pointing just past a row in (start_time, call_id) DESC order"""
+    return base64.urlsafe_b64encode(f"{row['start_time']:%Y-%m-%d %H:%M:%S}|{row['call_id']}".encode()).decode()
+
+def call_filter_clauses(filters, exclude_ids=()):
+    """WHERE clauses and parameters for parsed call list filters"""
+    clauses, params = [], []
+    if filters['status']:
+        clauses.append(f"status IN ({', '.join(['%s'] * len(filters['status']))})")
+        params.extend(filters['status'])
+    if filters['direction']:
+        clauses.append("direction = %s")
+        params.append(filters['direction'])
+    if filters['extension']:
+        clauses.append("extension = %s")
+        params.append(filters['extension'])
+    if filters['caller']:
+        # Prefix matches so idx_caller_id can be used
+        clauses.append("(caller_id LIKE %s OR caller_name LIKE %s)")
+        prefix = filters['caller'].replace('%', r'\%').replace('_', r'\_') + '%'
+        params.extend([prefix, prefix])
+    if filters['from']:
+        clauses.append("start_time >= %s")
+        params.append(filters['from'])
+    if filters['to']:
+        clauses.append("start_time < %s")
+        params.append(filters['to'])
+    if filters['cursor']:
+        clauses.append("(start_time < %s OR (start_time = %s AND call_id < %s))")
+        params.extend([filters['cursor'][0], filters['cursor'][0], filters['cursor'][1]])
+    if exclude_ids:
+        clauses.append(f"call_id NOT IN ({', '.join(['%s'] * len(exclude_ids))})")
+        params.extend(exclude_ids)
+    return clauses, params
+
+def fetch_call_page(cursor, filters, exclude_ids=()):
+    """One page of calls newest first via keyset pagination; returns (rows, next_cursor)"""
+    clauses, params = call_filter_clauses(filters, exclude_ids)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = f"""
+        SELECT {CALL_LIST_COLUMNS}
+        FROM {{table}}
+        {where}
+        ORDER BY start_time DESC, call_id DESC
+        LIMIT %s
+    """
+    params.append(filters['limit'] + 1)
+    cursor.execute(query.format(table='calls'), params)
+    rows = cursor.fetchall()
+    
+    # Archived calls are all older than the newest archived start_time, so the archive is only
+    # read when the hot rows run out or reach back that far
+    if call_archiver.needs_archive(filters['from']):
+        oldest = rows[-1]['start_time'] if rows else None
+        newest_archived = call_archiver.newest_start
+        if len(rows) <= filters['limit'] or not oldest or not newest_archived or oldest <= newest_archived:
+            cursor.execute(query.format(table=ARCHIVE_TABLE), params)
+            rows = list(rows) + list(cursor.fetchall())
+            rows.sort(key=lambda row: (row['start_time'] or datetime.min, row['call_id']), reverse=True)
+            rows = rows[:filters['limit'] + 1]
+    
+    next_cursor = None
+    if len(rows) > filters['limit']:
+        rows = rows[:filters['limit']]
+        if rows[-1]['start_time']:
+            next_cursor = encode_call_cursor(rows[-1])
+    return rows, next_cursor
+
+def public_call_from_row(db_call):
+    """Shape a calls row the way the calls page expects it"""
+    # Ensure start_time is a string
+    start_time = db_call['start_time']
+    if isinstance(start_time, datetime):
+        start_time = start_time.isoformat()
+    elif not start_time:
+        start_time = datetime.now().isoformat()
+    
+    return {
+        'id': db_call['call_id'],
+        'call_id': db_call['call_id'],
+        'caller_id': db_call['caller_id'],
+        'caller_name': db_call['caller_name'],
+        'caller_number': db_call['caller_id'],
+        'status': db_call['status'],
+        'display_status': db_call['display_status'],
+        'direction': db_call['direction'],
+        'extension': db_call['extension'],
+        'start_time': start_time,
+        'end_time': db_call['end_time'],
+        'duration': db_call['duration'] or 0,
+        'recording_path': db_call['recording_path'],
+        'is_recording': False,
+        'created_at': start_time,
+        'source': 'phone_simulator',  # Default source for database calls
+        'sip_channel': None  # No SIP channel for database calls
+    }
+
+def find_call_recording(cursor, call_id):
+    """Row with the recording_path of a call, looking in calls_archive when it is not in calls"""
+    for table in ('calls', ARCHIVE_TABLE):
+        cursor.execute(f"""
+            SELECT recording_path FROM {table}
+            WHERE call_id = %s AND recording_path IS NOT NULL
+            ORDER BY start_time DESC LIMIT 1
+        """, (call_id,))
+        result = cursor.fetchone()
+        if result:
+            return result
+    return None
+
+def format_calls_version(updated_at, call_id=''):
+    """Change version token: the (updated_at, call_id) of the last change a client has seen"""
+    return f"{updated_at.strftime('%Y-%m-%d %H:%M:%S')}|{call_id}"
+
+def parse_calls_version(version):
+    """(updated_at, call_id) from a version token; raises ValueError on bad input"""
+    updated_at, _sep, call_id = version.partition('|')
+    return datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S'), call_id
+
+def get_calls_version(cursor):
+    """Change version of the calls table: its newest updated_at, before any call in that second"""
+    cursor.execute("SELECT MAX(updated_at) AS version FROM calls")
+    version = cursor.fetchone()['version']
+    return format_calls_version(version) if version else None
+
+def call_matches_filters(call, filters):
+    """Apply the SQL call list filters to an in-memory active call"""
+    start_time = call.get('start_time')
+    if isinstance(start_time, str):
+        try:
+            start_time = datetime.fromisoformat(start_time)
+        except ValueError:
+            start_time = None
+    if filters['status'] and call.get('status') not in filters['status']:
+        return False
+    if filters['direction'] and call.get('direction') != filters['direction']:
+        return False
+    if filters['extension'] and str(call.get('extension')) != filters['extension']:
+        return False
+    if filters['caller'] and not (str(call.get('caller_id') or '').startswith(filters['caller']) or
+                                  str(call.get('caller_name') or '').startswith(filters['caller'])):
+        return False
+    if start_time and filters['from'] and start_time < filters['from']:
+        return False
+    if start_time and filters['to'] and start_time >= filters['to']:
+        return False
+    return True
+
 # API Routes
 @app.route('/api/calls', methods=['GET'])
 @login_required
 def get_calls():
-    """Get all calls (active and historical)"""
+    """Get a page of calls, newest first (pass next_cursor back as ?cursor= for older calls)"""
+    connection = None
+    try:
+        filters = parse_call_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'calls': [], 'count': 0}), 400
+    
     try:
         connection = get_db_connection()
         with connection.cursor() as cursor:
-            # Get all calls from database
-            cursor.execute("""
-                SELECT call_id, caller_id, caller_name, status, direction,
-                       start_time, end_time, duration, recording_path,
-                       CASE
-                           WHEN status = 'ringing' THEN 'incoming'
-                           WHEN status = 'answered' THEN 'active'
-                           WHEN status IN ('ended', 'rejected', 'missed') THEN 'ended'
-                           ELSE status
-                       END as display_status
-                FROM calls
-                ORDER BY start_time DESC
-            """)
-            db_calls = cursor.fetchall()
+            db_calls, next_cursor = fetch_call_page(cursor, filters)
 
-            # Combine database calls with active calls
             all_calls = []
 
             for db_call in db_calls:
@@ -911,6 +1417,7 @@ def get_calls():
                     'status': db_call['status'],
                     'display_status': db_call['display_status'],
                     'direction': db_call['direction'],
+                    'extension': db_call['extension'],
                     'start_time': db_call['start_time'],
                     'end_time': db_call['end_time'],
                     'duration': db_call['duration'] or 0,
@@ -919,13 +1426,12 @@ def get_calls():
                     'created_at': db_call['start_time']
                 })
 
-            # Sort by creation time (newest first)
-            all_calls.sort(key=lambda x: x['created_at'], reverse=True)
-
             return jsonify({
                 'success': True,
                 'calls': all_calls,
-                'count': len(all_calls)
+                'count': len(all_calls),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             })
 
     except Exception as e:
@@ -940,32 +1446,101 @@ def get_calls():
         if connection:
             connection.close()
 
+def export_response(name, queries, columns):
+    """Stream an export of queries' rows in the ?format= requested (csv, ndjson or parquet)"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Parquet export requires pyarrow'}), 400
+    
+    # History tolerates some replica lag; the connection is held for the whole download
+    connection = get_read_connection(max_lag=60)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"{name}_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    return Response(
+        stream_with_context(export_stream(connection, queries, columns, fmt, logger=logger)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/calls/export', methods=['GET'])
+@login_required
+def export_calls():
+    """Stream call history as CSV, NDJSON or Parquet (?format=, plus the /api/calls filters)"""
+    try:
+        filters = parse_call_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    filters['cursor'] = None
+    
+    clauses, params = call_filter_clauses(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    columns = ', '.join(name for name, _ in CALL_EXPORT_COLUMNS)
+    queries = []
+    # Archived calls are the older ones, so they stream first when the range reaches them
+    if call_archiver.needs_archive(filters['from']):
+        queries.append((f"SELECT {columns} FROM {ARCHIVE_TABLE} {where} ORDER BY start_time", params))
+    queries.append((f"SELECT {columns} FROM calls {where} ORDER BY start_time", params))
+    
+    try:
+        return export_response('calls', queries, CALL_EXPORT_COLUMNS)
+    except Exception as e:
+        logger.error(f"Error exporting calls: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/incidents/export', methods=['GET'])
+@login_required
+def export_incidents():
+    """Stream incidents as CSV, NDJSON or Parquet (?format=&from=&to=&status=)"""
+    clauses, params = [], []
+    try:
+        for name, op in (('from', '>='), ('to', '<')):
+            if request.args.get(name):
+                clauses.append(f"created_at {op} %s")
+                params.append(datetime.fromisoformat(request.args[name]))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'from and to must be ISO datetimes'}), 400
+    if request.args.get('status'):
+        clauses.append("status = %s")
+        params.append(request.args['status'])
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    columns = ', '.join(name for name, _ in INCIDENT_EXPORT_COLUMNS)
+    queries = [(f"SELECT {columns} FROM incidents {where} ORDER BY created_at", params)]
+    
+    try:
+        return export_response('incidents', queries, INCIDENT_EXPORT_COLUMNS)
+    except Exception as e:
+        logger.error(f"Error exporting incidents: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/calls/public', methods=['GET'])
 def get_calls_public():
-    """Get all calls (public endpoint for calls page)"""
+    """Get a page of calls for the calls page; the first page also lists live calls"""
+    connection = None
     try:
-        connection = get_db_connection()
+        filters = parse_call_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'calls': [], 'count': 0}), 400
+    
+    try:
+        # Live calls lead the first page only; later pages are pure history
+        live_calls = {}
+        if not filters['cursor']:
+            live_calls = {call_id: call_data for call_id, call_data in list(active_calls.items())
+                          if call_matches_filters(call_data, filters)}
+        
+        connection = get_read_connection()
         with connection.cursor() as cursor:
-            # Get all calls from database
-            cursor.execute("""
-                SELECT call_id, caller_id, caller_name, status, direction, 
-                       start_time, end_time, duration, recording_path,
-                       CASE 
-                           WHEN status = 'ringing' THEN 'incoming'
-                           WHEN status = 'answered' THEN 'active'
-                           WHEN status IN ('ended', 'rejected', 'missed') THEN 'ended'
-                           ELSE status
-                       END as display_status
-                FROM calls 
-                ORDER BY start_time DESC
-            """)
-            db_calls = cursor.fetchall()
+            # Read the version first so /api/calls/changes?since= can only overlap this page
+            version = get_calls_version(cursor)
+            db_calls, next_cursor = fetch_call_page(cursor, filters, exclude_ids=list(live_calls))
             
-            # Combine database calls with active calls
             all_calls = []
             
             # Add active calls first
-            for call_id, call_data in active_calls.items():
+            for call_id, call_data in live_calls.items():
                 # Ensure start_time is a string for consistent handling
                 start_time = call_data.get('start_time')
                 if isinstance(start_time, datetime):
@@ -982,6 +1557,7 @@ def get_calls_public():
                     'status': call_data['status'],
                     'display_status': 'incoming' if call_data['status'] == 'ringing' else 'active',
                     'direction': call_data['direction'],
+                    'extension': call_data.get('extension'),
                     'start_time': start_time,
                     'end_time': call_data.get('end_time'),
                     'duration': call_data.get('duration', 0),
@@ -991,43 +1567,19 @@ def get_calls_public():
                     'source': call_data.get('source', 'phone_simulator'),  # Include source field
                     'sip_channel': call_data.get('sip_channel')  # Include SIP channel for AMI calls
                 })
+            # Live calls newest first; database rows already arrive in order
+            all_calls.sort(key=lambda x: x['created_at'] if x['created_at'] else '', reverse=True)
             
-            # Add database calls that aren't in active calls
             for db_call in db_calls:
-                if db_call['call_id'] not in active_calls:
-                    # Ensure start_time is a string
-                    start_time = db_call['start_time']
-                    if isinstance(start_time, datetime):
-                        start_time = start_time.isoformat()
-                    elif not start_time:
-                        start_time = datetime.now().isoformat()
-                    
-                    all_calls.append({
-                        'id': db_call['call_id'],
-                        'call_id': db_call['call_id'],
-                        'caller_id': db_call['caller_id'],
-                        'caller_name': db_call['caller_name'],
-                        'caller_number': db_call['caller_id'],
-                        'status': db_call['status'],
-                        'display_status': db_call['display_status'],
-                        'direction': db_call['direction'],
-                        'start_time': start_time,
-                        'end_time': db_call['end_time'],
-                        'duration': db_call['duration'] or 0,
-                        'recording_path': db_call['recording_path'],
-                        'is_recording': False,
-                        'created_at': start_time,
-                        'source': 'phone_simulator',  # Default source for database calls
-                        'sip_channel': None  # No SIP channel for database calls
-                    })
-            
-            # Sort by creation time (newest first) - handle string dates properly
-            all_calls.sort(key=lambda x: x['created_at'] if x['created_at'] else '', reverse=True)
+                all_calls.append(public_call_from_row(db_call))
             
             return jsonify({
                 'success': True,
                 'calls': all_calls,
-                'count': len(all_calls)
+                'count': len(all_calls),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+                'version': version
             })
             
     except Exception as e:
@@ -1042,6 +1594,63 @@ def get_calls_public():
         if connection:
             connection.close()
 
+CALL_CHANGES_MAX = 500
+CALL_TERMINAL_STATUSES = ('ended', 'rejected', 'missed', 'completed', 'transferred')
+
+@app.route('/api/calls/changes', methods=['GET'])
+def get_call_changes():
+    """Get calls inserted or updated since a version from /api/calls/public or a previous poll"""
+    connection = None
+    since = request.args.get('since')
+    try:
+        if since:
+            since_time, since_call_id = parse_calls_version(since)
+    except ValueError:
+        return jsonify({'success': False, 'error': f"Invalid version: {since}"}), 400
+    
+    try:
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            if not since:
+                # No baseline yet: hand out the current version only
+                return jsonify({'success': True, 'calls': [], 'ended': [], 'count': 0,
+                                'has_more': False, 'version': get_calls_version(cursor)})
+            
+            # Strictly after the last change seen, so every page moves the version forward.
+            # updated_at has one-second resolution: the current second is only read once
+            # it is over, so a row stamped in it that commits late is not skipped.
+            cursor.execute(f"""
+                SELECT {CALL_LIST_COLUMNS}, updated_at
+                FROM calls
+                WHERE (updated_at, call_id) > (%s, %s) AND updated_at < NOW()
+                ORDER BY updated_at ASC, call_id ASC
+                LIMIT %s
+            """, (since_time, since_call_id, CALL_CHANGES_MAX + 1))
+            rows = cursor.fetchall()
+        
+        has_more = len(rows) > CALL_CHANGES_MAX
+        rows = rows[:CALL_CHANGES_MAX]
+        version = since
+        if rows:
+            version = format_calls_version(rows[-1]['updated_at'], rows[-1]['call_id'])
+        
+        return jsonify({
+            'success': True,
+            'calls': [public_call_from_row(row) for row in rows],
+            # Tombstones: calls that are over and can leave live-call views
+            'ended': [row['call_id'] for row in rows if row['status'] in CALL_TERMINAL_STATUSES],
+            'count': len(rows),
+            'has_more': has_more,
+            'version': version
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting call changes: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
 @app.route('/api/calls/make', methods=['POST'])
 @login_required
 def make_call():
@@ -1080,13 +1689,15 @@ def answer_call(call_id):
             active_calls[call_id]['start_time'] = datetime.now().isoformat()
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'answered', start_time = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'answered')
             
             # Automatically start recording when call is answered
             if AUDIO_AVAILABLE:
@@ -1159,13 +1770,15 @@ def test_answer_call(call_id):
             active_calls[call_id]['start_time'] = datetime.now().isoformat()
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'answered', start_time = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'answered')
             
             # Automatically start recording when call is answered
             if AUDIO_AVAILABLE:
@@ -1278,6 +1891,7 @@ def test_hangup_call(call_id):
                             WHERE call_id = %s
                         """, (recording_path, call_id))
                         connection.commit()
+                        call_stats.recording_saved(call_id)
                     
                 except Exception as recording_error:
                     logger.error(f"Error stopping recording during hangup: {recording_error}")
@@ -1300,13 +1914,15 @@ def test_hangup_call(call_id):
             active_calls[call_id]['recording'] = False
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'ended', end_time = %s, duration = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), duration, call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'ended', duration)
             
             # Emit WebSocket update
             socketio.emit('call_update', active_calls[call_id])
@@ -1397,6 +2013,7 @@ def reject_call(call_id):
                             WHERE call_id = %s
                         """, (recording_path, call_id))
                         connection.commit()
+                        call_stats.recording_saved(call_id)
                     
                 except Exception as recording_error:
                     logger.error(f"Error stopping recording during reject: {recording_error}")
@@ -1407,13 +2024,15 @@ def reject_call(call_id):
             active_calls[call_id]['recording'] = False
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'rejected', end_time = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'rejected')
             
             # Emit WebSocket update
             socketio.emit('call_update', active_calls[call_id])
@@ -1511,6 +2130,7 @@ def transfer_call(call_id):
                             WHERE call_id = %s
                         """, (recording_path, call_id))
                         connection.commit()
+                        call_stats.recording_saved(call_id)
                     
                 except Exception as recording_error:
                     logger.error(f"Error stopping recording during transfer: {recording_error}")
@@ -1521,13 +2141,15 @@ def transfer_call(call_id):
             active_calls[call_id]['recording'] = False
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'transferred', end_time = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'transferred')
             
             # Emit WebSocket update
             socketio.emit('call_update', active_calls[call_id])
@@ -1555,6 +2177,140 @@ def transfer_call(call_id):
         logger.error(f"Error transferring call: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/campaigns', methods=['POST'])
+@login_required
+def create_campaign():
+    """Start an outbound dialing campaign over AMI Originate"""
+    try:
+        data = request.get_json() or {}
+        
+        # Accept either a JSON list or newline/comma separated text
+        numbers = data.get('numbers', [])
+        if isinstance(numbers, str):
+            numbers = numbers.replace(',', '\n').splitlines()
+        
+        campaign_id = campaign_dialer.create_campaign(
+            name=data.get('name'),
+            numbers=numbers,
+            context=data.get('context', 'internal'),
+            extension=data.get('extension', DEFAULT_EXTENSION),
+            channel_template=data.get('channel_template', 'PJSIP/{number}'),
+            caller_id=data.get('caller_id', ''),
+            max_concurrent=data.get('max_concurrent', 10),
+            calls_per_second=data.get('calls_per_second', 2),
+            originate_timeout=data.get('originate_timeout', 30000)
+        )
+        
+        return jsonify({
+            'success': True,
+            'campaign_id': campaign_id,
+            'data': campaign_dialer.get_campaign(campaign_id)
+        }), 201
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error creating campaign: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/campaigns', methods=['GET'])
+@login_required
+def get_campaigns():
+    """List campaigns, live ones from memory and the rest from the database"""
+    try:
+        live = {c['campaign_id']: c for c in campaign_dialer.list_campaigns()}
+        
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT campaign_id, name, status, total_numbers, max_concurrent, calls_per_second,
+                       created_at, finished_at
+                FROM campaigns
+                ORDER BY created_at DESC
+                LIMIT 50
+            """)
+            rows = cursor.fetchall()
+        connection.close()
+        
+        campaigns = []
+        for row in rows:
+            if row['campaign_id'] in live:
+                campaigns.append(live.pop(row['campaign_id']))
+            else:
+                campaigns.append({
+                    'campaign_id': row['campaign_id'],
+                    'name': row['name'],
+                    'status': row['status'],
+                    'total': row['total_numbers'],
+                    'max_concurrent': row['max_concurrent'],
+                    'calls_per_second': float(row['calls_per_second']),
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                    'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None
+                })
+        
+        return jsonify({
+            'success': True,
+            'data': list(live.values()) + campaigns
+        })
+    
+    except Exception as e:
+        logger.error(f"Error listing campaigns: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/campaigns/<campaign_id>', methods=['GET'])
+@login_required
+def get_campaign(campaign_id):
+    """Get campaign progress and per-status attempt counts"""
+    summary = campaign_dialer.get_campaign(campaign_id)
+    if summary:
+        return jsonify({'success': True, 'data': summary})
+    
+    connection = None
+    try:
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT * FROM campaigns WHERE campaign_id = %s", (campaign_id,))
+            campaign = cursor.fetchone()
+            if not campaign:
+                return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+            
+            cursor.execute("""
+                SELECT status, COUNT(*) as count FROM campaign_attempts
+                WHERE campaign_id = %s GROUP BY status
+            """, (campaign_id,))
+            counts = {row['status']: row['count'] for row in cursor.fetchall()}
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'campaign_id': campaign['campaign_id'],
+                'name': campaign['name'],
+                'status': campaign['status'],
+                'total': campaign['total_numbers'],
+                'in_flight': 0,
+                'counts': counts,
+                'max_concurrent': campaign['max_concurrent'],
+                'calls_per_second': float(campaign['calls_per_second']),
+                'created_at': campaign['created_at'].isoformat() if campaign['created_at'] else None,
+                'finished_at': campaign['finished_at'].isoformat() if campaign['finished_at'] else None
+            }
+        })
+    
+    except Exception as e:
+        logger.error(f"Error getting campaign {campaign_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        if connection:
+            connection.close()
+
+@app.route('/api/campaigns/<campaign_id>/cancel', methods=['POST'])
+@login_required
+def cancel_campaign(campaign_id):
+    """Stop dialing the remaining numbers of a campaign"""
+    if campaign_dialer.cancel_campaign(campaign_id):
+        return jsonify({'success': True, 'message': 'Campaign cancelled'})
+    return jsonify({'success': False, 'error': 'Campaign not running'}), 404
+
 @app.route('/api/forwarding-rules', methods=['GET'])
 @login_required
 def get_forwarding_rules():
@@ -1622,6 +2378,7 @@ def create_forwarding_rule():
             ))
             connection.commit()
         
+        agi_server.invalidate_forwarding_rules()
         return jsonify({'success': True, 'message': 'Rule created successfully'})
     
     except Exception as e:
@@ -1647,6 +2404,62 @@ def get_sip_status():
         logger.error(f"Error getting SIP status: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ami/health', methods=['GET'])
+def get_ami_health():
+    """Get AMI connection health metrics for monitoring"""
+    metrics = ami_supervisor.metrics()
+    return jsonify({
+        'success': metrics['connected'],
+        'data': metrics
+    }), 200 if metrics['connected'] else 503
+
+@app.route('/api/agi/health', methods=['GET'])
+def get_agi_health():
+    """Get FastAGI listener session metrics for monitoring"""
+    metrics = agi_server.metrics()
+    metrics['call_writer'] = call_writer.metrics()
+    return jsonify({
+        'success': metrics['running'],
+        'data': metrics
+    }), 200 if metrics['running'] else 503
+
+@app.route('/api/db/health', methods=['GET'])
+def get_db_health():
+    """Get database connection pool metrics for monitoring"""
+    metrics = db_pool.metrics()
+    metrics['reads'] = read_router.metrics()
+    metrics['archive'] = call_archiver.metrics()
+    return jsonify({
+        'success': True,
+        'data': metrics
+    })
+
+@app.route('/api/admin/queries', methods=['GET', 'DELETE'])
+@login_required
+def get_query_profile():
+    """Top statements by cost (?limit=20&order=total_ms|avg_ms|max_ms|count|slow); DELETE resets"""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    if request.method == 'DELETE':
+        query_profiler.reset()
+        return jsonify({'success': True, 'message': 'Query profile reset'})
+    
+    order = request.args.get('order', 'total_ms')
+    if order not in ('total_ms', 'avg_ms', 'max_ms', 'count', 'slow'):
+        return jsonify({'success': False, 'error': 'order must be total_ms, avg_ms, max_ms, count or slow'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    
+    return jsonify({
+        'success': True,
+        'enabled': db_pool.cursor_wrapper is not None,
+        'summary': query_profiler.metrics(),
+        'data': query_profiler.top(limit, order)
+    })
+
 @app.route('/api/sip/simulate-call', methods=['POST'])
 @login_required
 def simulate_incoming_call():
@@ -1706,6 +2519,7 @@ def simulate_call_query():
                 datetime.now()
             ))
             connection.commit()
+            call_stats.call_started(call_id, call_data['caller_id'], call_data['caller_name'], call_data['status'])
         
         # Add to active calls
         active_calls[call_id] = call_data
@@ -1770,6 +2584,7 @@ def test_call_endpoint(phone_number):
                     datetime.now()
                 ))
                 connection.commit()
+                call_stats.call_started(call_id, call_data['caller_id'], call_data['caller_name'], call_data['status'])
             
             # Add to active calls
             active_calls[call_id] = call_data
@@ -2025,6 +2840,7 @@ def stop_call_recording(call_id):
                     WHERE call_id = %s
                 """, (recording_path, call_id))
                 connection.commit()
+                call_stats.recording_saved(call_id)
             
             # Emit WebSocket update
             socketio.emit('call_update', active_calls[call_id])
@@ -2355,7 +3171,7 @@ def test_recordings():
             recording_files = [f for f in os.listdir(recordings_dir) if f.endswith('.wav')]
         
         # Get calls with recording paths from database
-        connection = get_db_connection()
+        connection = get_read_connection()
         recorded_calls = []
         with connection.cursor() as cursor:
             cursor.execute("""
@@ -2808,6 +3624,7 @@ def toggle_call_recording(call_id):
                         WHERE call_id = %s
                     """, (recording_path, call_id))
                     connection.commit()
+                    call_stats.recording_saved(call_id)
                 
                 # Update call status
                 active_calls[call_id]['recording'] = False
@@ -3056,6 +3873,7 @@ def save_call_recording(call_id):
                     WHERE call_id = %s
                 """, (recording_path, call_id))
                 connection.commit()
+                call_stats.recording_saved(call_id)
             
             return True
         else:
@@ -3098,13 +3916,15 @@ def terminate_call(call_id, reason='user_terminated'):
             active_calls[call_id]['recording'] = False
             
             try:
+                call_writer.ensure_written(call_id)
                 connection = get_db_connection()
                 with connection.cursor() as cursor:
-                    cursor.execute("""
+                    execute_call_update(cursor, call_id, """
                         UPDATE calls SET status = 'ended', end_time = %s, duration = %s 
                         WHERE call_id = %s
                     """, (datetime.now(), duration, call_id))
                     connection.commit()
+                    call_stats.call_status(call_id, 'ended', duration)
                     logger.info(f"Database updated for call {call_id}")
             except Exception as db_error:
                 logger.error(f"Error updating database for call {call_id}: {db_error}")
@@ -3287,12 +4107,7 @@ def get_latest_recording(call_id):
             # Check database for recording path
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT recording_path FROM calls 
-                    WHERE call_id = %s AND recording_path IS NOT NULL
-                    ORDER BY start_time DESC LIMIT 1
-                """, (call_id,))
-                result = cursor.fetchone()
+                result = find_call_recording(cursor, call_id)
                 
                 if result and result['recording_path']:
                     recording_path = result['recording_path']
@@ -3483,6 +4298,7 @@ def create_incident_report():
                 incident_data['reported_by']
             ))
             connection.commit()
+            call_rollup.incident_created()
             db_incident_id = cursor.lastrowid
         
         logger.info(f"Incident report created: ID {incident_id} for call {data['call_id']}")
@@ -3597,6 +4413,7 @@ def mark_call_done(call_id):
                             WHERE call_id = %s
                         """, (recording_path, call_id))
                         connection.commit()
+                        call_stats.recording_saved(call_id)
                     
                 except Exception as recording_error:
                     logger.error(f"Error stopping recording during mark done: {recording_error}")
@@ -3617,13 +4434,15 @@ def mark_call_done(call_id):
             active_calls[call_id]['recording'] = False
             
             # Update database
+            call_writer.ensure_written(call_id)
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
+                execute_call_update(cursor, call_id, """
                     UPDATE calls SET status = 'completed', end_time = %s, duration = %s 
                     WHERE call_id = %s
                 """, (datetime.now(), duration, call_id))
                 connection.commit()
+                call_stats.call_status(call_id, 'completed', duration)
             
             # Emit WebSocket update
             socketio.emit('call_update', active_calls[call_id])
@@ -3685,12 +4504,7 @@ def get_recording_info(call_id):
             # Check database for recording path
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT recording_path FROM calls 
-                    WHERE call_id = %s AND recording_path IS NOT NULL
-                    ORDER BY start_time DESC LIMIT 1
-                """, (call_id,))
-                result = cursor.fetchone()
+                result = find_call_recording(cursor, call_id)
                 
                 if result and result['recording_path']:
                     recording_path = result['recording_path']
@@ -3725,7 +4539,7 @@ def get_recording_info(call_id):
 def get_incident_categories():
     """Get all incident categories"""
     try:
-        connection = get_db_connection()
+        connection = get_read_connection(max_lag=300)
         with connection.cursor() as cursor:
             cursor.execute("SELECT * FROM incident_categories ORDER BY name")
             categories = cursor.fetchall()
@@ -3749,7 +4563,7 @@ def get_incident_categories():
 def get_incident_category(category_id):
     """Get a specific incident category by ID"""
     try:
-        connection = get_db_connection()
+        connection = get_read_connection(max_lag=300)
         with connection.cursor() as cursor:
             cursor.execute("SELECT * FROM incident_categories WHERE id = %s", (category_id,))
             category = cursor.fetchone()
@@ -3805,6 +4619,7 @@ def asterisk_incoming():
                     VALUES (%s, %s, %s, %s, %s, %s)
                 """, (call_id, caller_id, caller_id, 'ringing', 'incoming', datetime.now()))
                 connection.commit()
+                call_stats.call_started(call_id, caller_id)
         except Exception as e:
             logger.error(f"Error storing call in database: {e}")
         finally:
@@ -3833,23 +4648,25 @@ def asterisk_status():
         if call_id and status:
             # Update call status in database
             try:
+                call_writer.ensure_written(call_id)
                 connection = get_db_connection()
                 with connection.cursor() as cursor:
                     if status == 'answered':
-                        cursor.execute("""
+                        execute_call_update(cursor, call_id, """
                             UPDATE calls SET status = %s, answered_time = %s 
                             WHERE call_id = %s
                         """, (status, datetime.now(), call_id))
                     elif status in ['ended', 'missed']:
-                        cursor.execute("""
+                        execute_call_update(cursor, call_id, """
                             UPDATE calls SET status = %s, end_time = %s 
                             WHERE call_id = %s
                         """, (status, datetime.now(), call_id))
                     else:
-                        cursor.execute("""
+                        execute_call_update(cursor, call_id, """
                             UPDATE calls SET status = %s WHERE call_id = %s
                         """, (status, call_id))
                     connection.commit()
+                    call_stats.call_status(call_id, status)
             except Exception as e:
                 logger.error(f"Error updating call status: {e}")
             finally:
@@ -3864,6 +4681,74 @@ def asterisk_status():
         logger.error(f"Error handling Asterisk status update: {e}")
         return "500 Error", 500
 
+def register_extension_1412_calls(calls):
+    """Store and announce calls reported by a standalone AGI server; returns their call ids"""
+    now = datetime.now()
+    rows = []
+    for call in calls:
+        call_id = f"asterisk_1412_{call.get('uniqueid') or uuid.uuid4()}"
+        caller_id = call.get('callerid') or 'Unknown'
+        extension = call.get('extension') or '1412'
+        logger.info(f"Incoming call to extension 1412: {caller_id} -> {extension} (ID: {call_id})")
+        rows.append((call_id, caller_id, caller_id, 'ringing', 'incoming', now, extension, call.get('channel', '')))
+    
+    # The affected-row count of each upsert says whether this request stored the call: 1 for a
+    # new row, 0 for a call_id that is already there (a retried or concurrent batch). The
+    # unique key makes a concurrent insert of the same call wait and then count as 0.
+    connection = None
+    new_rows = rows
+    try:
+        connection = get_db_connection()
+        with connection.cursor() as cursor:
+            stored = []
+            for row in rows:
+                cursor.execute("""
+                    INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, extension)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE call_id = call_id
+                """, row[:7])
+                if cursor.rowcount == 1:
+                    stored.append(row)
+            connection.commit()
+        new_rows = stored
+        if len(new_rows) < len(rows):
+            logger.info(f"Skipped {len(rows) - len(new_rows)} extension 1412 calls that were already stored")
+        for call_id, caller_id, _name, _status, _direction, start_time, _extension, _channel in new_rows:
+            call_stats.call_started(call_id, caller_id, start_time=start_time)
+    except Exception as e:
+        logger.error(f"Error storing call in database: {e}")
+    finally:
+        if connection:
+            connection.close()
+    
+    # Emit socket event for real-time call notification
+    for call_id, caller_id, _name, _status, _direction, _start, extension, channel in new_rows:
+        socketio.emit('incoming_call_1412', {
+            'call_id': call_id,
+            'caller_id': caller_id,
+            'extension': extension,
+            'channel': channel,
+            'timestamp': now.isoformat()
+        })
+    
+    return [row[0] for row in rows]
+
+@app.route('/asterisk/extension1412/batch', methods=['POST'])
+def asterisk_extension_1412_batch():
+    """Handle a batch of extension 1412 calls from a standalone AGI server"""
+    try:
+        data = request.get_json() or {}
+        calls = data.get('calls', [])
+        if not isinstance(calls, list) or not calls:
+            return jsonify({'success': False, 'error': 'calls must be a non-empty list'}), 400
+        
+        call_ids = register_extension_1412_calls(calls)
+        return jsonify({'success': True, 'call_ids': call_ids})
+    
+    except Exception as e:
+        logger.error(f"Error handling extension 1412 call batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/asterisk/extension1412', methods=['POST'])
 def asterisk_extension_1412():
     """Handle calls to extension 1412 - Flask VOIP System"""
@@ -3892,35 +4777,12 @@ def asterisk_extension_1412():
             unique_id = request.form.get('uniqueid', str(uuid.uuid4()))
             channel = request.form.get('channel', '')
         
-        # Create a new call record
-        call_id = f"asterisk_1412_{unique_id}"
-        
-        # Log the incoming call to extension 1412
-        logger.info(f"Incoming call to extension 1412: {caller_id} -> {extension} (ID: {call_id})")
-        
-        # Store call in database
-        try:
-            connection = get_db_connection()
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, extension)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (call_id, caller_id, caller_id, 'ringing', 'incoming', datetime.now(), extension))
-                connection.commit()
-        except Exception as e:
-            logger.error(f"Error storing call in database: {e}")
-        finally:
-            if connection:
-                connection.close()
-        
-        # Emit socket event for real-time call notification
-        socketio.emit('incoming_call_1412', {
-            'call_id': call_id,
-            'caller_id': caller_id,
+        call_id = register_extension_1412_calls([{
+            'callerid': caller_id,
             'extension': extension,
-            'channel': channel,
-            'timestamp': datetime.now().isoformat()
-        })
+            'uniqueid': unique_id,
+            'channel': channel
+        }])[0]
         
         # Return AGI response to Asterisk with instructions
         response = f"""200 result=1
@@ -3942,6 +4804,14 @@ def asterisk_answer_call():
         call_id = request.form.get('call_id')
         channel = request.form.get('channel')
         
+        # Fall back to the live channel cache instead of asking Asterisk
+        if not channel:
+            cached = ami_events.get_channel_state(call_id=call_id)
+            if cached:
+                channel = cached['channel']
+            elif call_id in active_calls:
+                channel = active_calls[call_id].get('sip_channel')
+        
         if not channel:
             return jsonify({'success': False, 'error': 'Channel required'}), 400
         
@@ -3955,13 +4825,15 @@ def asterisk_answer_call():
         if result and 'Success' in result:
             # Update call status in database
             try:
+                call_writer.ensure_written(call_id)
                 connection = get_db_connection()
                 with connection.cursor() as cursor:
-                    cursor.execute("""
+                    execute_call_update(cursor, call_id, """
                         UPDATE calls SET status = %s, answered_time = %s 
                         WHERE call_id = %s
                     """, ('answered', datetime.now(), call_id))
                     connection.commit()
+                    call_stats.call_status(call_id, 'answered')
             except Exception as e:
                 logger.error(f"Error updating call status: {e}")
             finally:
@@ -3985,6 +4857,14 @@ def asterisk_hangup_call():
         call_id = request.form.get('call_id')
         channel = request.form.get('channel')
         
+        # Fall back to the live channel cache instead of asking Asterisk
+        if not channel:
+            cached = ami_events.get_channel_state(call_id=call_id)
+            if cached:
+                channel = cached['channel']
+            elif call_id in active_calls:
+                channel = active_calls[call_id].get('sip_channel')
+        
         if not channel:
             return jsonify({'success': False, 'error': 'Channel required'}), 400
         
@@ -3994,13 +4874,15 @@ def asterisk_hangup_call():
         if result and 'Success' in result:
             # Update call status in database
             try:
+                call_writer.ensure_written(call_id)
                 connection = get_db_connection()
                 with connection.cursor() as cursor:
-                    cursor.execute("""
+                    execute_call_update(cursor, call_id, """
                         UPDATE calls SET status = %s, end_time = %s 
                             WHERE call_id = %s
                     """, ('ended', datetime.now(), call_id))
                     connection.commit()
+                    call_stats.call_status(call_id, 'ended')
             except Exception as e:
                 logger.error(f"Error updating call status: {e}")
             finally:
@@ -4055,6 +4937,7 @@ def test_agi_call():
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 """, (test_call_id, test_caller_id, test_caller_name, 'ringing', 'incoming', datetime.now(), '1412', 'ami'))
                 connection.commit()
+                call_stats.call_started(test_call_id, test_caller_id, test_caller_name)
         except Exception as e:
             logger.error(f"Error storing test call in database: {e}")
         finally:
@@ -4075,8 +4958,78 @@ def test_agi_call():
         logger.error(f"Error creating test AGI call: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def mark_calls_persisted(call_ids):
+    """Write-behind callback: flag calls whose row is now committed"""
+    for call_id in call_ids:
+        call = active_calls.get(call_id)
+        if call is not None:
+            call['persisted'] = True
+
+def execute_call_update(cursor, call_id, sql, params):
+    """UPDATE a call row now, or queue it behind the row's insert if call_writer has still not written it"""
+    if call_writer.defer(call_id, sql, params):
+        logger.warning(f"Call {call_id} not written yet, its update will run after the insert")
+        return False
+    cursor.execute(sql, params)
+    return True
+
+# Initialize write-behind queue for new call rows
+call_writer = WriteBehindQueue(
+    get_db_connection,
+    """
+        INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, sip_channel, extension, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE sip_channel = VALUES(sip_channel)
+    """,
+    flush_size=100,
+    flush_interval=0.05,
+    on_flushed=mark_calls_persisted,
+    logger=logger,
+    name="Call-Writer"
+)
+
+# Old ended calls move to calls_archive so list queries and counts stay on a small hot table
+call_archiver = CallArchiver(
+    get_db_connection,
+    retain_days=int(os.environ.get('CALL_ARCHIVE_DAYS', '90')),
+    chunk_size=int(os.environ.get('CALL_ARCHIVE_CHUNK_SIZE', '500')),
+    logger=logger
+)
+
+# Initialize dashboard counters
+call_stats = CallStatsTracker(
+    get_db_connection,
+    reconcile_interval=int(os.environ.get('DASHBOARD_RECONCILE_SECONDS', '60')),
+    archive_totals=call_archiver.totals,
+    logger=logger
+)
+
+# Initialize call_statistics rollup, fed by the counters' transition hooks
+call_rollup = CallRollup(
+    get_db_connection,
+    chunk_size=int(os.environ.get('ROLLUP_CHUNK_SIZE', '1000')),
+    logger=logger
+)
+call_stats.add_finish_listener(call_rollup.call_finished)
+call_stats.add_recording_listener(call_rollup.recording_saved)
+
 # Initialize AGI server
-agi_server = AGIServer(host='0.0.0.0', port=5001, logger=logger, socketio_instance=socketio)
+agi_server = AGIServer(
+    host='0.0.0.0',
+    port=5001,
+    logger=logger,
+    socketio_instance=socketio,
+    backlog=int(os.environ.get('AGI_LISTEN_BACKLOG', '512')),
+    max_sessions=int(os.environ.get('AGI_MAX_SESSIONS', '500')),
+    route_deadline=float(os.environ.get('AGI_ROUTE_DEADLINE_MS', '250')) / 1000,
+    workers=int(os.environ.get('AGI_WORKERS', '1'))
+)
+
+# Initialize AMI event consumer
+ami_events = AMIEventConsumer(ami, logger=logger, socketio_instance=socketio, extensions=[DEFAULT_EXTENSION])
+
+# Initialize outbound campaign dialer
+campaign_dialer = CampaignDialer(ami, get_db_connection, logger=logger, socketio_instance=socketio)
 
 # Initialize application
 def init_app():
@@ -4094,6 +5047,14 @@ def init_app():
         except Exception as e:
             logger.warning(f"SIP service initialization failed: {e}")
         
+        # Start the call row writer before anything can register calls
+        call_writer.start()
+        call_stats.start()
+        call_rollup.start()
+        call_archiver.start()
+        if db_pool.cursor_wrapper:
+            query_profiler.start()
+        
         # Start AGI server
         try:
             logger.info("Attempting to start AGI server...")
@@ -4106,6 +5067,14 @@ def init_app():
             logger.error(f"AGI server initialization failed: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
+        
+        # Start consuming AMI events for real-time call state
+        try:
+            ami_supervisor.start()
+            ami_events.start()
+            campaign_dialer.start()
+        except Exception as e:
+            logger.error(f"AMI event consumer initialization failed: {e}")
             
     except Exception as e:
         logger.error(f"Failed to initialize application: {e}")
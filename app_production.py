@@ -18,20 +18,7 @@ from io import BytesIO
 import subprocess
 import uuid
 import json
-
-# Database imports
-try:
-    import pymysql
-    MYSQL_AVAILABLE = True
-except ImportError:
-    MYSQL_AVAILABLE = False
-
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    POSTGRES_AVAILABLE = True
-except ImportError:
-    POSTGRES_AVAILABLE = False
+from db_adapter import get_adapter, resolve_database_config
 
 # Try to import audio libraries, but make them optional
 try:
@@ -60,56 +47,21 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database configuration - supports both local and remote
-def get_database_config():
-    """Get database configuration based on environment"""
-    if os.getenv('DATABASE_URL'):
-        # Render PostgreSQL
-        return {
-            'type': 'postgresql',
-            'url': os.getenv('DATABASE_URL')
-        }
-    else:
-        # Local MySQL
-        return {
-            'type': 'mysql',
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', '1412'),
-            'database': os.getenv('DB_NAME', 'resource_allocation'),
-            'charset': 'utf8mb4'
-        }
+# Database backend, resolved once: DATABASE_URL selects Render PostgreSQL, otherwise local MySQL
+db = get_adapter(
+    resolve_database_config(),
+    pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+    max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+    logger=logger
+)
 
 # Database connection function
 def get_db_connection():
-    """Get database connection based on configuration"""
-    config = get_database_config()
-    
+    """Get a pooled database connection for the configured backend"""
     try:
-        if config['type'] == 'postgresql':
-            if not POSTGRES_AVAILABLE:
-                raise Exception("PostgreSQL driver not available")
-            
-            connection = psycopg2.connect(
-                config['url'],
-                cursor_factory=RealDictCursor
-            )
-            return connection
-            
-        elif config['type'] == 'mysql':
-            if not MYSQL_AVAILABLE:
-                raise Exception("MySQL driver not available")
-            
-            connection = pymysql.connect(
-                host=config['host'],
-                user=config['user'],
-                password=config['password'],
-                database=config['database'],
-                charset=config['charset'],
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            return connection
-            
+        return db.connection()
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         raise
@@ -127,128 +79,66 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Asterisk Manager Interface (AMI) integration
-class AsteriskAMI:
-    def __init__(self):
-        self.host = os.getenv('ASTERISK_AMI_HOST', '127.0.0.1')
-        self.port = int(os.getenv('ASTERISK_AMI_PORT', '5038'))
-        self.username = os.getenv('ASTERISK_AMI_USERNAME', 'admin')
-        self.secret = os.getenv('ASTERISK_AMI_SECRET', 'admin')
-        self.connected = False
-        self.logger = logging.getLogger(__name__)
-    
-    def connect(self):
-        """Connect to Asterisk AMI"""
-        try:
-            import socket
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-            
-            # Login to AMI
-            login_msg = f"Action: Login\r\nUsername: {self.username}\r\nSecret: {self.secret}\r\n\r\n"
-            self.socket.send(login_msg.encode())
-            
-            response = self.socket.recv(1024).decode()
-            if "Success" in response:
-                self.connected = True
-                self.logger.info("Connected to Asterisk AMI")
-                return True
-            else:
-                self.logger.error(f"AMI login failed: {response}")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"Failed to connect to AMI: {e}")
-            return False
-    
-    def send_action(self, action, params=None):
-        """Send an action to Asterisk AMI"""
-        if not self.connected:
-            if not self.connect():
-                return None
-        
-        try:
-            if params is None:
-                params = {}
-            
-            message = f"Action: {action}\r\n"
-            for key, value in params.items():
-                message += f"{key}: {value}\r\n"
-            message += "\r\n"
-            
-            self.socket.send(message.encode())
-            response = self.socket.recv(1024).decode()
-            return response
-            
-        except Exception as e:
-            self.logger.error(f"Failed to send AMI action {action}: {e}")
-            self.connected = False
-            return None
+from asterisk_ami import AsteriskAMI
 
 # Initialize AMI
-ami = AsteriskAMI()
+ami = AsteriskAMI(
+    host=os.getenv('ASTERISK_AMI_HOST', '127.0.0.1'),
+    port=int(os.getenv('ASTERISK_AMI_PORT', '5038')),
+    username=os.getenv('ASTERISK_AMI_USERNAME', 'admin'),
+    secret=os.getenv('ASTERISK_AMI_SECRET', 'admin')
+)
 
 # Database initialization
 def init_database():
     """Initialize database tables"""
+    connection = None
     try:
         connection = get_db_connection()
         with connection.cursor() as cursor:
-            # Create calls table if it doesn't exist
-            if get_database_config()['type'] == 'postgresql':
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS calls (
-                        id SERIAL PRIMARY KEY,
-                        call_id VARCHAR(50) UNIQUE NOT NULL,
-                        caller_id VARCHAR(20) NOT NULL,
-                        caller_name VARCHAR(100),
-                        status VARCHAR(20) DEFAULT 'ringing',
-                        direction VARCHAR(20) DEFAULT 'inbound',
-                        start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        end_time TIMESTAMP,
-                        duration INTEGER,
-                        user_id INTEGER,
-                        sip_channel VARCHAR(100),
-                        recording_path VARCHAR(255),
-                        notes TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Create users table if it doesn't exist
-                cursor.execute("""
+            # On MySQL the users table already exists in the resource_allocation database
+            if db.is_postgresql:
+                for statement in db.ddl("""
                     CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
+                        id INT AUTO_INCREMENT PRIMARY KEY,
                         username VARCHAR(50) UNIQUE NOT NULL,
                         email VARCHAR(100) UNIQUE NOT NULL,
                         password_hash VARCHAR(255) NOT NULL,
                         full_name VARCHAR(100),
                         role VARCHAR(20) DEFAULT 'user',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-            else:
-                # MySQL version
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS calls (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        call_id VARCHAR(50) UNIQUE NOT NULL,
-                        caller_id VARCHAR(20) NOT NULL,
-                        caller_name VARCHAR(100),
-                        status VARCHAR(20) DEFAULT 'ringing',
-                        direction VARCHAR(20) DEFAULT 'inbound',
-                        start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        end_time DATETIME,
-                        duration INT,
-                        user_id INT,
-                        sip_channel VARCHAR(100),
-                        recording_path VARCHAR(255),
-                        notes TEXT,
                         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
                     )
-                """)
+                """):
+                    cursor.execute(statement)
+            
+            # Create calls table if it doesn't exist
+            for statement in db.ddl("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    call_id VARCHAR(50) UNIQUE NOT NULL,
+                    caller_id VARCHAR(20) NOT NULL,
+                    caller_name VARCHAR(100),
+                    status VARCHAR(20) DEFAULT 'ringing',
+                    direction VARCHAR(20) DEFAULT 'inbound',
+                    start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    end_time DATETIME,
+                    duration INT,
+                    user_id INT,
+                    sip_channel VARCHAR(100),
+                    extension VARCHAR(20),
+                    recording_path VARCHAR(255),
+                    notes TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """):
+                cursor.execute(statement)
+            
+            # Tables created by earlier releases lack the extension column the call handler writes
+            if not db.column_exists(cursor, 'calls', 'extension'):
+                cursor.execute("ALTER TABLE calls ADD COLUMN extension VARCHAR(20)")
+                logger.info("Added extension column to calls table")
             
             connection.commit()
             logger.info("Database initialized successfully")
@@ -300,14 +190,19 @@ def asterisk_extension_1412():
         # Log the incoming call to extension 1412
         logger.info(f"Incoming call to extension 1412: {caller_id} -> {extension} (ID: {call_id})")
         
-        # Store call in database
+        # Store call in database; a retried AGI request for the same call is a no-op
+        connection = None
         try:
             connection = get_db_connection()
             with connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO calls (call_id, caller_id, caller_name, status, direction, start_time, extension)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (call_id, caller_id, caller_id, 'ringing', 'incoming', datetime.now(), extension))
+                db.upsert(
+                    cursor,
+                    'calls',
+                    ('call_id', 'caller_id', 'caller_name', 'status', 'direction', 'start_time', 'extension'),
+                    [(call_id, caller_id, caller_id, 'ringing', 'incoming', datetime.now(), extension)],
+                    key_columns=('call_id',),
+                    update_columns=()
+                )
                 connection.commit()
         except Exception as e:
             logger.error(f"Error storing call in database: {e}")
@@ -344,7 +239,7 @@ def health_check():
         # Test database connection
         connection = get_db_connection()
         connection.close()
-        return jsonify({'status': 'healthy', 'database': 'connected'}), 200
+        return jsonify({'status': 'healthy', 'database': 'connected', 'pool': db.metrics()}), 200
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Asterisk Manager Interface (AMI) client shared by the Flask apps
+
+One persistent TCP connection is shared by every caller. A dedicated reader
+thread parses complete packets off the socket and hands each response to the
+caller that sent the matching ActionID, so concurrent Flask requests can no
+longer read each other's replies.
+"""
+
+import itertools
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+
+def settle_future(future, result=None, exception=None):
+    """Resolve future unless its caller cancelled it meanwhile; returns False if it was already done"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+        return True
+    except InvalidStateError:
+        return False
+
+
+class AMIMessage:
+    """A single AMI packet (response or event) parsed into headers"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.headers = {}
+        for line in raw.split('\r\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                # Keep the first occurrence, later duplicates go to the raw text
+                self.headers.setdefault(key.strip(), value.strip())
+
+    def get(self, key, default=None):
+        return self.headers.get(key, default)
+
+    @property
+    def action_id(self):
+        return self.headers.get('ActionID')
+
+    @property
+    def is_event(self):
+        return 'Event' in self.headers
+
+    @property
+    def success(self):
+        return self.headers.get('Response') in ('Success', 'Follows', 'Goodbye')
+
+    def __str__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f"AMIMessage({self.headers!r})"
+
+
+class AsteriskAMI:
+    """Multiplexed AMI client with ActionID correlation and a background reader"""
+
+    def __init__(self, host='127.0.0.1', port=5038, username='admin', secret='admin',
+                 connect_timeout=5, action_timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.secret = secret
+        self.connect_timeout = connect_timeout
+        self.action_timeout = action_timeout
+        self.connected = False
+        self.connected_since = None
+        # Actions reconnect lazily unless a supervisor owns reconnection
+        self.auto_connect = True
+        self.logger = logging.getLogger(__name__)
+
+        self.socket = None
+        self._reader_thread = None
+        self._connect_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._event_lists = {}
+        self._action_ids = itertools.count(1)
+        self._event_listeners = []
+        self._disconnect_listeners = []
+
+    def connect(self):
+        """Connect to Asterisk AMI and log in"""
+        with self._connect_lock:
+            if self.connected:
+                return True
+
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                stream = sock.makefile('rb')
+
+                # Asterisk sends a single greeting line before any packet
+                greeting = stream.readline().decode('utf-8', errors='replace').strip()
+                if not greeting:
+                    raise ConnectionError("AMI closed the connection before greeting")
+                self.logger.debug(f"AMI greeting: {greeting}")
+
+                # The reader blocks indefinitely; actions enforce their own timeouts
+                sock.settimeout(None)
+                self.socket = sock
+                self._reader_thread = threading.Thread(
+                    target=self._read_loop,
+                    args=(sock, stream),
+                    daemon=True,
+                    name="AMI-Reader-Thread"
+                )
+                self._reader_thread.start()
+            except Exception as e:
+                self.logger.error(f"Failed to connect to AMI: {e}")
+                return False
+
+            # Login goes through the normal correlation path
+            try:
+                response = self._submit('Login', {
+                    'Username': self.username,
+                    'Secret': self.secret
+                }).result(timeout=self.action_timeout)
+            except Exception as e:
+                self.logger.error(f"AMI login failed: {e}")
+                self._teardown(sock)
+                return False
+
+            if response.success:
+                self.connected = True
+                self.connected_since = time.time()
+                self.logger.info("Connected to Asterisk AMI")
+                return True
+
+            self.logger.error(f"AMI login failed: {response.get('Message', response.raw)}")
+            self._teardown(sock)
+            return False
+
+    def send_action_async(self, action, params=None, action_id=None):
+        """Send an action and return a Future that resolves to its AMIMessage response
+
+        Pass action_id to correlate later events (e.g. OriginateResponse) yourself.
+        """
+        if not self.connected and not (self.auto_connect and self.connect()):
+            future = Future()
+            future.set_exception(ConnectionError(f"AMI not connected to {self.host}:{self.port}"))
+            return future
+        return self._submit(action, params, action_id)
+
+    def send_action(self, action, params=None, timeout=None):
+        """Send an action to Asterisk AMI and return the complete raw response"""
+        future = self.send_action_async(action, params)
+        try:
+            response = future.result(timeout=timeout if timeout is not None else self.action_timeout)
+            return response.raw
+
+        except FutureTimeoutError:
+            future.cancel()
+            self._forget(future.action_id)
+            self.logger.error(f"AMI action {action} timed out")
+            return None
+        except Exception as e:
+            self.logger.error(f"Failed to send AMI action {action}: {e}")
+            return None
+
+    def send_event_list(self, action, params=None, on_event=None):
+        """Send a list action (e.g. CoreShowChannels) and collect its events until EventList: Complete
+
+        Returns a Future resolving to the list of events. If on_event is given each
+        event is handed to it from the reader thread as it arrives instead of being
+        kept, and the Future resolves to the number of events seen.
+        """
+        action_id = f"flask-{next(self._action_ids)}"
+        collector = Future()
+        with self._pending_lock:
+            self._event_lists[action_id] = {
+                'future': collector,
+                'events': [],
+                'count': 0,
+                'on_event': on_event
+            }
+        collector.add_done_callback(lambda _f: self._forget_event_list(action_id))
+
+        def check_response(response):
+            if collector.done():
+                return
+            try:
+                message = response.result()
+                if not message.success:
+                    settle_future(collector, exception=RuntimeError(
+                        f"AMI {action} failed: {message.get('Message', message.raw)}"))
+            except Exception as e:
+                settle_future(collector, exception=e)
+
+        self.send_action_async(action, params, action_id=action_id).add_done_callback(check_response)
+        return collector
+
+    def originate_call(self, context, extension, caller_id, priority=1, timeout=30000):
+        """Originate a call using AMI"""
+        params = {
+            'Context': context,
+            'Extension': extension,
+            'Callerid': caller_id,
+            'Priority': priority,
+            'Timeout': timeout
+        }
+        return self.send_action('Originate', params)
+
+    def get_channel_status(self, channel):
+        """Get status of a specific channel"""
+        return self.send_action('GetVar', {'Channel': channel, 'Variable': 'CHANNEL'})
+
+    def hangup_channel(self, channel, cause=16):
+        """Hangup a specific channel"""
+        return self.send_action('Hangup', {'Channel': channel, 'Cause': str(cause)})
+
+    def add_event_listener(self, callback):
+        """Register a callback invoked with every unsolicited AMIMessage event"""
+        self._event_listeners.append(callback)
+
+    def remove_event_listener(self, callback):
+        """Unregister a previously added event callback"""
+        try:
+            self._event_listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def add_disconnect_listener(self, callback):
+        """Register a callback invoked with the error whenever the connection drops"""
+        self._disconnect_listeners.append(callback)
+
+    def close(self):
+        """Close AMI connection"""
+        if self.connected:
+            try:
+                self.send_action('Logoff', timeout=2)
+            except Exception:
+                pass
+            self._teardown(self.socket)
+            self.logger.info("AMI connection closed")
+
+    def disconnect(self, reason="disconnect requested"):
+        """Drop the current connection and fail any actions still waiting on it"""
+        sock = self.socket
+        if sock is not None:
+            self._fail_connection(sock, ConnectionError(reason))
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def _submit(self, action, params=None, action_id=None):
+        """Tag an action with a fresh ActionID, register its future and write it"""
+        action_id = action_id or f"flask-{next(self._action_ids)}"
+        future = Future()
+        future.action_id = action_id
+
+        message = f"Action: {action}\r\nActionID: {action_id}\r\n"
+        for key, value in (params or {}).items():
+            message += f"{key}: {value}\r\n"
+        message += "\r\n"
+
+        with self._pending_lock:
+            self._pending[action_id] = future
+        # Drop the slot if the caller gives up so late replies are discarded
+        future.add_done_callback(lambda _f: self._forget(action_id))
+
+        sock = self.socket
+        try:
+            if sock is None:
+                raise ConnectionError("AMI socket is not open")
+            with self._write_lock:
+                sock.sendall(message.encode())
+        except Exception as e:
+            self.logger.error(f"Failed to write AMI action {action}: {e}")
+            self._fail_connection(sock, e)
+        return future
+
+    def _forget(self, action_id):
+        with self._pending_lock:
+            self._pending.pop(action_id, None)
+
+    def _forget_event_list(self, action_id):
+        with self._pending_lock:
+            self._event_lists.pop(action_id, None)
+
+    def _collect(self, entry, message):
+        """Add one event to an in-progress EventList, resolving it on the Complete marker"""
+        future = entry['future']
+        if future.done():
+            return
+        if message.get('EventList') == 'Complete':
+            settle_future(future, entry['count'] if entry['on_event'] else entry['events'])
+            return
+        entry['count'] += 1
+        if entry['on_event']:
+            try:
+                entry['on_event'](message)
+            except Exception as e:
+                settle_future(future, exception=e)
+        else:
+            entry['events'].append(message)
+
+    def _read_loop(self, sock, stream):
+        """Reader thread: split the stream into packets and dispatch them"""
+        error = ConnectionError("AMI connection closed")
+        try:
+            while True:
+                packet = self._read_packet(stream)
+                if packet is None:
+                    break
+                if packet:
+                    self._dispatch(AMIMessage(packet))
+        except Exception as e:
+            error = e
+            self.logger.error(f"AMI reader stopped: {e}")
+        finally:
+            self._fail_connection(sock, error)
+
+    def _read_packet(self, stream):
+        """Read lines until the blank line that terminates an AMI packet"""
+        lines = []
+        while True:
+            line = stream.readline()
+            if not line:
+                return None
+            line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            if not line:
+                return '\r\n'.join(lines)
+            lines.append(line)
+            # Legacy "Response: Follows" output can contain blank lines
+            if lines[0] == 'Response: Follows' and line.endswith('--END COMMAND--'):
+                stream.readline()
+                return '\r\n'.join(lines)
+
+    def _dispatch(self, message):
+        """Resolve the waiting future for a response, or fan an event out to listeners"""
+        if not message.is_event:
+            with self._pending_lock:
+                future = self._pending.pop(message.action_id, None)
+            if future is not None:
+                settle_future(future, message)
+            else:
+                self.logger.debug(f"Discarding uncorrelated AMI response: {message!r}")
+            return
+
+        # Events answering a list action belong to its caller, not the listeners
+        entry = self._event_lists.get(message.action_id) if message.action_id else None
+        if entry is not None:
+            self._collect(entry, message)
+            return
+
+        for listener in list(self._event_listeners):
+            try:
+                listener(message)
+            except Exception as e:
+                self.logger.error(f"AMI event listener error: {e}")
+
+    def _fail_connection(self, sock, error):
+        """Mark the connection dead and fail everything still waiting on it"""
+        if sock is not None and sock is not self.socket:
+            return
+        self._teardown(sock)
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            pending.extend(entry['future'] for entry in self._event_lists.values())
+            self._pending.clear()
+            self._event_lists.clear()
+        for future in pending:
+            settle_future(future, exception=ConnectionError(f"AMI connection lost: {error}"))
+        for listener in list(self._disconnect_listeners):
+            try:
+                listener(error)
+            except Exception as e:
+                self.logger.error(f"AMI disconnect listener error: {e}")
+
+    def _teardown(self, sock):
+        if sock is self.socket:
+            self.connected = False
+            self.connected_since = None
+            self.socket = None
+        if sock is not None:
+            try:
+                # shutdown() wakes the reader even though makefile() holds a reference
+                sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+
+class AMIHealthSupervisor:
+    """Keep an AsteriskAMI connection alive with Ping keepalives and backoff reconnects"""
+
+    def __init__(self, ami_client, ping_interval=15, ping_timeout=5, max_ping_failures=2,
+                 backoff_base=0.5, backoff_max=30, logger=None):
+        self.ami = ami_client
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_ping_failures = max_ping_failures
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+        self._wake_event = threading.Event()
+
+        self.started_at = None
+        self.connect_count = 0
+        self.reconnect_count = 0
+        self.connect_failures = 0
+        self.ping_count = 0
+        self.ping_failures = 0
+        self.last_ping_rtt = None
+        self.avg_ping_rtt = None
+        self.max_ping_rtt = None
+        self.last_error = None
+        self.last_disconnect_at = None
+
+    def start(self):
+        """Take over (re)connection of the AMI client in a background thread"""
+        if self.running:
+            return True
+        self.running = True
+        self.started_at = time.time()
+        self._wake_event.clear()
+        self.ami.add_disconnect_listener(self._on_disconnect)
+        # Callers fail fast while the supervisor is backing off
+        self.ami.auto_connect = False
+        supervisor_thread = threading.Thread(target=self._run, daemon=True, name="AMI-Supervisor-Thread")
+        supervisor_thread.start()
+        self.logger.info(f"AMI supervisor started (ping every {self.ping_interval}s)")
+        return True
+
+    def stop(self):
+        """Stop supervising and hand lazy reconnection back to the client"""
+        self.running = False
+        self._wake_event.set()
+        self.ami.auto_connect = True
+        self.logger.info("AMI supervisor stopped")
+
+    def metrics(self):
+        """Connection health numbers suitable for dashboards and alarms"""
+        now = time.time()
+        connected_since = self.ami.connected_since
+        return {
+            'connected': self.ami.connected,
+            'host': f"{self.ami.host}:{self.ami.port}",
+            'uptime_seconds': round(now - connected_since, 1) if connected_since else 0,
+            'connected_since': connected_since,
+            'supervisor_running': self.running,
+            'connect_count': self.connect_count,
+            'reconnect_count': self.reconnect_count,
+            'connect_failures': self.connect_failures,
+            'ping_count': self.ping_count,
+            'ping_failures': self.ping_failures,
+            'last_ping_rtt_ms': self._ms(self.last_ping_rtt),
+            'avg_ping_rtt_ms': self._ms(self.avg_ping_rtt),
+            'max_ping_rtt_ms': self._ms(self.max_ping_rtt),
+            'pending_actions': self.ami.pending_count,
+            'last_error': self.last_error,
+            'last_disconnect_at': self.last_disconnect_at
+        }
+
+    def _run(self):
+        failures = 0
+        while self.running:
+            if not self.ami.connected:
+                if self.ami.connect():
+                    if self.connect_count:
+                        self.reconnect_count += 1
+                        self.logger.info(f"AMI reconnected after {failures} failed attempt(s)")
+                    self.connect_count += 1
+                    self.last_disconnect_at = None
+                    failures = 0
+                else:
+                    failures += 1
+                    self.connect_failures += 1
+                    self.last_error = f"connect to {self.ami.host}:{self.ami.port} failed"
+                    self._wait(self._backoff(failures))
+                    continue
+
+            self._ping()
+            self._wait(self.ping_interval)
+
+    def _wait(self, seconds):
+        """Sleep until the next check, waking early on disconnect or stop"""
+        self._wake_event.wait(seconds)
+        self._wake_event.clear()
+
+    def _on_disconnect(self, error):
+        self.last_error = str(error)
+        self.last_disconnect_at = time.time()
+        self._wake_event.set()
+
+    def _backoff(self, failures):
+        """Full-jitter exponential backoff so many workers don't reconnect in lockstep"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** min(failures, 16)))
+        return random.uniform(self.backoff_base, max(self.backoff_base, ceiling))
+
+    def _ping(self):
+        consecutive = 0
+        while self.running and self.ami.connected:
+            started = time.monotonic()
+            future = self.ami.send_action_async('Ping')
+            try:
+                response = future.result(timeout=self.ping_timeout)
+                if not response.success:
+                    raise ConnectionError(response.get('Message', 'Ping rejected'))
+            except Exception as e:
+                future.cancel()
+                consecutive += 1
+                self.ping_failures += 1
+                self.last_error = f"Ping failed: {e or 'timeout'}"
+                self.logger.warning(f"AMI ping failed ({consecutive}/{self.max_ping_failures}): {e or 'timeout'}")
+                if consecutive >= self.max_ping_failures:
+                    self.ami.disconnect("keepalive ping failed")
+                    return
+                continue
+
+            rtt = time.monotonic() - started
+            self.ping_count += 1
+            self.last_ping_rtt = rtt
+            self.max_ping_rtt = max(self.max_ping_rtt or 0, rtt)
+            # Exponentially weighted so the average tracks recent latency
+            self.avg_ping_rtt = rtt if self.avg_ping_rtt is None else 0.8 * self.avg_ping_rtt + 0.2 * rtt
+            return
+
+    @staticmethod
+    def _ms(seconds):
+        return round(seconds * 1000, 2) if seconds is not None else None
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Synthetic FastAGI load generator
+
+Plays the Asterisk side of FastAGI: opens sessions at a target arrival rate,
+sends a realistic agi_* environment block, answers any commands the server
+issues (SET/GET VARIABLE, EXEC, ...) and records connect latency,
+time-to-first-reply and whole-session time. Point it at the Flask app's
+AGIServer, simple_agi_server*.py, or leave --host off to start a local
+FastAGIServer with a simulated handler:
+
+    python benchmark_agi.py --host 127.0.0.1 --port 5001 --sessions 2000 --rate 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+
+def build_environment(index, extension='1412'):
+    """An Asterisk 18 style agi_* block for one synthetic PJSIP caller"""
+    caller = f"0917{random.randint(0, 9999999):07d}"
+    unique_id = f"{int(time.time())}.{index}"
+    channel = f"PJSIP/{caller}-{index:08x}"
+    env = {
+        'agi_request': f"agi://127.0.0.1/{extension}",
+        'agi_channel': channel,
+        'agi_language': 'en',
+        'agi_type': 'PJSIP',
+        'agi_uniqueid': unique_id,
+        'agi_version': '18.20.0',
+        'agi_callerid': caller,
+        'agi_calleridname': f"Caller {caller}",
+        'agi_callingpres': '0',
+        'agi_callingani2': '0',
+        'agi_callington': '0',
+        'agi_callingtns': '0',
+        'agi_dnid': extension,
+        'agi_rdnis': 'unknown',
+        'agi_context': 'from-internal',
+        'agi_extension': extension,
+        'agi_priority': '3',
+        'agi_enhanced': '0.0',
+        'agi_accountcode': '',
+        'agi_threadid': str(140000000000000 + index)
+    }
+    return ''.join(f"{key}: {value}\n" for key, value in env.items()) + "\n"
+
+
+def reply_for(command):
+    """What Asterisk would answer for a command on a live, idle channel"""
+    words = command.split()
+    verb = ' '.join(words[:2]).upper()
+    if verb == 'GET VARIABLE':
+        name = words[2] if len(words) > 2 else ''
+        return "200 result=1 (ANSWER)" if name == 'DIALSTATUS' else "200 result=0"
+    if verb == 'STREAM FILE':
+        return "200 result=0 endpos=0"
+    if verb == 'WAIT FOR':
+        return "200 result=0"
+    return "200 result=0" if words and words[0].upper() == 'EXEC' else "200 result=1"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0
+    }
+
+
+def histogram(samples, width=40):
+    """Log-scale text histogram of latencies"""
+    bounds = [0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, float('inf')]
+    counts = [0] * len(bounds)
+    for value in samples:
+        for index, bound in enumerate(bounds):
+            if value <= bound:
+                counts[index] += 1
+                break
+    peak = max(counts) or 1
+    lines = []
+    for bound, count in zip(bounds, counts):
+        if not count:
+            continue
+        label = '   inf' if bound == float('inf') else f"{bound * 1000:6g}"
+        lines.append(f"  <= {label} ms {count:>7} {'#' * max(1, int(count / peak * width))}")
+    return '\n'.join(lines)
+
+
+class AGILoadGenerator:
+    """Open FastAGI sessions at an arrival rate and measure the server's responsiveness"""
+
+    def __init__(self, host, port, sessions=1000, rate=100.0, concurrency=500, arrival='poisson',
+                 extension='1412', timeout=10):
+        self.host = host
+        self.port = port
+        self.sessions = sessions
+        self.rate = rate
+        self.concurrency = concurrency
+        self.arrival = arrival
+        self.extension = extension
+        self.timeout = timeout
+
+        self.connect_times = []
+        self.reply_times = []
+        self.session_times = []
+        self.commands = 0
+        self.errors = {}
+        self.peak_open = 0
+        self._open = 0
+
+    async def run(self):
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        started = time.perf_counter()
+        next_at = started
+        for index in range(self.sessions):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.arrival == 'poisson':
+                next_at += random.expovariate(self.rate)
+            else:
+                next_at += 1.0 / self.rate
+            await slots.acquire()
+            task = asyncio.ensure_future(self._session(index))
+            task.add_done_callback(lambda _task: slots.release())
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    async def _session(self, index):
+        self._open += 1
+        self.peak_open = max(self.peak_open, self._open)
+        writer = None
+        try:
+            started = time.perf_counter()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            connected = time.perf_counter()
+            self.connect_times.append(connected - started)
+
+            writer.write(build_environment(index, self.extension).encode())
+            await writer.drain()
+
+            first_reply = None
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not line:
+                    break
+                if first_reply is None:
+                    first_reply = time.perf_counter()
+                    self.reply_times.append(first_reply - connected)
+                command = line.decode('utf-8', errors='replace').strip()
+                # A bare "200 result=..." is the one-shot reply; anything else is a command
+                if command and not command[:3].isdigit():
+                    self.commands += 1
+                    writer.write((reply_for(command) + "\n").encode())
+                    await writer.drain()
+            if first_reply is None:
+                raise ConnectionError("closed without reply")
+            self.session_times.append(time.perf_counter() - started)
+        except Exception as e:
+            name = 'timeout' if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+        finally:
+            self._open -= 1
+            if writer:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+
+    def report(self, elapsed):
+        completed = len(self.session_times)
+        return {
+            'sessions': self.sessions,
+            'completed': completed,
+            'errors': self.errors,
+            'target_rate': self.rate,
+            'achieved_rate': round(completed / elapsed, 1) if elapsed else 0.0,
+            'seconds': round(elapsed, 3),
+            'peak_open_sessions': self.peak_open,
+            'commands_answered': self.commands,
+            'connect': summarize(self.connect_times),
+            'time_to_reply': summarize(self.reply_times),
+            'session': summarize(self.session_times)
+        }
+
+
+def start_local_server(handler_ms, max_sessions):
+    """Run an in-process FastAGIServer whose handler sleeps handler_ms, like a DB write"""
+    from fastagi import FastAGIServer, DEFAULT_REPLY
+
+    def handler(agi_vars):
+        if handler_ms:
+            time.sleep(handler_ms / 1000.0)
+        return DEFAULT_REPLY
+
+    server = FastAGIServer(handler, host='127.0.0.1', port=0, max_sessions=max_sessions)
+    if not server.start():
+        raise RuntimeError("could not start local FastAGI server")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic FastAGI load generator")
+    parser.add_argument('--host', help="AGI server host (default: start a local FastAGIServer)")
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--sessions', type=int, default=1000, help="total sessions to open")
+    parser.add_argument('--rate', type=float, default=100.0, help="target session arrivals per second")
+    parser.add_argument('--concurrency', type=int, default=500, help="maximum sessions open at once")
+    parser.add_argument('--arrival', choices=('poisson', 'uniform'), default='poisson')
+    parser.add_argument('--extension', default='1412')
+    parser.add_argument('--timeout', type=float, default=10.0, help="per-step timeout in seconds")
+    parser.add_argument('--handler-ms', type=float, default=0.0,
+                        help="simulated handler work for the local server")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args()
+
+    server = None
+    host, port = args.host, args.port
+    if not host:
+        server = start_local_server(args.handler_ms, max(args.concurrency, 1))
+        host, port = '127.0.0.1', server.port
+
+    generator = AGILoadGenerator(host, port, sessions=args.sessions, rate=args.rate,
+                                 concurrency=args.concurrency, arrival=args.arrival,
+                                 extension=args.extension, timeout=args.timeout)
+    try:
+        elapsed = asyncio.run(generator.run())
+    finally:
+        if server:
+            server.stop()
+    result = generator.report(elapsed)
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        target = "local FastAGI server" if server else f"{host}:{port}"
+        print(f"🚀 AGI load: {args.sessions} sessions at {args.rate:g}/s ({args.arrival}) against {target}")
+        print(f"   completed {result['completed']}, errors {result['errors'] or 0}, "
+              f"achieved {result['achieved_rate']}/s, peak open {result['peak_open_sessions']}, "
+              f"commands answered {result['commands_answered']}")
+        print(f"{'':>15} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for label in ('connect', 'time_to_reply', 'session'):
+            stats = result[label]
+            print(f"{label:>15} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+                  f"{stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+        print("\n📊 time to reply")
+        print(histogram(generator.reply_times))
+    return 0 if result['completed'] == args.sessions else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
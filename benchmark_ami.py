@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+AsteriskAMI action throughput benchmark
+
+Runs closed-loop workers that each keep one action in flight on the shared
+AsteriskAMI connection, the way concurrent Flask requests use it, and reports
+actions/sec and latency percentiles. Without --host it starts a local
+FakeAMIServer, so runs are comparable across machines:
+
+    python benchmark_ami.py --concurrency 1,16,64 --actions 20000 --action Ping
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+from asterisk_ami import AsteriskAMI
+from fake_ami_server import FakeAMIServer
+
+
+ACTIONS = {
+    'Ping': lambda worker, n: ('Ping', None),
+    'SetVar': lambda worker, n: ('SetVar', {'Variable': f"BENCH_{worker}", 'Value': str(n)}),
+    'GetVar': lambda worker, n: ('GetVar', {'Variable': f"BENCH_{worker}"}),
+    'Originate': lambda worker, n: ('Originate', {
+        'Channel': f"PJSIP/bench{worker}",
+        'Context': 'from-internal',
+        'Exten': '1412',
+        'Priority': 1,
+        'Async': 'true'
+    }),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_benchmark(ami, action, concurrency, total_actions, timeout=10):
+    """Issue total_actions actions from concurrency workers and return a result dict"""
+    build = ACTIONS[action]
+    per_worker = [total_actions // concurrency + (1 if i < total_actions % concurrency else 0)
+                  for i in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    start_gate = threading.Event()
+
+    def worker(index):
+        start_gate.wait()
+        samples = latencies[index]
+        for n in range(per_worker[index]):
+            name, params = build(index, n)
+            started = time.perf_counter()
+            try:
+                response = ami.send_action_async(name, params).result(timeout=timeout)
+                if not response.success:
+                    errors[index] += 1
+            except Exception:
+                errors[index] += 1
+                continue
+            samples.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True, name=f"Bench-Worker-{i}")
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(value for worker_samples in latencies for value in worker_samples)
+    return {
+        'action': action,
+        'concurrency': concurrency,
+        'actions': total_actions,
+        'completed': len(samples),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'actions_per_sec': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AsteriskAMI actions/sec and latency")
+    parser.add_argument('--host', help="real AMI host (default: start a local fake server)")
+    parser.add_argument('--port', type=int, default=5038)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--secret', default='admin')
+    parser.add_argument('--action', choices=sorted(ACTIONS), default='Ping')
+    parser.add_argument('--concurrency', default='1,8,32', help="comma separated worker counts")
+    parser.add_argument('--actions', type=int, default=10000, help="actions per concurrency level")
+    parser.add_argument('--warmup', type=int, default=500, help="untimed actions before each level")
+    parser.add_argument('--response-delay', type=float, default=0.0,
+                        help="fake server delay per response in seconds")
+    parser.add_argument('--json', action='store_true', help="print one JSON result per line")
+    args = parser.parse_args()
+
+    server = None
+    host, port = args.host, args.port
+    if not host:
+        server = FakeAMIServer(username=args.username, secret=args.secret,
+                               response_delay=args.response_delay)
+        host, port = server.start()
+
+    ami = AsteriskAMI(host, port, args.username, args.secret)
+    if not ami.connect():
+        print(f"❌ Could not log in to AMI at {host}:{port}")
+        return 1
+
+    if not args.json:
+        target = "fake server" if server else "Asterisk"
+        print(f"🚀 AMI benchmark: {args.action} against {target} at {host}:{port}")
+        print(f"{'conc':>6} {'actions/s':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+
+    try:
+        for concurrency in [int(value) for value in args.concurrency.split(',') if value.strip()]:
+            if args.warmup:
+                run_benchmark(ami, args.action, concurrency, args.warmup)
+            result = run_benchmark(ami, args.action, concurrency, args.actions)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"{result['concurrency']:>6} {result['actions_per_sec']:>11.1f} {result['p50_ms']:>9.3f} "
+                      f"{result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['max_ms']:>9.3f} "
+                      f"{result['errors']:>7}")
+    finally:
+        ami.close()
+        if server:
+            server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Hot/archive split for the calls table
+
+Ended calls older than retain_days are moved from calls to calls_archive (same
+columns and indexes) in small chunks, each its own short transaction, so the
+hot table that every list query, COUNT and status UPDATE touches stays small.
+Only calls already folded into call_statistics are moved, so the rollup never
+has to look in the archive.
+
+The archiver also remembers how many calls and recordings the archive holds
+and its newest start_time. History queries use needs_archive() to decide
+whether a requested range can reach archived rows at all, so recent pages keep
+reading the hot table alone.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from call_rollup import TERMINAL_STATUSES
+
+
+ARCHIVE_TABLE = 'calls_archive'
+
+
+class CallArchiver:
+    """Move old ended calls to calls_archive in chunked background batches"""
+
+    def __init__(self, connection_factory, retain_days=90, interval=3600, chunk_size=500,
+                 chunk_pause=0.1, logger=None):
+        self.connection_factory = connection_factory
+        # Ended calls that started more than this many days ago are archived
+        self.retain_days = retain_days
+        # Seconds between archive passes; the first pass waits one interval after startup
+        self.interval = interval
+        self.chunk_size = chunk_size
+        # Seconds to sleep between chunks so replication and other writers keep up
+        self.chunk_pause = chunk_pause
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.archived_calls = 0
+        self.archived_recordings = 0
+        self.newest_start = None    # newest start_time in the archive; None when empty
+        self.loaded = False         # archive totals read; until then every query includes it
+        self.calls_moved = 0
+        self.chunks_moved = 0
+        self.duplicates_merged = 0
+        self.last_pass_ms = None
+        self.last_pass_at = None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Read the archive totals, then archive periodically in the background"""
+        if self.running:
+            return True
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Call-Archive-Thread")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def totals(self):
+        """(calls, recordings) moved out of the calls table, for the dashboard counters"""
+        with self._lock:
+            return self.archived_calls, self.archived_recordings
+
+    def needs_archive(self, oldest=None):
+        """Whether a query reaching back to oldest (None: no lower bound) can find archived rows"""
+        with self._lock:
+            if not self.loaded:
+                return True
+            if self.newest_start is None:
+                return False
+            return oldest is None or oldest <= self.newest_start
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'retain_days': self.retain_days,
+                'archived_calls': self.archived_calls,
+                'archived_recordings': self.archived_recordings,
+                'newest_archived_start': self.newest_start.isoformat() if self.newest_start else None,
+                'calls_moved': self.calls_moved,
+                'chunks_moved': self.chunks_moved,
+                'duplicates_merged': self.duplicates_merged,
+                'last_pass_ms': self.last_pass_ms,
+                'last_pass_at': self.last_pass_at.isoformat() if self.last_pass_at else None
+            }
+
+    def archive(self):
+        """Move every eligible call now, chunk by chunk; returns the number moved"""
+        started = time.time()
+        cutoff = datetime.now() - timedelta(days=self.retain_days)
+        moved = 0
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                columns = self._shared_columns(cursor)
+                while self.running:
+                    count = self._move_chunk(connection, cursor, cutoff, columns)
+                    moved += count
+                    if count < self.chunk_size:
+                        break
+                    time.sleep(self.chunk_pause)
+        except Exception as e:
+            self.logger.error(f"Error archiving calls: {e}")
+        finally:
+            if connection:
+                connection.close()
+
+        with self._lock:
+            self.last_pass_ms = round((time.time() - started) * 1000, 2)
+            self.last_pass_at = datetime.now()
+        if moved:
+            self.logger.info(f"Archived {moved} calls that started before {cutoff:%Y-%m-%d}")
+        return moved
+
+    def _run(self):
+        while self.running and not self._load_totals():
+            self._wakeup.wait(60)
+        while self.running:
+            self._wakeup.wait(self.interval)
+            if self.running:
+                self.archive()
+
+    def _load_totals(self):
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT COUNT(*) AS calls,
+                           COALESCE(SUM(recording_path IS NOT NULL), 0) AS recordings,
+                           MAX(start_time) AS newest
+                    FROM {ARCHIVE_TABLE}
+                """)
+                row = cursor.fetchone()
+        except Exception as e:
+            self.logger.error(f"Error reading call archive totals: {e}")
+            return False
+        finally:
+            if connection:
+                connection.close()
+
+        with self._lock:
+            self.archived_calls = int(row['calls'])
+            self.archived_recordings = int(row['recordings'])
+            self.newest_start = row['newest']
+            self.loaded = True
+        return True
+
+    def _shared_columns(self, cursor):
+        """Columns present in both tables, so a column added to only one does not break the copy"""
+        cursor.execute("""
+            SELECT COLUMN_NAME AS name, TABLE_NAME AS table_name FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('calls', %s)
+            ORDER BY ORDINAL_POSITION
+        """, (ARCHIVE_TABLE,))
+        rows = cursor.fetchall()
+        archive_columns = set(row['name'] for row in rows if row['table_name'] == ARCHIVE_TABLE)
+        return [row['name'] for row in rows if row['table_name'] == 'calls' and row['name'] in archive_columns]
+
+    def _move_chunk(self, connection, cursor, cutoff, columns):
+        """Copy one chunk into the archive and delete it from calls in a single transaction
+
+        A call_id the archive already holds (a call re-inserted after it was
+        archived) has its archived row overwritten with the newer hot row, so
+        nothing is lost when the hot row is deleted.
+        """
+        try:
+            cursor.execute(f"""
+                SELECT id, start_time, recording_path IS NOT NULL AS recorded FROM calls
+                WHERE start_time < %s
+                  AND status IN ({', '.join(['%s'] * len(TERMINAL_STATUSES))})
+                  AND rolled_up > 0
+                ORDER BY start_time
+                LIMIT %s
+                FOR UPDATE
+            """, [cutoff] + list(TERMINAL_STATUSES) + [self.chunk_size])
+            rows = cursor.fetchall()
+            if not rows:
+                connection.rollback()
+                return 0
+
+            ids = [row['id'] for row in rows]
+            in_ids = ', '.join(['%s'] * len(ids))
+            column_list = ', '.join(columns)
+            # The archived row keeps its own id; every other column takes the hot row's value
+            merge_list = ', '.join(f"{ARCHIVE_TABLE}.{column} = VALUES({column})"
+                                   for column in columns if column not in ('id', 'call_id'))
+            cursor.execute(f"""
+                SELECT c.id, a.recording_path IS NOT NULL AS archived_recorded
+                FROM calls c JOIN {ARCHIVE_TABLE} a ON a.call_id = c.call_id
+                WHERE c.id IN ({in_ids})
+            """, ids)
+            duplicates = dict((row['id'], row['archived_recorded']) for row in cursor.fetchall())
+            cursor.execute(f"""
+                INSERT INTO {ARCHIVE_TABLE} ({column_list})
+                SELECT {column_list} FROM calls WHERE id IN ({in_ids})
+                ON DUPLICATE KEY UPDATE {merge_list}
+            """, ids)
+            cursor.execute(f"DELETE FROM calls WHERE id IN ({in_ids})", ids)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        if duplicates:
+            self.logger.warning(f"Merged {len(duplicates)} calls already in {ARCHIVE_TABLE} "
+                                f"with their newer rows from calls")
+        added = [row for row in rows if row['id'] not in duplicates]
+        # A merged row can gain or lose its recording; it is not a new archived call
+        recordings = sum(1 for row in rows if row['recorded'])
+        recordings -= sum(1 for recorded in duplicates.values() if recorded)
+        newest = max(row['start_time'] for row in rows)
+        with self._lock:
+            self.archived_calls += len(added)
+            self.archived_recordings += recordings
+            if self.newest_start is None or newest > self.newest_start:
+                self.newest_start = newest
+            self.calls_moved += len(rows)
+            self.duplicates_merged += len(duplicates)
+            self.chunks_moved += 1
+        return len(rows)
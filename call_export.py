@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Streaming exports of call and incident history
+
+Rows are read with an unbuffered server-side cursor (pymysql SSDictCursor)
+and encoded batch by batch inside a generator, so a Flask response built on
+export_stream() sends a year of history with flat memory: at most one batch
+of rows and one encoded chunk exist at a time. Formats are CSV, NDJSON and,
+when pyarrow is installed, Parquet (one row group per batch).
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+import pymysql
+
+# Parquet export is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+# (column, type) in export order; the type only matters for Parquet
+CALL_EXPORT_COLUMNS = [
+    ('call_id', 'string'),
+    ('caller_id', 'string'),
+    ('caller_name', 'string'),
+    ('status', 'string'),
+    ('direction', 'string'),
+    ('extension', 'string'),
+    ('start_time', 'datetime'),
+    ('end_time', 'datetime'),
+    ('duration', 'int'),
+    ('recording_path', 'string'),
+    ('notes', 'string')
+]
+
+INCIDENT_EXPORT_COLUMNS = [
+    ('incident_id', 'string'),
+    ('call_id', 'string'),
+    ('category_id', 'int'),
+    ('title', 'string'),
+    ('description', 'string'),
+    ('priority', 'string'),
+    ('status', 'string'),
+    ('location_name', 'string'),
+    ('latitude', 'float'),
+    ('longitude', 'float'),
+    ('reported_by', 'int'),
+    ('created_at', 'datetime'),
+    ('resolved_at', 'datetime')
+]
+
+
+def export_value(value):
+    """JSON/CSV friendly scalar"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class _StreamSink:
+    """Write-only file for ParquetWriter that hands written bytes out as they arrive"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in batches:
+        for row in rows:
+            writer.writerow([export_value(row.get(name)) for name, _ in columns])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _encode_ndjson(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps({name: export_value(row.get(name)) for name, _ in columns}) + '\n'
+                      for row in rows).encode('utf-8')
+
+
+def _encode_parquet(columns, batches):
+    types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'datetime': pa.timestamp('s')}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    try:
+        for rows in batches:
+            data = {name: [float(row.get(name)) if kind == 'float' and row.get(name) is not None
+                           else row.get(name) for row in rows]
+                    for name, kind in columns}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    'csv': _encode_csv,
+    'ndjson': _encode_ndjson,
+    'parquet': _encode_parquet
+}
+
+
+def export_stream(connection, queries, columns, fmt='csv', batch_size=EXPORT_BATCH_SIZE, logger=None):
+    """Generator of encoded chunks for every row of queries, a list of (sql, params) run in order
+
+    Owns the connection: it is returned to the pool after the last row, or
+    invalidated when the client disconnects mid-stream so the unread result
+    set is dropped with the socket instead of being drained.
+    """
+    logger = logger or logging.getLogger(__name__)
+    finished = False
+
+    def batches():
+        for sql, params in queries:
+            cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+
+    try:
+        for chunk in ENCODERS[fmt](columns, batches()):
+            if chunk:
+                yield chunk
+        finished = True
+    except Exception as e:
+        logger.error(f"Error streaming {fmt} export: {e}")
+        raise
+    finally:
+        if finished:
+            connection.close()
+        elif hasattr(connection, 'invalidate'):
+            connection.invalidate()
+        else:
+            connection.close()
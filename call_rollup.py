@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Incremental call_statistics rollup
+
+Finished calls are folded into their day's call_statistics row (and an hourly
+bucket in call_statistics_hourly, which gives peak_hour) with additive upserts,
+so reports read one row per day instead of scanning calls. The same fold feeds
+call_timeseries, 15-minute buckets that answer capacity-planning range queries
+(load_timeseries) at 15m/1h/1d resolution; a month is under 3000 rows. Each call is folded
+exactly once: calls.rolled_up is flipped in the same transaction that adds it
+(1 = folded, 2 = folded with a recording), which lets live folding, a late
+recording and the chunked backfill of historical calls share one code path
+without double counting.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from call_stats import ANSWERED_STATUSES
+
+
+TERMINAL_STATUSES = ('ended', 'completed', 'transferred', 'missed', 'rejected')
+TIMESERIES_BUCKETS = {'15m': 15, '1h': 60, '1d': 1440}
+TIMESERIES_MAX_POINTS = 5000
+
+
+def quarter_start(moment):
+    """Start of the 15-minute call_timeseries bucket holding moment"""
+    return moment.replace(minute=moment.minute - moment.minute % 15, second=0, microsecond=0)
+
+
+def bucket_start(moment, minutes):
+    if minutes >= 1440:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    minute_of_day = moment.hour * 60 + moment.minute
+    minute_of_day -= minute_of_day % minutes
+    return moment.replace(hour=minute_of_day // 60, minute=minute_of_day % 60, second=0, microsecond=0)
+
+
+def load_timeseries(cursor, start, end, bucket='1h'):
+    """Call volume, answer rate and durations per bucket in [start, end), zero-filled, oldest first"""
+    minutes = TIMESERIES_BUCKETS[bucket]
+    first = bucket_start(start, minutes)
+    if (end - first).total_seconds() / 60 / minutes > TIMESERIES_MAX_POINTS:
+        raise ValueError(f"Range too large for {bucket} buckets (max {TIMESERIES_MAX_POINTS} points)")
+
+    cursor.execute("""
+        SELECT bucket_start, total_calls, answered_calls, missed_calls, rejected_calls, total_duration
+        FROM call_timeseries
+        WHERE bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start
+    """, (quarter_start(first), end))
+
+    points = {}
+    for row in cursor.fetchall():
+        key = bucket_start(row['bucket_start'], minutes)
+        point = points.setdefault(key, [0, 0, 0, 0, 0])
+        for index, column in enumerate(('total_calls', 'answered_calls', 'missed_calls',
+                                        'rejected_calls', 'total_duration')):
+            point[index] += int(row[column] or 0)
+
+    series, moment = [], first
+    while moment < end:
+        total, answered, missed, rejected, duration = points.get(moment, (0, 0, 0, 0, 0))
+        series.append({
+            'start': moment.isoformat(),
+            'total_calls': total,
+            'answered_calls': answered,
+            'missed_calls': missed,
+            'rejected_calls': rejected,
+            'answer_rate': round(answered * 100.0 / total, 1) if total else None,
+            'total_duration': duration,
+            'avg_duration': round(duration / answered, 1) if answered else 0
+        })
+        moment += timedelta(minutes=minutes)
+    return series
+
+
+class CallRollup:
+    """Fold finished calls into call_statistics in the background"""
+
+    def __init__(self, connection_factory, interval=5, chunk_size=1000, sweep_interval=300,
+                 chunk_pause=0.05, logger=None):
+        self.connection_factory = connection_factory
+        # Queued calls are folded this often
+        self.interval = interval
+        # Rows per backfill/sweep transaction, so no statement holds locks for long
+        self.chunk_size = chunk_size
+        # Calls finished by other processes (or missed hooks) are swept up this often
+        self.sweep_interval = sweep_interval
+        self.chunk_pause = chunk_pause
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.calls_folded = 0
+        self.backfill_done = False
+        self.last_error = None
+
+        self._finished = set()      # call_ids waiting to be folded
+        self._recorded = set()      # call_ids whose recording arrived after they ended
+        self._dirty_days = set()    # days whose incidents_count needs recounting
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start folding; the first pass backfills every unfolded historical call"""
+        if self.running:
+            return True
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Call-Rollup-Thread")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def call_finished(self, call_id, status=None, duration=None):
+        """Queue a call that reached a terminal status"""
+        if status is not None and status not in TERMINAL_STATUSES:
+            return
+        with self._lock:
+            self._finished.add(call_id)
+
+    def recording_saved(self, call_id):
+        """Queue a recording that may belong to an already folded call"""
+        with self._lock:
+            self._recorded.add(call_id)
+
+    def incident_created(self, created_at=None):
+        """Recount the incident total of the incident's day"""
+        with self._lock:
+            self._dirty_days.add((created_at or datetime.now()).date())
+
+    def metrics(self):
+        with self._lock:
+            queued = len(self._finished)
+        return {
+            'running': self.running,
+            'calls_folded': self.calls_folded,
+            'queued': queued,
+            'backfill_done': self.backfill_done,
+            'last_error': self.last_error
+        }
+
+    def backfill(self):
+        """Fold every unfolded finished call, chunk by chunk; returns the number folded"""
+        total, last_id = 0, 0
+        while self.running:
+            folded, last_id = self._fold_chunk(after_id=last_id)
+            if folded is None:
+                return total
+            total += folded
+            if last_id is None:
+                return total
+            time.sleep(self.chunk_pause)
+        return total
+
+    def _run(self):
+        self._rebuild_timeseries()
+        folded = self.backfill()
+        self.backfill_done = True
+        if folded:
+            self.logger.info(f"Call statistics backfill folded {folded} calls")
+
+        swept_at = time.time()
+        while self.running:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            with self._lock:
+                finished, self._finished = list(self._finished), set()
+                recorded, self._recorded = list(self._recorded), set()
+                dirty_days, self._dirty_days = set(self._dirty_days), set()
+
+            for start in range(0, len(finished), self.chunk_size):
+                call_ids = finished[start:start + self.chunk_size]
+                folded, _last_id = self._fold_chunk(call_ids=call_ids)
+                if folded is None:
+                    # Leave them for the sweep rather than retrying a bad batch forever
+                    break
+            if recorded:
+                self._fold_late_recordings(recorded)
+            if dirty_days:
+                self._recount_incidents(dirty_days)
+
+            if time.time() - swept_at >= self.sweep_interval:
+                self.backfill()
+                swept_at = time.time()
+
+    def _fold_chunk(self, call_ids=None, after_id=0):
+        """Fold one batch: the given calls, or the next chunk_size unfolded calls after after_id.
+
+        Returns (calls folded, last id seen or None when there are no more), or (None, None) on error.
+        """
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                statuses = ', '.join(['%s'] * len(TERMINAL_STATUSES))
+                if call_ids is not None:
+                    cursor.execute(f"""
+                        SELECT id, call_id, status, start_time, end_time, duration, recording_path
+                        FROM calls
+                        WHERE call_id IN ({', '.join(['%s'] * len(call_ids))})
+                          AND rolled_up = 0 AND status IN ({statuses})
+                        FOR UPDATE
+                    """, (*call_ids, *TERMINAL_STATUSES))
+                else:
+                    cursor.execute(f"""
+                        SELECT id, call_id, status, start_time, end_time, duration, recording_path
+                        FROM calls
+                        WHERE rolled_up = 0 AND id > %s AND status IN ({statuses})
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE
+                    """, (after_id, *TERMINAL_STATUSES, self.chunk_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    connection.commit()
+                    return 0, None
+
+                days, hours, quarters = {}, {}, {}
+                for row in rows:
+                    start_time = row['start_time'] or row['end_time'] or datetime.now()
+                    answered = row['status'] in ANSWERED_STATUSES
+                    duration = 0
+                    if answered:
+                        duration = row['duration']
+                        if duration is None and row['end_time'] and row['start_time']:
+                            duration = int((row['end_time'] - row['start_time']).total_seconds())
+                        duration = max(duration or 0, 0)
+                    counts = (1, int(answered), int(row['status'] == 'missed'),
+                              int(row['status'] == 'rejected'), duration, int(bool(row['recording_path'])))
+                    for buckets, key in ((days, start_time.date()), (hours, (start_time.date(), start_time.hour)),
+                                         (quarters, quarter_start(start_time))):
+                        buckets[key] = [a + b for a, b in zip(buckets.get(key, (0,) * 6), counts)]
+
+                # Keep updated_at: rollup bookkeeping is not a change /api/calls/changes should report
+                cursor.execute(f"""
+                    UPDATE calls SET rolled_up = CASE WHEN recording_path IS NULL THEN 1 ELSE 2 END,
+                                     updated_at = updated_at
+                    WHERE id IN ({', '.join(['%s'] * len(rows))})
+                """, [row['id'] for row in rows])
+
+                cursor.executemany("""
+                    INSERT INTO call_statistics_hourly
+                        (date, hour, total_calls, answered_calls, missed_calls, rejected_calls, total_duration)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        total_calls = total_calls + VALUES(total_calls),
+                        answered_calls = answered_calls + VALUES(answered_calls),
+                        missed_calls = missed_calls + VALUES(missed_calls),
+                        rejected_calls = rejected_calls + VALUES(rejected_calls),
+                        total_duration = total_duration + VALUES(total_duration)
+                """, [(day, hour, *counts[:5]) for (day, hour), counts in hours.items()])
+
+                cursor.executemany("""
+                    INSERT INTO call_timeseries
+                        (bucket_start, total_calls, answered_calls, missed_calls, rejected_calls, total_duration)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        total_calls = total_calls + VALUES(total_calls),
+                        answered_calls = answered_calls + VALUES(answered_calls),
+                        missed_calls = missed_calls + VALUES(missed_calls),
+                        rejected_calls = rejected_calls + VALUES(rejected_calls),
+                        total_duration = total_duration + VALUES(total_duration)
+                """, [(quarter, *counts[:5]) for quarter, counts in quarters.items()])
+
+                cursor.executemany("""
+                    INSERT INTO call_statistics
+                        (date, total_calls, answered_calls, missed_calls, rejected_calls, total_duration,
+                         avg_duration, recordings_count)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        total_calls = total_calls + VALUES(total_calls),
+                        answered_calls = answered_calls + VALUES(answered_calls),
+                        missed_calls = missed_calls + VALUES(missed_calls),
+                        rejected_calls = rejected_calls + VALUES(rejected_calls),
+                        total_duration = total_duration + VALUES(total_duration),
+                        avg_duration = total_duration / GREATEST(answered_calls, 1),
+                        recordings_count = recordings_count + VALUES(recordings_count)
+                """, [(day, *counts[:5], round(counts[4] / max(counts[1], 1), 2), counts[5])
+                    for day, counts in days.items()])
+
+                self._update_peaks(cursor, days)
+            connection.commit()
+        except Exception as e:
+            self.last_error = str(e)
+            self.logger.error(f"Error folding calls into call_statistics: {e}")
+            if connection:
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+            return None, None
+        finally:
+            if connection:
+                connection.close()
+
+        self.calls_folded += len(rows)
+        with self._lock:
+            # Backfilled days also need their incident totals
+            self._dirty_days.update(days)
+        if call_ids is None and len(rows) < self.chunk_size:
+            return len(rows), None
+        return len(rows), rows[-1]['id']
+
+    def _rebuild_timeseries(self):
+        """Fill an empty call_timeseries from calls folded before it existed, one day per statement"""
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM call_timeseries LIMIT 1")
+                if cursor.fetchone():
+                    return
+                cursor.execute("SELECT MIN(start_time) AS first_call FROM calls WHERE rolled_up > 0")
+                first_call = cursor.fetchone()['first_call']
+                if not first_call:
+                    return
+
+                day, rebuilt = first_call.replace(hour=0, minute=0, second=0, microsecond=0), 0
+                while day <= datetime.now() and self.running:
+                    # Exact counts rather than increments, so a rerun after a crash is harmless
+                    cursor.execute(f"""
+                        INSERT INTO call_timeseries
+                            (bucket_start, total_calls, answered_calls, missed_calls, rejected_calls, total_duration)
+                        SELECT DATE_FORMAT(start_time, '%%Y-%%m-%%d %%H:00:00')
+                                   + INTERVAL (MINUTE(start_time) DIV 15) * 15 MINUTE AS quarter,
+                               COUNT(*),
+                               SUM(status IN ({', '.join(['%s'] * len(ANSWERED_STATUSES))})),
+                               SUM(status = 'missed'),
+                               SUM(status = 'rejected'),
+                               SUM(CASE WHEN status IN ({', '.join(['%s'] * len(ANSWERED_STATUSES))})
+                                        THEN GREATEST(COALESCE(duration, TIMESTAMPDIFF(SECOND, start_time, end_time), 0), 0)
+                                        ELSE 0 END)
+                        FROM calls
+                        WHERE start_time >= %s AND start_time < %s AND rolled_up > 0
+                        GROUP BY quarter
+                        ON DUPLICATE KEY UPDATE
+                            total_calls = VALUES(total_calls),
+                            answered_calls = VALUES(answered_calls),
+                            missed_calls = VALUES(missed_calls),
+                            rejected_calls = VALUES(rejected_calls),
+                            total_duration = VALUES(total_duration)
+                    """, (*ANSWERED_STATUSES, *ANSWERED_STATUSES, day, day + timedelta(days=1)))
+                    connection.commit()
+                    rebuilt += 1
+                    day += timedelta(days=1)
+                    time.sleep(self.chunk_pause)
+                self.logger.info(f"Rebuilt call_timeseries for {rebuilt} days of folded calls")
+        except Exception as e:
+            self.last_error = str(e)
+            self.logger.error(f"Error rebuilding call_timeseries: {e}")
+        finally:
+            if connection:
+                connection.close()
+
+    def _update_peaks(self, cursor, days):
+        for day in days:
+            cursor.execute("""
+                UPDATE call_statistics s
+                JOIN (
+                    SELECT hour, total_calls FROM call_statistics_hourly
+                    WHERE date = %s
+                    ORDER BY total_calls DESC, hour
+                    LIMIT 1
+                ) peak
+                SET s.peak_hour = peak.hour, s.peak_calls = peak.total_calls
+                WHERE s.date = %s
+            """, (day, day))
+
+    def _fold_late_recordings(self, call_ids):
+        """Count recordings saved after their call was folded"""
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT id, start_time FROM calls
+                    WHERE call_id IN ({', '.join(['%s'] * len(call_ids))})
+                      AND rolled_up = 1 AND recording_path IS NOT NULL
+                    FOR UPDATE
+                """, call_ids)
+                rows = cursor.fetchall()
+                if rows:
+                    cursor.execute(f"""
+                        UPDATE calls SET rolled_up = 2, updated_at = updated_at
+                        WHERE id IN ({', '.join(['%s'] * len(rows))})
+                    """, [row['id'] for row in rows])
+                    per_day = {}
+                    for row in rows:
+                        day = (row['start_time'] or datetime.now()).date()
+                        per_day[day] = per_day.get(day, 0) + 1
+                    cursor.executemany("""
+                        UPDATE call_statistics SET recordings_count = recordings_count + %s WHERE date = %s
+                    """, [(count, day) for day, count in per_day.items()])
+            connection.commit()
+        except Exception as e:
+            self.last_error = str(e)
+            self.logger.error(f"Error folding late recordings into call_statistics: {e}")
+        finally:
+            if connection:
+                connection.close()
+
+    def _recount_incidents(self, days):
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                for day in days:
+                    cursor.execute("""
+                        INSERT INTO call_statistics (date, incidents_count)
+                        SELECT %s, COUNT(*) FROM incidents WHERE created_at >= %s AND created_at < %s
+                        ON DUPLICATE KEY UPDATE incidents_count = VALUES(incidents_count)
+                    """, (day, day, day + timedelta(days=1)))
+            connection.commit()
+        except Exception as e:
+            self.last_error = str(e)
+            self.logger.error(f"Error counting incidents into call_statistics: {e}")
+        finally:
+            if connection:
+                connection.close()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Ranked search over calls and incidents
+
+Text queries run against the InnoDB FULLTEXT indexes ft_calls_text
+(caller_name, notes) and ft_incidents_text (title, description) in boolean
+mode, every word required and prefix-matched, ranked by relevance. Queries
+that look like a phone number use a caller_id prefix range scan on
+idx_caller_id_start_time instead. Either way no query scans the table, so
+results stay fast on millions of rows.
+"""
+
+import re
+from datetime import datetime
+
+from call_archive import ARCHIVE_TABLE
+
+
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 100
+# Deep pages get slower and are never what a dispatcher wants
+SEARCH_MAX_OFFSET = 1000
+# innodb_ft_min_token_size: shorter words are not in the index
+MIN_WORD_LENGTH = 3
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PHONE = re.compile(r"\+?[\d\s().-]{3,}")
+
+
+def phone_prefix(query):
+    """Digits (with a leading +) when query looks like a phone number, else None"""
+    if not _PHONE.fullmatch(query.strip()):
+        return None
+    prefix = re.sub(r"[^\d+]", "", query)
+    return prefix if len(prefix.lstrip('+')) >= MIN_WORD_LENGTH else None
+
+
+def fulltext_terms(query):
+    """Boolean-mode expression requiring every indexable word as a prefix, or None"""
+    words = [word for word in _WORD.findall(query) if len(word) >= MIN_WORD_LENGTH]
+    if not words:
+        return None
+    return ' '.join(f"+{word}*" for word in words)
+
+
+def _merge(cursor, queries, limit, offset, key):
+    """Run per-table queries and merge them into one ranked page; returns (rows, has_more)"""
+    rows = []
+    for sql, params in queries:
+        cursor.execute(sql, params + [offset + limit + 1])
+        rows.extend(cursor.fetchall())
+    rows.sort(key=key, reverse=True)
+    page = rows[offset:offset + limit + 1]
+    return page[:limit], len(page) > limit
+
+
+def search_calls(cursor, query, limit=SEARCH_PAGE_DEFAULT, offset=0, include_archive=True):
+    """Calls matching query, best first; returns (rows, has_more)"""
+    tables = ['calls', ARCHIVE_TABLE] if include_archive else ['calls']
+    columns = """call_id, caller_id, caller_name, status, direction, extension,
+                 start_time, duration, recording_path, LEFT(notes, 200) AS notes"""
+    prefix = phone_prefix(query)
+    if prefix:
+        queries = [(f"""
+            SELECT {columns}, 1 AS score FROM {table}
+            WHERE caller_id LIKE %s
+            ORDER BY start_time DESC
+            LIMIT %s
+        """, [prefix + '%']) for table in tables]
+    else:
+        terms = fulltext_terms(query)
+        if not terms:
+            return [], False
+        queries = [(f"""
+            SELECT {columns}, MATCH(caller_name, notes) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM {table}
+            WHERE MATCH(caller_name, notes) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY score DESC
+            LIMIT %s
+        """, [terms, terms]) for table in tables]
+    return _merge(cursor, queries, limit, offset,
+                  key=lambda row: (float(row['score']), row['start_time'] or datetime.min))
+
+
+def search_incidents(cursor, query, limit=SEARCH_PAGE_DEFAULT, offset=0):
+    """Incidents matching query, best first; returns (rows, has_more)"""
+    terms = fulltext_terms(query)
+    if not terms:
+        return [], False
+    queries = [("""
+        SELECT incident_id, call_id, title, LEFT(description, 200) AS description, priority, status,
+               location_name, created_at,
+               MATCH(title, description) AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM incidents
+        WHERE MATCH(title, description) AGAINST (%s IN BOOLEAN MODE)
+        ORDER BY score DESC
+        LIMIT %s
+    """, [terms, terms])]
+    return _merge(cursor, queries, limit, offset,
+                  key=lambda row: (float(row['score']), row['created_at'] or datetime.min))
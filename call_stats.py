@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+In-memory dashboard counters
+
+Call handlers report state transitions (call started, answered, finished,
+recording saved) and the counters are adjusted in O(1), so the dashboard never
+counts rows on a page load. A background thread periodically reconciles them
+with one aggregate query plus a range scan of today's calls (start_time >=
+midnight, never DATE(start_time)), which repairs anything a handler missed or
+another process wrote.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+
+ANSWERED_STATUSES = ('answered', 'ended', 'completed', 'transferred')
+UNANSWERED_STATUSES = ('missed', 'rejected')
+
+
+def status_outcome(status):
+    """'answered', 'unanswered' or None (still ringing / unknown)"""
+    if status in ANSWERED_STATUSES:
+        return 'answered'
+    if status in UNANSWERED_STATUSES:
+        return 'unanswered'
+    return None
+
+
+class CallStatsTracker:
+    """Dashboard counters kept current from call transitions and reconciled periodically"""
+
+    RECENT_CALLS = 10
+
+    def __init__(self, connection_factory, reconcile_interval=60, archive_totals=None, logger=None):
+        self.connection_factory = connection_factory
+        self.reconcile_interval = reconcile_interval
+        # Callable returning (calls, recordings) moved out of the calls table, e.g. CallArchiver.totals
+        self.archive_totals = archive_totals
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.total_users = 0
+        self.online_users = 0
+        self.total_calls = 0
+        self.total_recordings = 0
+        self.calls_today = 0
+        self.answered_today = 0
+        self.unanswered_today = 0
+        self.reconciled_at = None
+        self.last_reconcile_ms = None
+
+        self._day = datetime.now().date()
+        self._outcomes = {}         # call_id -> outcome, for calls started today
+        self._recorded = set()      # call_ids whose recording is already counted
+        self._recent = deque(maxlen=self.RECENT_CALLS)
+        self._finish_listeners = []
+        self._recording_listeners = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Reconcile once, then keep reconciling in the background"""
+        if self.running:
+            return True
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Call-Stats-Thread")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def refresh(self):
+        """Reconcile soon, e.g. after a bulk change the transition hooks did not see"""
+        self._wakeup.set()
+
+    def add_finish_listener(self, callback):
+        """Register a callback invoked with (call_id, status, duration) on every status change"""
+        self._finish_listeners.append(callback)
+
+    def add_recording_listener(self, callback):
+        """Register a callback invoked with the call_id of every saved recording"""
+        self._recording_listeners.append(callback)
+
+    def call_started(self, call_id, caller_id, caller_name=None, status='ringing', start_time=None):
+        """Count a new call"""
+        start_time = start_time or datetime.now()
+        with self._lock:
+            self._roll_day()
+            if call_id in self._outcomes:
+                return
+            self.total_calls += 1
+            if start_time.date() == self._day:
+                self.calls_today += 1
+                self._outcomes[call_id] = status_outcome(status)
+                self._count_outcome(None, self._outcomes[call_id])
+            self._recent.appendleft({
+                'id': call_id,
+                'caller_name': caller_name or caller_id,
+                'caller_number': caller_id,
+                'status': status,
+                'duration': 0,
+                'created_at': start_time.isoformat(),
+                'has_recording': False
+            })
+
+    def call_status(self, call_id, status, duration=None):
+        """Move a call to a new status (answered, ended, missed, ...)"""
+        with self._lock:
+            self._roll_day()
+            if call_id in self._outcomes:
+                outcome = status_outcome(status)
+                self._count_outcome(self._outcomes[call_id], outcome)
+                self._outcomes[call_id] = outcome
+            for call in self._recent:
+                if call['id'] == call_id:
+                    call['status'] = status
+                    if duration is not None:
+                        call['duration'] = duration
+                    break
+        self._notify(self._finish_listeners, call_id, status, duration)
+
+    def recording_saved(self, call_id):
+        """Count a call's first saved recording"""
+        with self._lock:
+            first = call_id not in self._recorded
+            if first:
+                self._recorded.add(call_id)
+                self.total_recordings += 1
+                for call in self._recent:
+                    if call['id'] == call_id:
+                        call['has_recording'] = True
+                        break
+        if first:
+            self._notify(self._recording_listeners, call_id)
+
+    def snapshot(self, active_calls=0):
+        """Current dashboard stats; no database access"""
+        with self._lock:
+            self._roll_day()
+            decided = self.answered_today + self.unanswered_today
+            return {
+                'active_calls': active_calls,
+                'total_users': self.total_users,
+                'online_users': self.online_users,
+                'total_calls_today': self.calls_today,
+                'total_calls': self.total_calls,
+                'total_recordings': self.total_recordings,
+                'answered_today': self.answered_today,
+                'missed_today': self.unanswered_today,
+                'success_rate': round(self.answered_today * 100.0 / decided) if decided else 100,
+                'recent_calls': [dict(call) for call in self._recent],
+                'reconciled_at': self.reconciled_at.isoformat() if self.reconciled_at else None
+            }
+
+    def reconcile(self):
+        """Replace the counters with one aggregate query; True on success"""
+        started = time.time()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM users) AS total_users,
+                        (SELECT COUNT(*) FROM users WHERE updated_at > %s) AS online_users,
+                        (SELECT COUNT(*) FROM calls) AS total_calls,
+                        (SELECT COUNT(*) FROM calls WHERE recording_path IS NOT NULL) AS total_recordings
+                """, (datetime.now() - timedelta(hours=1),))
+                totals = cursor.fetchone()
+
+                cursor.execute("""
+                    SELECT call_id, caller_id, caller_name, status, duration, start_time, recording_path
+                    FROM calls
+                    ORDER BY start_time DESC
+                    LIMIT %s
+                """, (self.RECENT_CALLS,))
+                recent = cursor.fetchall()
+
+                # Today's calls through idx_start_time; their outcomes seed the transition counters
+                cursor.execute("""
+                    SELECT call_id, status, recording_path IS NOT NULL AS recorded FROM calls
+                    WHERE start_time >= %s AND start_time < %s
+                """, (today, today + timedelta(days=1)))
+                todays_calls = cursor.fetchall()
+        except Exception as e:
+            self.logger.error(f"Error reconciling dashboard stats: {e}")
+            return False
+        finally:
+            if connection:
+                connection.close()
+
+        archived_calls, archived_recordings = self.archive_totals() if self.archive_totals else (0, 0)
+        with self._lock:
+            self.total_users = int(totals['total_users'])
+            self.online_users = int(totals['online_users'])
+            self.total_calls = int(totals['total_calls']) + archived_calls
+            self.total_recordings = int(totals['total_recordings']) + archived_recordings
+            self._day = today.date()
+            self._outcomes = {row['call_id']: status_outcome(row['status']) for row in todays_calls}
+            outcomes = list(self._outcomes.values())
+            self.calls_today = len(outcomes)
+            self.answered_today = outcomes.count('answered')
+            self.unanswered_today = outcomes.count('unanswered')
+            self._recorded = set(row['call_id'] for row in todays_calls if row['recorded'])
+            self._recorded.update(row['call_id'] for row in recent if row['recording_path'])
+            self._recent = deque(({
+                'id': row['call_id'],
+                'caller_name': row['caller_name'] or row['caller_id'],
+                'caller_number': row['caller_id'],
+                'status': row['status'],
+                'duration': row['duration'] or 0,
+                'created_at': row['start_time'].isoformat() if row['start_time'] else None,
+                'has_recording': bool(row['recording_path'])
+            } for row in recent), maxlen=self.RECENT_CALLS)
+            self.reconciled_at = datetime.now()
+            self.last_reconcile_ms = round((time.time() - started) * 1000, 2)
+        return True
+
+    def _run(self):
+        while self.running:
+            self.reconcile()
+            self._wakeup.wait(self.reconcile_interval)
+            self._wakeup.clear()
+
+    def _notify(self, listeners, *args):
+        for callback in listeners:
+            try:
+                callback(*args)
+            except Exception as e:
+                self.logger.error(f"Error in call stats listener: {e}")
+
+    def _roll_day(self):
+        """Start today's counters from zero at midnight"""
+        today = datetime.now().date()
+        if today != self._day:
+            self._day = today
+            self.calls_today = self.answered_today = self.unanswered_today = 0
+            self._outcomes = {}
+
+    def _count_outcome(self, old, new):
+        if old == new:
+            return
+        if old == 'answered':
+            self.answered_today -= 1
+        elif old == 'unanswered':
+            self.unanswered_today -= 1
+        if new == 'answered':
+            self.answered_today += 1
+        elif new == 'unanswered':
+            self.unanswered_today += 1
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Outbound campaign dialer built on AMI Originate
+
+Each campaign dials its numbers through the shared AsteriskAMI connection
+with a cap on concurrent channels and a calls-per-second pace. Attempt
+outcomes are tracked from OriginateResponse/Hangup events and written to
+the campaign_attempts table in batches.
+"""
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# OriginateResponse "Reason" codes (see Asterisk's enum ast_control_frame_type)
+ORIGINATE_REASONS = {
+    '0': 'failed',
+    '1': 'hungup',
+    '3': 'no_answer',
+    '4': 'answered',
+    '5': 'busy',
+    '8': 'congestion'
+}
+
+FINAL_STATUSES = ('completed', 'failed', 'hungup', 'no_answer', 'busy', 'congestion', 'timeout', 'cancelled')
+
+MAX_NUMBERS_PER_CAMPAIGN = 50000
+MAX_CONCURRENT_CHANNELS = 200
+MAX_CALLS_PER_SECOND = 50
+# Attempt rows per multi-row INSERT (and per transaction) when a campaign is stored
+ATTEMPT_INSERT_CHUNK = 1000
+
+
+class CampaignDialer:
+    """Paced, concurrency-limited bulk originate with batched outcome tracking"""
+
+    def __init__(self, ami_client, connection_factory, logger=None, socketio_instance=None,
+                 flush_interval=1.0, flush_size=200, max_call_seconds=3600):
+        self.ami = ami_client
+        self.connection_factory = connection_factory
+        self.logger = logger or logging.getLogger(__name__)
+        self.socketio_instance = socketio_instance
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_call_seconds = max_call_seconds
+
+        self.campaigns = {}
+        self._lock = threading.Lock()
+        self._by_action_id = {}     # ActionID -> attempt
+        self._by_unique_id = {}     # originated channel Uniqueid -> attempt
+        self._in_flight = {}        # (campaign_id, seq) -> attempt holding a channel slot
+        self._dirty = []            # attempts whose outcome still needs writing
+        self._flush_event = threading.Event()
+        self._action_ids = itertools.count(1)
+        self.running = False
+
+    def start(self):
+        """Subscribe to originate events and start the batch writer"""
+        if self.running:
+            return True
+        self.running = True
+        self.ami.add_event_listener(self._on_event)
+        writer = threading.Thread(target=self._flush_loop, daemon=True, name="Campaign-Writer-Thread")
+        writer.start()
+        self.logger.info("Campaign dialer started")
+        return True
+
+    def stop(self):
+        """Cancel running campaigns and flush outstanding outcomes"""
+        with self._lock:
+            campaigns = list(self.campaigns.values())
+        for campaign in campaigns:
+            campaign['cancelled'] = True
+        self.running = False
+        self.ami.remove_event_listener(self._on_event)
+        self._flush_event.set()
+
+    def create_campaign(self, name, numbers, context, extension, channel_template,
+                        caller_id='', max_concurrent=10, calls_per_second=2.0, originate_timeout=30000):
+        """Persist a campaign with its attempts and start dialing it in the background"""
+        seen = set()
+        cleaned = []
+        for number in numbers:
+            number = str(number).strip()
+            if number and number not in seen:
+                seen.add(number)
+                cleaned.append(number)
+
+        if not cleaned:
+            raise ValueError("No phone numbers supplied")
+        if len(cleaned) > MAX_NUMBERS_PER_CAMPAIGN:
+            raise ValueError(f"A campaign may contain at most {MAX_NUMBERS_PER_CAMPAIGN} numbers")
+        if '{number}' not in channel_template:
+            raise ValueError("channel_template must contain {number}")
+
+        max_concurrent = max(1, min(int(max_concurrent), MAX_CONCURRENT_CHANNELS))
+        calls_per_second = max(0.1, min(float(calls_per_second), MAX_CALLS_PER_SECOND))
+
+        campaign_id = f"camp_{uuid.uuid4().hex[:12]}"
+        now = datetime.now()
+        campaign = {
+            'campaign_id': campaign_id,
+            'name': name or campaign_id,
+            'context': context,
+            'extension': extension,
+            'channel_template': channel_template,
+            'caller_id': caller_id,
+            'max_concurrent': max_concurrent,
+            'calls_per_second': calls_per_second,
+            'originate_timeout': int(originate_timeout),
+            'status': 'running',
+            'created_at': now,
+            'finished_at': None,
+            'cancelled': False,
+            'slots': threading.BoundedSemaphore(max_concurrent),
+            'in_flight': 0,
+            'attempts': [
+                {
+                    'campaign_id': campaign_id,
+                    'seq': seq,
+                    'phone_number': number,
+                    'status': 'pending',
+                    'reason': None,
+                    'unique_id': None,
+                    'action_id': None,
+                    'attempted_at': None,
+                    'answered_at': None,
+                    'ended_at': None,
+                    'holds_slot': False
+                }
+                for seq, number in enumerate(cleaned)
+            ]
+        }
+
+        self._store_campaign(campaign)
+
+        with self._lock:
+            self.campaigns[campaign_id] = campaign
+
+        dial_thread = threading.Thread(
+            target=self._dial_loop,
+            args=(campaign,),
+            daemon=True,
+            name=f"Campaign-{campaign_id}"
+        )
+        dial_thread.start()
+        self.logger.info(f"Campaign {campaign_id} started: {len(cleaned)} numbers, "
+                         f"{max_concurrent} channels, {calls_per_second} cps")
+        return campaign_id
+
+    def cancel_campaign(self, campaign_id):
+        """Stop dialing new numbers; calls already up are left to finish"""
+        campaign = self.campaigns.get(campaign_id)
+        if not campaign:
+            return False
+        campaign['cancelled'] = True
+        return True
+
+    def get_campaign(self, campaign_id):
+        """Summary of a running (or recently finished) campaign"""
+        campaign = self.campaigns.get(campaign_id)
+        if not campaign:
+            return None
+        return self._summary(campaign)
+
+    def list_campaigns(self):
+        with self._lock:
+            campaigns = list(self.campaigns.values())
+        return [self._summary(campaign) for campaign in campaigns]
+
+    def _summary(self, campaign):
+        counts = {}
+        for attempt in campaign['attempts']:
+            counts[attempt['status']] = counts.get(attempt['status'], 0) + 1
+        return {
+            'campaign_id': campaign['campaign_id'],
+            'name': campaign['name'],
+            'status': campaign['status'],
+            'total': len(campaign['attempts']),
+            'in_flight': campaign['in_flight'],
+            'counts': counts,
+            'max_concurrent': campaign['max_concurrent'],
+            'calls_per_second': campaign['calls_per_second'],
+            'created_at': campaign['created_at'].isoformat(),
+            'finished_at': campaign['finished_at'].isoformat() if campaign['finished_at'] else None
+        }
+
+    def _dial_loop(self, campaign):
+        """Originate each pending attempt, honouring the channel cap and pace"""
+        self._store_attempts(campaign)
+        interval = 1.0 / campaign['calls_per_second']
+        next_at = time.monotonic()
+
+        for attempt in campaign['attempts']:
+            if not self._acquire_slot(campaign):
+                break
+
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = max(next_at + interval, time.monotonic())
+
+            self._originate(campaign, attempt)
+
+        # Anything never dialed is recorded as cancelled
+        if campaign['cancelled'] or not self.running:
+            for attempt in campaign['attempts']:
+                if attempt['status'] == 'pending':
+                    self._finish(attempt, 'cancelled', release=False)
+
+        while campaign['in_flight'] and self.running:
+            time.sleep(0.5)
+
+        campaign['status'] = 'cancelled' if campaign['cancelled'] else 'completed'
+        campaign['finished_at'] = datetime.now()
+        self._flush_event.set()
+        self.logger.info(f"Campaign {campaign['campaign_id']} {campaign['status']}: {self._summary(campaign)['counts']}")
+
+    def _acquire_slot(self, campaign):
+        """Wait for a free channel, giving up if the campaign is cancelled meanwhile"""
+        while not campaign['slots'].acquire(timeout=0.5):
+            if campaign['cancelled'] or not self.running:
+                return False
+        if campaign['cancelled'] or not self.running:
+            campaign['slots'].release()
+            return False
+        return True
+
+    def _originate(self, campaign, attempt):
+        action_id = f"campaign-{next(self._action_ids)}"
+        attempt['action_id'] = action_id
+        attempt['status'] = 'dialing'
+        attempt['attempted_at'] = datetime.now()
+        attempt['holds_slot'] = True
+        with self._lock:
+            campaign['in_flight'] += 1
+            self._by_action_id[action_id] = attempt
+            self._in_flight[(attempt['campaign_id'], attempt['seq'])] = attempt
+
+        params = {
+            'Channel': campaign['channel_template'].format(number=attempt['phone_number']),
+            'Context': campaign['context'],
+            'Exten': campaign['extension'],
+            'Priority': 1,
+            'Timeout': campaign['originate_timeout'],
+            'Async': 'true',
+            'Variable': f"CAMPAIGN_ID={campaign['campaign_id']}"
+        }
+        if campaign['caller_id']:
+            params['CallerID'] = campaign['caller_id']
+
+        future = self.ami.send_action_async('Originate', params, action_id=action_id)
+        future.add_done_callback(lambda f: self._on_queued(attempt, f))
+        self._mark_dirty(attempt)
+
+    def _on_queued(self, attempt, future):
+        """The immediate Originate reply only says whether the request was queued"""
+        try:
+            response = future.result()
+            if response.success:
+                return
+            reason = response.get('Message', 'Originate rejected')
+        except Exception as e:
+            reason = str(e)
+        self._finish(attempt, 'failed', reason=reason)
+
+    def _on_event(self, message):
+        event = message.get('Event')
+        if event == 'OriginateResponse':
+            status = ORIGINATE_REASONS.get(message.get('Reason'), 'failed')
+            answered = message.get('Response') == 'Success' or status == 'answered'
+            with self._lock:
+                attempt = self._by_action_id.get(message.action_id)
+                # A late response must not revive an attempt that already timed out or failed
+                if not attempt or attempt['status'] in FINAL_STATUSES:
+                    return
+                if answered:
+                    attempt['status'] = 'answered'
+                    attempt['answered_at'] = datetime.now()
+                    attempt['unique_id'] = message.get('Uniqueid')
+                    self._by_unique_id[attempt['unique_id']] = attempt
+            if answered:
+                self._mark_dirty(attempt)
+            else:
+                self._finish(attempt, status, reason=f"Reason {message.get('Reason')}")
+        elif event == 'Hangup':
+            with self._lock:
+                attempt = self._by_unique_id.get(message.get('Uniqueid'))
+            if attempt:
+                self._finish(attempt, 'completed', reason=message.get('Cause-txt'))
+
+    def _finish(self, attempt, status, reason=None, release=True):
+        """Record a final outcome and free the attempt's channel slot exactly once"""
+        with self._lock:
+            if attempt['status'] in FINAL_STATUSES:
+                return
+            attempt['status'] = status
+            attempt['reason'] = reason
+            attempt['ended_at'] = datetime.now()
+            self._by_action_id.pop(attempt['action_id'], None)
+            self._by_unique_id.pop(attempt['unique_id'], None)
+            self._in_flight.pop((attempt['campaign_id'], attempt['seq']), None)
+            holds_slot = attempt['holds_slot']
+            attempt['holds_slot'] = False
+            campaign = self.campaigns.get(attempt['campaign_id'])
+            if holds_slot and campaign:
+                campaign['in_flight'] -= 1
+
+        if release and holds_slot and campaign:
+            campaign['slots'].release()
+        self._mark_dirty(attempt)
+
+    def _mark_dirty(self, attempt):
+        with self._lock:
+            self._dirty.append(attempt)
+            size = len(self._dirty)
+        if size >= self.flush_size:
+            self._flush_event.set()
+
+    def _expire_stale_attempts(self):
+        """Free slots whose OriginateResponse or Hangup never arrived"""
+        now = datetime.now()
+        # Only attempts holding a slot can go stale, so a 50k-number campaign costs nothing here
+        with self._lock:
+            in_flight = [(attempt, self.campaigns.get(attempt['campaign_id']))
+                         for attempt in self._in_flight.values()]
+        for attempt, campaign in in_flight:
+            if attempt['status'] == 'dialing' and campaign:
+                dial_limit = campaign['originate_timeout'] / 1000.0 + 30
+                if (now - attempt['attempted_at']).total_seconds() > dial_limit:
+                    self._finish(attempt, 'timeout', reason='No OriginateResponse')
+            elif attempt['status'] == 'answered' and attempt['answered_at']:
+                if (now - attempt['answered_at']).total_seconds() > self.max_call_seconds:
+                    self._finish(attempt, 'completed', reason='Hangup not observed')
+
+    def _flush_loop(self):
+        while self.running or self._dirty:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self._expire_stale_attempts()
+                self._flush()
+                self._prune_finished()
+            except Exception as e:
+                self.logger.error(f"Error flushing campaign outcomes: {e}")
+            if not self.running:
+                break
+
+    def _prune_finished(self):
+        """Keep finished campaigns in memory for an hour for status queries"""
+        now = datetime.now()
+        with self._lock:
+            for campaign in list(self.campaigns.values()):
+                if campaign.get('persisted') and (now - campaign['finished_at']).total_seconds() > 3600:
+                    self.campaigns.pop(campaign['campaign_id'], None)
+
+    def _flush(self):
+        """Write every changed attempt in one multi-row upsert"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+        if not dirty:
+            return
+
+        # Only the latest state of each attempt matters
+        latest = {}
+        for attempt in dirty:
+            latest[(attempt['campaign_id'], attempt['seq'])] = attempt
+        rows = [
+            (a['campaign_id'], a['seq'], a['phone_number'], a['status'], a['reason'],
+             a['unique_id'], a['attempted_at'], a['answered_at'], a['ended_at'])
+            for a in latest.values()
+        ]
+        with self._lock:
+            finished = [c for c in self.campaigns.values() if c['finished_at'] and not c.get('persisted')]
+
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO campaign_attempts (campaign_id, seq, phone_number, status, reason,
+                                                   unique_id, attempted_at, answered_at, ended_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE status = VALUES(status), reason = VALUES(reason),
+                        unique_id = VALUES(unique_id), attempted_at = VALUES(attempted_at),
+                        answered_at = VALUES(answered_at), ended_at = VALUES(ended_at)
+                """, rows)
+                for campaign in finished:
+                    cursor.execute("""
+                        UPDATE campaigns SET status = %s, finished_at = %s WHERE campaign_id = %s
+                    """, (campaign['status'], campaign['finished_at'], campaign['campaign_id']))
+                connection.commit()
+            for campaign in finished:
+                campaign['persisted'] = True
+        except Exception:
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                self._dirty[:0] = dirty
+            raise
+        finally:
+            if connection:
+                connection.close()
+
+        if self.socketio_instance:
+            for campaign_id in {a['campaign_id'] for a in latest.values()}:
+                summary = self.get_campaign(campaign_id)
+                if summary:
+                    self.socketio_instance.emit('campaign_update', summary)
+
+    def _store_campaign(self, campaign):
+        """Insert the campaign row; its attempts are stored by the dial thread"""
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO campaigns (campaign_id, name, context, extension, channel_template, caller_id,
+                                           max_concurrent, calls_per_second, total_numbers, status, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    campaign['campaign_id'],
+                    campaign['name'],
+                    campaign['context'],
+                    campaign['extension'],
+                    campaign['channel_template'],
+                    campaign['caller_id'],
+                    campaign['max_concurrent'],
+                    campaign['calls_per_second'],
+                    len(campaign['attempts']),
+                    campaign['status'],
+                    campaign['created_at']
+                ))
+                connection.commit()
+        except Exception:
+            if connection:
+                connection.rollback()
+            raise
+        finally:
+            if connection:
+                connection.close()
+
+    def _store_attempts(self, campaign):
+        """Insert the pending attempt rows in chunked multi-row INSERTs, one short transaction each
+
+        Runs on the dial thread so creating a 50k-number campaign does not hold
+        up the request. If a chunk fails the rest are skipped: every attempt is
+        upserted by _flush anyway once it is dialed or cancelled.
+        """
+        attempts = campaign['attempts']
+        connection = None
+        try:
+            connection = self.connection_factory()
+            with connection.cursor() as cursor:
+                for start in range(0, len(attempts), ATTEMPT_INSERT_CHUNK):
+                    cursor.executemany("""
+                        INSERT INTO campaign_attempts (campaign_id, seq, phone_number, status)
+                        VALUES (%s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE seq = seq
+                    """, [(a['campaign_id'], a['seq'], a['phone_number'], a['status'])
+                          for a in attempts[start:start + ATTEMPT_INSERT_CHUNK]])
+                    connection.commit()
+        except Exception as e:
+            self.logger.error(f"Error storing attempts for campaign {campaign['campaign_id']}: {e}")
+            if connection:
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+        finally:
+            if connection:
+                connection.close()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+MySQL / PostgreSQL database adapter
+
+Resolves the backend once from the environment (DATABASE_URL means Render
+PostgreSQL, otherwise on-prem MySQL), keeps one connection pool per backend
+and smooths over the dialect differences the call-handling code runs into:
+
+- placeholders: queries may use %s (both drivers) or portable ? placeholders
+- upserts: ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT ... DO UPDATE on PostgreSQL
+- bulk writes: pymysql's multi-row executemany on MySQL, execute_values /
+  execute_batch on PostgreSQL instead of psycopg2's row-at-a-time executemany
+- DDL: MySQL-dialect CREATE TABLE (AUTO_INCREMENT, DATETIME, ON UPDATE
+  CURRENT_TIMESTAMP) is rewritten for PostgreSQL, with a trigger standing in
+  for ON UPDATE
+"""
+
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+
+from db_pool import ConnectionPool
+
+try:
+    import pymysql
+    MYSQL_AVAILABLE = True
+except ImportError:
+    MYSQL_AVAILABLE = False
+
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor, execute_batch, execute_values
+    POSTGRES_AVAILABLE = True
+except ImportError:
+    POSTGRES_AVAILABLE = False
+
+
+_QUOTED = re.compile(r"('(?:[^']|'')*')")
+_INSERT_VALUES = re.compile(r"^(\s*INSERT\s+INTO\s+.+?\s+VALUES)\s*(\([^()]*\))(.*)$",
+                            re.IGNORECASE | re.DOTALL)
+_AUTO_INCREMENT = re.compile(r"\b(BIG)?INT(?:EGER)?(?:\(\d+\))?\s+(?:NOT\s+NULL\s+)?AUTO_INCREMENT\b",
+                             re.IGNORECASE)
+_ON_UPDATE = re.compile(r"(\w+)\s+(?:DATETIME|TIMESTAMP)\b([^,]*?)\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP",
+                        re.IGNORECASE)
+_TABLE_NAME = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_TABLE_OPTIONS = re.compile(r"\)\s*(?:ENGINE|DEFAULT\s+CHARSET|COMMENT)[^)]*$", re.IGNORECASE)
+
+
+def resolve_database_config(environ=None):
+    """Backend and connection settings from the environment"""
+    environ = os.environ if environ is None else environ
+    if environ.get('DATABASE_URL'):
+        # Render PostgreSQL
+        return {
+            'type': 'postgresql',
+            'url': environ['DATABASE_URL']
+        }
+    # Local MySQL
+    return {
+        'type': 'mysql',
+        'host': environ.get('DB_HOST', 'localhost'),
+        'user': environ.get('DB_USER', 'root'),
+        'password': environ.get('DB_PASSWORD', '1412'),
+        'database': environ.get('DB_NAME', 'resource_allocation'),
+        'charset': 'utf8mb4'
+    }
+
+
+def open_db_connection(config):
+    """Open a raw database connection based on configuration"""
+    if config['type'] == 'postgresql':
+        if not POSTGRES_AVAILABLE:
+            raise Exception("PostgreSQL driver not available")
+
+        return psycopg2.connect(
+            config['url'],
+            cursor_factory=RealDictCursor
+        )
+
+    elif config['type'] == 'mysql':
+        if not MYSQL_AVAILABLE:
+            raise Exception("MySQL driver not available")
+
+        return pymysql.connect(
+            host=config['host'],
+            user=config['user'],
+            password=config['password'],
+            database=config['database'],
+            charset=config['charset'],
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    raise ValueError(f"Unknown database type: {config['type']}")
+
+
+@lru_cache(maxsize=512)
+def translate_placeholders(query):
+    """Rewrite ? placeholders to the drivers' %s, escaping literal % signs; %s queries pass through"""
+    parts = _QUOTED.split(query)
+    if not any('?' in part for part in parts[::2]):
+        return query
+    translated = []
+    for index, part in enumerate(parts):
+        part = part.replace('%', '%%')
+        if index % 2 == 0:
+            part = part.replace('?', '%s')
+        translated.append(part)
+    return ''.join(translated)
+
+
+class DatabaseAdapter:
+    """Pooled connections plus dialect translation for one backend"""
+
+    def __init__(self, config, pool_size=5, max_overflow=10, timeout=10, recycle=1800,
+                 batch_size=500, logger=None):
+        self.config = config
+        self.backend = config['type']
+        # Rows per statement for bulk writes
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.pool = ConnectionPool(
+            lambda: open_db_connection(config),
+            size=pool_size,
+            max_overflow=max_overflow,
+            timeout=timeout,
+            recycle=recycle,
+            logger=self.logger,
+            name=f"DB-Pool-{self.backend}"
+        )
+
+    @property
+    def is_postgresql(self):
+        return self.backend == 'postgresql'
+
+    def connection(self, timeout=None):
+        """Check out a pooled connection; close() returns it"""
+        return self.pool.get(timeout)
+
+    def execute(self, cursor, query, args=None):
+        """Execute one statement written with %s or ? placeholders"""
+        if args is None:
+            return cursor.execute(query)
+        return cursor.execute(translate_placeholders(query), args)
+
+    def executemany(self, cursor, query, rows):
+        """Bulk execute, one multi-row statement per batch where the backend allows it"""
+        rows = list(rows)
+        if not rows:
+            return 0
+        query = translate_placeholders(query)
+        if not self.is_postgresql:
+            # pymysql folds INSERT ... VALUES (...) into multi-row statements itself
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(query, rows[start:start + self.batch_size])
+            return len(rows)
+
+        match = _INSERT_VALUES.match(query)
+        if match:
+            head, template, tail = match.groups()
+            execute_values(cursor, f"{head} %s{tail}", rows, template=template, page_size=self.batch_size)
+        else:
+            execute_batch(cursor, query, rows, page_size=self.batch_size)
+        return len(rows)
+
+    def upsert_sql(self, table, columns, key_columns, update_columns=None):
+        """INSERT that updates update_columns (default: all non-key columns) when the key exists"""
+        if update_columns is None:
+            update_columns = [column for column in columns if column not in key_columns]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        if self.is_postgresql:
+            conflict = f" ON CONFLICT ({', '.join(key_columns)}) DO"
+            if not update_columns:
+                return sql + conflict + " NOTHING"
+            return sql + conflict + " UPDATE SET " + ", ".join(f"{column} = EXCLUDED.{column}"
+                                                              for column in update_columns)
+        if not update_columns:
+            # No-op assignment keeps duplicates silent without INSERT IGNORE swallowing other errors
+            return sql + f" ON DUPLICATE KEY UPDATE {key_columns[0]} = {key_columns[0]}"
+        return sql + " ON DUPLICATE KEY UPDATE " + ", ".join(f"{column} = VALUES({column})"
+                                                              for column in update_columns)
+
+    def upsert(self, cursor, table, columns, rows, key_columns, update_columns=None):
+        """Insert or update rows (sequences in columns order); keys must be unique within rows"""
+        return self.executemany(cursor, self.upsert_sql(table, columns, key_columns, update_columns), rows)
+
+    def ddl(self, statement):
+        """Statements for a MySQL-dialect CREATE TABLE on this backend"""
+        if not self.is_postgresql:
+            return [statement]
+
+        table = _TABLE_NAME.search(statement)
+        updated_columns = [match.group(1) for match in _ON_UPDATE.finditer(statement)]
+        statement = _ON_UPDATE.sub(lambda match: f"{match.group(1)} TIMESTAMP{match.group(2)}", statement)
+        statement = _AUTO_INCREMENT.sub(lambda match: 'BIGSERIAL' if match.group(1) else 'SERIAL', statement)
+        statement = re.sub(r"\bDATETIME\b", "TIMESTAMP", statement, flags=re.IGNORECASE)
+        statement = re.sub(r"\bTINYINT(?:\(\d+\))?", "SMALLINT", statement, flags=re.IGNORECASE)
+        statement = _TABLE_OPTIONS.sub(")", statement.rstrip())
+
+        statements = [statement]
+        for column in updated_columns:
+            # PostgreSQL has no ON UPDATE CURRENT_TIMESTAMP; a row trigger does the same job
+            function = f"set_{column}"
+            trigger = f"{table.group(1)}_{column}"
+            statements.extend([
+                f"CREATE OR REPLACE FUNCTION {function}() RETURNS TRIGGER AS $$ "
+                f"BEGIN NEW.{column} = CURRENT_TIMESTAMP; RETURN NEW; END; $$ LANGUAGE plpgsql",
+                f"DO $$ BEGIN IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{trigger}') THEN "
+                f"CREATE TRIGGER {trigger} BEFORE UPDATE ON {table.group(1)} "
+                f"FOR EACH ROW EXECUTE PROCEDURE {function}(); END IF; END $$"
+            ])
+        return statements
+
+    def column_exists(self, cursor, table, column):
+        """True when table already has column"""
+        schema = "current_schema()" if self.is_postgresql else "DATABASE()"
+        cursor.execute(f"""
+            SELECT 1 AS present FROM information_schema.columns
+            WHERE table_schema = {schema} AND table_name = %s AND column_name = %s
+        """, (table, column))
+        return cursor.fetchone() is not None
+
+    def metrics(self):
+        data = self.pool.metrics()
+        data['backend'] = self.backend
+        return data
+
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+def get_adapter(config=None, **options):
+    """Shared adapter (and pool) for a backend, created on first use"""
+    config = config or resolve_database_config()
+    with _adapters_lock:
+        adapter = _adapters.get(config['type'])
+        if adapter is None:
+            adapter = _adapters[config['type']] = DatabaseAdapter(config, **options)
+        return adapter
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Bounded database connection pool
+
+Hands out proxies around DB-API connections (pymysql or psycopg2) whose
+close() returns the connection to the pool instead of closing the socket, so
+existing "connection = get_db_connection() ... connection.close()" code gets
+pooling without changes. Idle connections are pinged before reuse, recycled
+after a maximum lifetime and rolled back on return so no transaction or
+snapshot leaks into the next request. Up to max_overflow extra connections are
+opened under bursts and closed again when returned; past that, callers wait up
+to timeout seconds and the waits are counted.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout"""
+
+
+def ping_connection(connection):
+    """Cheap liveness check: COM_PING for pymysql, SELECT 1 for other drivers"""
+    if hasattr(connection, 'ping'):
+        connection.ping(reconnect=False)
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+    finally:
+        cursor.close()
+    connection.rollback()
+
+
+def reset_connection(connection):
+    """Roll back anything the previous user left open; skips the round trip when idle"""
+    server_status = getattr(connection, 'server_status', None)
+    if server_status is not None:
+        # pymysql: SERVER_STATUS_IN_TRANS
+        if server_status & 1:
+            connection.rollback()
+        return
+    if hasattr(connection, 'get_transaction_status'):
+        # psycopg2: TRANSACTION_STATUS_IDLE
+        if connection.get_transaction_status() != 0:
+            connection.rollback()
+        return
+    connection.rollback()
+
+
+class PooledConnection:
+    """Connection proxy whose close() hands the connection back to its pool"""
+
+    def __init__(self, pool, record):
+        self._pool = pool
+        self._record = record
+
+    def __getattr__(self, name):
+        record = self.__dict__.get('_record')
+        if record is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(record.connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        wrapper = self._pool.cursor_wrapper
+        return wrapper(cursor) if wrapper else cursor
+
+    def close(self):
+        """Return the connection to the pool"""
+        record, self._record = self._record, None
+        if record is not None:
+            self._pool._release(record)
+
+    def invalidate(self):
+        """Close the underlying connection instead of reusing it"""
+        record, self._record = self._record, None
+        if record is not None:
+            self._pool._discard(record)
+
+    @property
+    def closed(self):
+        return self._record is None
+
+    def __del__(self):
+        # A caller that forgot close() must not leak the pool slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class _Record:
+    __slots__ = ('connection', 'created_at', 'returned_at', 'checked_out_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        self.checked_out_at = None
+
+
+class ConnectionPool:
+    """Thread-safe (and eventlet-safe once monkey patched) pool of DB-API connections"""
+
+    def __init__(self, connect, size=10, max_overflow=10, timeout=10, recycle=3600,
+                 pre_ping=True, ping_after=5, ping=ping_connection, reset=reset_connection,
+                 cursor_wrapper=None, logger=None, name="DB-Pool"):
+        # Zero-argument callable that opens a new raw connection
+        self.connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        # Connections older than this many seconds are closed instead of reused
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        # Only connections idle at least this long are pinged on checkout
+        self.ping_after = ping_after
+        self.ping = ping
+        self.reset = reset
+        # Optional callable wrapping every cursor handed out, e.g. QueryProfiler.wrap_cursor
+        self.cursor_wrapper = cursor_wrapper
+        self.logger = logger or logging.getLogger(__name__)
+        self.name = name
+
+        self.checkouts = 0
+        self.connections_created = 0
+        self.connections_recycled = 0
+        self.ping_failures = 0
+        self.reset_failures = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.overflow_peak = 0
+
+        self._idle = deque()    # most recently returned on the right
+        self._open = 0          # idle + checked out + being opened
+        self._cond = threading.Condition()
+
+    def get(self, timeout=None):
+        """Check out a live connection, waiting up to timeout seconds when the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        while True:
+            record = None
+            with self._cond:
+                while not self._idle and self._open >= self.size + self.max_overflow:
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"{self.name} exhausted: {self._open} connections in use "
+                                          f"after waiting {timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    record = self._idle.pop()
+                else:
+                    self._open += 1
+                    self.overflow_peak = max(self.overflow_peak, self._open - self.size)
+
+            if record is None:
+                try:
+                    record = _Record(self.connect())
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                self.connections_created += 1
+            elif not self._usable(record):
+                continue
+
+            with self._cond:
+                if waited:
+                    wait_time = time.monotonic() - started
+                    self.waits += 1
+                    self.wait_time_total += wait_time
+                    self.wait_time_max = max(self.wait_time_max, wait_time)
+                self.checkouts += 1
+            record.checked_out_at = time.monotonic()
+            return PooledConnection(self, record)
+
+    def close(self):
+        """Close every idle connection; checked-out ones are closed when returned"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for record in idle:
+            self._close_raw(record)
+
+    def metrics(self):
+        """Pool occupancy, checkout wait times and connection churn"""
+        with self._cond:
+            idle = len(self._idle)
+            open_connections = self._open
+        return {
+            'size': self.size,
+            'max_overflow': self.max_overflow,
+            'open': open_connections,
+            'idle': idle,
+            'in_use': open_connections - idle,
+            'overflow': max(open_connections - self.size, 0),
+            'overflow_peak': max(self.overflow_peak, 0),
+            'checkouts': self.checkouts,
+            'connections_created': self.connections_created,
+            'connections_recycled': self.connections_recycled,
+            'ping_failures': self.ping_failures,
+            'reset_failures': self.reset_failures,
+            'waits': self.waits,
+            'wait_ms_avg': round(self.wait_time_total / self.waits * 1000, 2) if self.waits else 0.0,
+            'wait_ms_max': round(self.wait_time_max * 1000, 2),
+            'timeouts': self.timeouts
+        }
+
+    def _usable(self, record):
+        """Check an idle connection before reuse; a dead or expired one is closed and False returned"""
+        now = time.monotonic()
+        if self.recycle and now - record.created_at > self.recycle:
+            self.connections_recycled += 1
+            self._discard(record)
+            return False
+        if self.pre_ping and now - record.returned_at >= self.ping_after:
+            try:
+                self.ping(record.connection)
+            except Exception as e:
+                self.ping_failures += 1
+                self.logger.warning(f"{self.name} dropped a dead connection: {e}")
+                self._discard(record)
+                return False
+        return True
+
+    def _release(self, record):
+        try:
+            self.reset(record.connection)
+        except Exception as e:
+            self.reset_failures += 1
+            self.logger.warning(f"{self.name} could not reset a returned connection: {e}")
+            self._discard(record)
+            return
+
+        record.returned_at = time.monotonic()
+        expired = self.recycle and record.returned_at - record.created_at > self.recycle
+        with self._cond:
+            if not expired and len(self._idle) < self.size:
+                self._idle.append(record)
+                self._cond.notify()
+                return
+        # Overflow or expired: close it rather than keep it idle
+        if expired:
+            self.connections_recycled += 1
+        self._discard(record)
+
+    def _discard(self, record):
+        self._close_raw(record)
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _close_raw(self, record):
+        try:
+            record.connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Read replica routing
+
+Read-only endpoints check out connections from a replica pool while the
+replica's replication lag is within their staleness tolerance; otherwise, or
+when the replica is unreachable, they fall back to the primary pool. Writes
+and read-your-writes paths keep using the primary directly.
+
+Lag is read from SHOW REPLICA STATUS (SHOW SLAVE STATUS before MySQL 8.0.22)
+on a checked-out replica connection at most once per check_interval, so
+routing adds no round trip to most requests. Replication that is stopped or
+broken (NULL lag) counts as too stale for every caller.
+"""
+
+import logging
+import threading
+import time
+
+
+def replica_lag(connection):
+    """Seconds behind the source, None when replication is stopped, 0 when not a replica"""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+    if not row:
+        # Not configured as a replica (e.g. a managed reader endpoint): trust it
+        return 0
+    if not isinstance(row, dict):
+        row = dict(zip([column[0] for column in cursor.description], row))
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return None if lag is None else int(lag)
+
+
+class ReplicaRouter:
+    """Hand out replica connections for reads that tolerate lag, primary connections otherwise"""
+
+    def __init__(self, primary, replica=None, max_lag=5, check_interval=5, retry_after=30,
+                 checkout_timeout=1, lag_check=replica_lag, logger=None):
+        # ConnectionPool instances; without a replica every read goes to the primary
+        self.primary = primary
+        self.replica = replica
+        # Default staleness tolerance in seconds
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # Seconds to leave the replica alone after it failed
+        self.retry_after = retry_after
+        # Short replica checkout wait so an exhausted replica pool falls back quickly
+        self.checkout_timeout = checkout_timeout
+        self.lag_check = lag_check
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.lag = None
+        self.lag_checked_at = 0.0
+        self.failed_at = 0.0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.stale_fallbacks = 0
+        self.error_fallbacks = 0
+        self._lock = threading.Lock()
+
+    def get(self, max_lag=None):
+        """Connection for a read-only request that accepts data up to max_lag seconds old"""
+        max_lag = self.max_lag if max_lag is None else max_lag
+        if self.replica is None or time.monotonic() - self.failed_at < self.retry_after:
+            return self._primary()
+
+        connection = None
+        try:
+            connection = self.replica.get(timeout=self.checkout_timeout)
+            lag = self._current_lag(connection)
+        except Exception as e:
+            if connection is not None:
+                connection.invalidate()
+            self._replica_failed(e)
+            return self._primary()
+
+        if lag is None or lag > max_lag:
+            connection.close()
+            with self._lock:
+                self.stale_fallbacks += 1
+            return self._primary()
+
+        with self._lock:
+            self.replica_reads += 1
+        return connection
+
+    def metrics(self):
+        """Replica lag and how reads were routed"""
+        return {
+            'replica_configured': self.replica is not None,
+            'replica_lag': self.lag,
+            'max_lag': self.max_lag,
+            'replica_available': self.replica is not None and time.monotonic() - self.failed_at >= self.retry_after,
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'stale_fallbacks': self.stale_fallbacks,
+            'error_fallbacks': self.error_fallbacks,
+            'replica_pool': self.replica.metrics() if self.replica is not None else None
+        }
+
+    def _current_lag(self, connection):
+        with self._lock:
+            if time.monotonic() - self.lag_checked_at < self.check_interval:
+                return self.lag
+        lag = self.lag_check(connection)
+        with self._lock:
+            if lag is None and self.lag is not None:
+                self.logger.warning("Replica is not replicating; reads fall back to the primary")
+            self.lag = lag
+            self.lag_checked_at = time.monotonic()
+        return lag
+
+    def _replica_failed(self, error):
+        with self._lock:
+            self.error_fallbacks += 1
+            self.failed_at = time.monotonic()
+            self.lag_checked_at = 0.0
+        self.logger.warning(f"Replica unavailable, reading from the primary for {self.retry_after}s: {error}")
+
+    def _primary(self):
+        with self._lock:
+            self.primary_reads += 1
+        return self.primary.get()
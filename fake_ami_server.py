@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Asterisk Manager Interface (AMI)
+
+Speaks enough of the AMI protocol (Login, Logoff, Ping, Originate, Hangup,
+SetVar, GetVar, Status, CoreShowChannels) for the Flask apps, the test
+scripts and benchmark_ami.py to run without a real Asterisk. Tests drive it
+in-process; run it from the command line to point a dev instance at it:
+
+    python fake_ami_server.py --port 5038 --calls-per-minute 6
+"""
+
+import argparse
+import itertools
+import logging
+import random
+import socket
+import threading
+import time
+
+
+# OriginateResponse Reason codes as sent by Asterisk
+REASON_ANSWERED = 4
+REASON_NO_ANSWER = 3
+REASON_BUSY = 5
+
+
+class FakeAMIClient:
+    """One connected manager session"""
+
+    def __init__(self, conn, address):
+        self.conn = conn
+        self.address = address
+        self.authenticated = False
+        self.write_lock = threading.Lock()
+
+    def send(self, headers):
+        packet = ''.join(f"{key}: {value}\r\n" for key, value in headers) + "\r\n"
+        with self.write_lock:
+            self.conn.sendall(packet.encode())
+
+
+class FakeAMIServer:
+    """Scriptable in-process AMI server that answers actions and emits synthetic channel events"""
+
+    def __init__(self, host='127.0.0.1', port=0, username='admin', secret='admin',
+                 response_delay=0.0, answer_rate=1.0, ring_seconds=0.0, call_seconds=None,
+                 logger=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.secret = secret
+        # Seconds added before every response, to model a slow or remote Asterisk
+        self.response_delay = response_delay
+        # Share of originated calls that answer; the rest are busy or unanswered
+        self.answer_rate = answer_rate
+        self.ring_seconds = ring_seconds
+        # Answered originated calls hang up on their own after this long (None keeps them up)
+        self.call_seconds = call_seconds
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.channels = {}          # Uniqueid -> channel dict
+        self.global_vars = {}
+        self.action_counts = {}
+        self.clients = []
+        self.running = False
+        self._server_socket = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        """Bind, start accepting sessions and return (host, port)"""
+        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server_socket.bind((self.host, self.port))
+        self._server_socket.listen(128)
+        self.port = self._server_socket.getsockname()[1]
+        self.running = True
+
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True, name="FakeAMI-Accept-Thread")
+        accept_thread.start()
+        self.logger.info(f"Fake AMI server listening on {self.host}:{self.port}")
+        return self.address
+
+    def stop(self):
+        """Close the listener and every client session"""
+        self.running = False
+        if self._server_socket:
+            try:
+                self._server_socket.close()
+            except Exception:
+                pass
+        with self._lock:
+            clients = list(self.clients)
+            self.clients.clear()
+        for client in clients:
+            self._close_client(client)
+
+    def drop_clients(self):
+        """Disconnect every session without stopping the listener, to exercise reconnects"""
+        with self._lock:
+            clients = list(self.clients)
+            self.clients.clear()
+        for client in clients:
+            self._close_client(client)
+
+    def emit_event(self, event, **headers):
+        """Send an unsolicited event to every logged-in session"""
+        self._broadcast([('Event', event)] + list(headers.items()))
+
+    def simulate_incoming_call(self, caller_id='09171234567', exten='1412', context='from-internal',
+                               answer_after=None, hangup_after=None):
+        """Emit the event sequence of an inbound PJSIP call and return its Uniqueid"""
+        channel = self._new_channel(f"PJSIP/{caller_id}", caller_id, exten, context, 'Ring')
+        if answer_after is not None:
+            self._later(answer_after, self.answer_channel, channel['Uniqueid'])
+        if hangup_after is not None:
+            self._later(hangup_after, self.hangup, channel['Uniqueid'])
+        return channel['Uniqueid']
+
+    def answer_channel(self, unique_id):
+        """Move a channel to Up and put it in a bridge"""
+        channel = self.channels.get(unique_id)
+        if not channel:
+            return
+        channel['ChannelState'], channel['ChannelStateDesc'] = '6', 'Up'
+        channel['BridgeId'] = f"bridge-{unique_id}"
+        self.emit_event('Newstate', **self._channel_headers(channel))
+        self.emit_event('BridgeEnter', BridgeUniqueid=channel['BridgeId'], **self._channel_headers(channel))
+
+    def hangup(self, unique_id, cause=16):
+        """Hang a channel up and emit its Hangup event; returns False if it does not exist"""
+        with self._lock:
+            channel = self.channels.pop(unique_id, None)
+        if not channel:
+            return False
+        self.emit_event('Hangup', Cause=cause, **{'Cause-txt': 'Normal Clearing'}, **self._channel_headers(channel))
+        return True
+
+    def _later(self, delay, func, *args):
+        timer = threading.Timer(delay, func, args)
+        timer.daemon = True
+        timer.start()
+
+    def _new_channel(self, prefix, caller_id, exten, context, state_desc):
+        unique_id = f"{int(time.time())}.{next(self._ids)}"
+        channel = {
+            'Channel': f"{prefix}-{unique_id.replace('.', '')}",
+            'Uniqueid': unique_id,
+            'Linkedid': unique_id,
+            'ChannelState': '4' if state_desc == 'Ring' else '0',
+            'ChannelStateDesc': state_desc,
+            'CallerIDNum': caller_id,
+            'CallerIDName': '<unknown>',
+            'Context': context,
+            'Exten': exten,
+            'Priority': '1',
+            'BridgeId': '',
+            'Variables': {},
+            'created': time.time()
+        }
+        with self._lock:
+            self.channels[unique_id] = channel
+        self.emit_event('Newchannel', **self._channel_headers(channel))
+        return channel
+
+    def _channel_headers(self, channel):
+        return {key: value for key, value in channel.items() if key not in ('Variables', 'BridgeId', 'created')}
+
+    def _find_channel(self, name):
+        with self._lock:
+            for channel in self.channels.values():
+                if channel['Channel'] == name or channel['Uniqueid'] == name:
+                    return channel
+        return None
+
+    def _broadcast(self, headers):
+        with self._lock:
+            clients = [client for client in self.clients if client.authenticated]
+        for client in clients:
+            try:
+                client.send(headers)
+            except Exception:
+                self._close_client(client)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, address = self._server_socket.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = FakeAMIClient(conn, address)
+            with self._lock:
+                self.clients.append(client)
+            thread = threading.Thread(target=self._serve_client, args=(client,), daemon=True,
+                                      name="FakeAMI-Client-Thread")
+            thread.start()
+
+    def _serve_client(self, client):
+        try:
+            client.conn.sendall(b"Asterisk Call Manager/5.0.0\r\n")
+            stream = client.conn.makefile('rb')
+            packet = {}
+            for line in stream:
+                line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                if line:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        packet[key.strip()] = value.strip()
+                    continue
+                if packet:
+                    if not self._handle(client, packet):
+                        break
+                    packet = {}
+        except Exception as e:
+            if self.running:
+                self.logger.debug(f"Fake AMI client {client.address} closed: {e}")
+        finally:
+            with self._lock:
+                if client in self.clients:
+                    self.clients.remove(client)
+            self._close_client(client)
+
+    def _close_client(self, client):
+        try:
+            client.conn.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+        try:
+            client.conn.close()
+        except Exception:
+            pass
+
+    def _handle(self, client, packet):
+        """Answer one action; returns False once the session should close"""
+        action = packet.get('Action', '')
+        with self._lock:
+            self.action_counts[action] = self.action_counts.get(action, 0) + 1
+        if self.response_delay:
+            time.sleep(self.response_delay)
+
+        reply = [('ActionID', packet['ActionID'])] if 'ActionID' in packet else []
+        if action.lower() != 'login' and not client.authenticated:
+            client.send([('Response', 'Error')] + reply + [('Message', 'Permission denied')])
+            return True
+
+        handler = getattr(self, f"_action_{action.lower()}", None)
+        if handler is None:
+            client.send([('Response', 'Error')] + reply + [('Message', 'Invalid/unknown command')])
+            return True
+        return handler(client, packet, reply) is not False
+
+    def _action_login(self, client, packet, reply):
+        if packet.get('Username') == self.username and packet.get('Secret') == self.secret:
+            client.authenticated = True
+            client.send([('Response', 'Success')] + reply + [('Message', 'Authentication accepted')])
+            client.send([('Event', 'FullyBooted'), ('Privilege', 'system,all'), ('Status', 'Fully Booted')])
+        else:
+            client.send([('Response', 'Error')] + reply + [('Message', 'Authentication failed')])
+            return False
+
+    def _action_logoff(self, client, packet, reply):
+        client.send([('Response', 'Goodbye')] + reply + [('Message', 'Thanks for all the fish.')])
+        return False
+
+    def _action_ping(self, client, packet, reply):
+        client.send([('Response', 'Success')] + reply + [('Ping', 'Pong'), ('Timestamp', f"{time.time():.6f}")])
+
+    def _action_setvar(self, client, packet, reply):
+        name, value = packet.get('Variable'), packet.get('Value', '')
+        if not name:
+            client.send([('Response', 'Error')] + reply + [('Message', 'No variable specified')])
+            return
+        if packet.get('Channel'):
+            channel = self._find_channel(packet['Channel'])
+            if not channel:
+                client.send([('Response', 'Error')] + reply + [('Message', 'No such channel')])
+                return
+            channel['Variables'][name] = value
+        else:
+            self.global_vars[name] = value
+        client.send([('Response', 'Success')] + reply + [('Message', 'Variable Set')])
+
+    def _action_getvar(self, client, packet, reply):
+        name = packet.get('Variable', '')
+        if packet.get('Channel'):
+            channel = self._find_channel(packet['Channel'])
+            if not channel:
+                client.send([('Response', 'Error')] + reply + [('Message', 'No such channel')])
+                return
+            value = channel['Channel'] if name == 'CHANNEL' else channel['Variables'].get(name, '')
+        else:
+            value = self.global_vars.get(name, '')
+        client.send([('Response', 'Success')] + reply + [('Variable', name), ('Value', value)])
+
+    def _action_hangup(self, client, packet, reply):
+        channel = self._find_channel(packet.get('Channel', ''))
+        if not channel:
+            client.send([('Response', 'Error')] + reply + [('Message', 'No such channel')])
+            return
+        client.send([('Response', 'Success')] + reply + [('Message', 'Channel Hungup')])
+        self.hangup(channel['Uniqueid'], packet.get('Cause', 16))
+
+    def _action_originate(self, client, packet, reply):
+        # The repo's originate_call() sends Extension where Asterisk documents Exten
+        packet.setdefault('Exten', packet.get('Extension', 's'))
+        target = packet.get('Channel') or f"Local/{packet['Exten']}@{packet.get('Context', 'default')}"
+        is_async = packet.get('Async', '').lower() in ('true', 'yes', '1')
+        if is_async:
+            client.send([('Response', 'Success')] + reply + [('Message', 'Originate successfully queued')])
+            self._later(self.ring_seconds, self._complete_originate, packet, target)
+            return
+
+        if self.ring_seconds:
+            time.sleep(self.ring_seconds)
+        reason, _unique_id = self._complete_originate(packet, target)
+        if reason == REASON_ANSWERED:
+            client.send([('Response', 'Success')] + reply + [('Message', 'Originate successfully queued')])
+        else:
+            client.send([('Response', 'Error')] + reply + [('Message', 'Originate failed')])
+
+    def _complete_originate(self, packet, target):
+        """Decide the outcome of an originate and emit its events"""
+        caller_id = packet.get('Callerid') or packet.get('CallerID') or ''
+        roll = random.random()
+        if roll < self.answer_rate:
+            reason = REASON_ANSWERED
+        else:
+            reason = random.choice((REASON_BUSY, REASON_NO_ANSWER))
+
+        unique_id = '<null>'
+        if reason == REASON_ANSWERED:
+            channel = self._new_channel(target, caller_id, packet['Exten'],
+                                        packet.get('Context', 'default'), 'Down')
+            for variable in filter(None, packet.get('Variable', '').split(',')):
+                if '=' in variable:
+                    key, value = variable.split('=', 1)
+                    channel['Variables'][key] = value
+            unique_id = channel['Uniqueid']
+            self.answer_channel(unique_id)
+            if self.call_seconds is not None:
+                self._later(self.call_seconds, self.hangup, unique_id)
+
+        headers = {
+            'Response': 'Success' if reason == REASON_ANSWERED else 'Failure',
+            'Channel': target,
+            'Context': packet.get('Context', ''),
+            'Exten': packet['Exten'],
+            'Reason': reason,
+            'Uniqueid': unique_id,
+            'CallerIDNum': caller_id or '<unknown>'
+        }
+        if 'ActionID' in packet:
+            headers['ActionID'] = packet['ActionID']
+        self.emit_event('OriginateResponse', **headers)
+        return reason, unique_id
+
+    def _action_status(self, client, packet, reply):
+        self._send_channel_list(client, reply, 'Status', 'StatusComplete')
+
+    def _action_coreshowchannels(self, client, packet, reply):
+        self._send_channel_list(client, reply, 'CoreShowChannel', 'CoreShowChannelsComplete')
+
+    def _send_channel_list(self, client, reply, item_event, complete_event):
+        with self._lock:
+            channels = list(self.channels.values())
+        client.send([('Response', 'Success')] + reply +
+                    [('EventList', 'start'), ('Message', 'Channels will follow')])
+        now = time.time()
+        for channel in channels:
+            seconds = int(now - channel['created'])
+            headers = [('Event', item_event)] + reply + list(self._channel_headers(channel).items())
+            headers += [('BridgeId', channel['BridgeId']),
+                        ('Duration', f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}")]
+            client.send(headers)
+        client.send([('Event', complete_event)] + reply +
+                    [('EventList', 'Complete'), ('ListItems', len(channels))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Asterisk AMI server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5038)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--secret', default='admin')
+    parser.add_argument('--response-delay', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--answer-rate', type=float, default=0.8, help="share of originated calls that answer")
+    parser.add_argument('--call-seconds', type=float, default=20.0, help="how long answered calls stay up")
+    parser.add_argument('--calls-per-minute', type=float, default=0.0, help="synthetic inbound calls to emit")
+    parser.add_argument('--extension', default='1412', help="extension synthetic inbound calls dial")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeAMIServer(args.host, args.port, args.username, args.secret,
+                           response_delay=args.response_delay, answer_rate=args.answer_rate,
+                           call_seconds=args.call_seconds)
+    server.start()
+    print(f"🚀 Fake AMI server on {server.host}:{server.port} (user {args.username})")
+
+    try:
+        while True:
+            if args.calls_per_minute > 0:
+                time.sleep(random.expovariate(args.calls_per_minute / 60.0))
+                caller_id = f"0917{random.randint(0, 9999999):07d}"
+                answered = random.random() < args.answer_rate
+                unique_id = server.simulate_incoming_call(
+                    caller_id, args.extension,
+                    answer_after=2 if answered else None,
+                    hangup_after=2 + args.call_seconds if answered else 8
+                )
+                print(f"📞 Synthetic call {unique_id} from {caller_id}")
+            else:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n👋 Stopping fake AMI server")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
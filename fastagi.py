@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+asyncio FastAGI server
+
+Asterisk opens one TCP connection per AGI() call, sends the agi_* environment
+block terminated by a blank line and then waits for commands. A single event
+loop thread serves every session with buffered readline() reads, so a burst of
+hundreds of simultaneous calls costs sockets and coroutines rather than one OS
+thread each. Blocking handler work (database, Socket.IO) runs on a small fixed
+thread pool.
+
+When a route coroutine is configured the session stays open as a command
+dialog: route(session) may query the channel (GET VARIABLE, WAIT FOR DIGIT...)
+and returns the commands to run, all within route_deadline seconds. If it is
+late or fails the fallback commands run instead, so Asterisk is never left
+waiting on a slow decision.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_REPLY = "200 result=0\n"
+FAILURE_REPLY = "200 result=-1\n"
+
+_REPLY_PATTERN = re.compile(r'^(\d{3})(?:\s+result=(-?\d+))?(?:\s+\((.*?)\))?(?:\s+(.*))?$')
+
+
+class AGIError(Exception):
+    """Asterisk rejected an AGI command"""
+
+
+class AGIHangup(AGIError):
+    """The channel hung up while the session was still issuing commands"""
+
+
+class AGIReply:
+    """A parsed "200 result=1 (value) endpos=123" command reply"""
+
+    def __init__(self, line):
+        self.line = line
+        match = _REPLY_PATTERN.match(line)
+        if not match:
+            raise AGIError(f"Unparseable AGI reply: {line!r}")
+        self.code = int(match.group(1))
+        self.result = int(match.group(2)) if match.group(2) is not None else None
+        self.data = match.group(3)
+        self.extra = {}
+        for item in (match.group(4) or '').split():
+            if '=' in item:
+                key, value = item.split('=', 1)
+                self.extra[key] = value
+
+    @property
+    def digit(self):
+        """The DTMF digit a STREAM FILE/WAIT FOR DIGIT reply carries, or ''"""
+        return chr(self.result) if self.result and self.result > 0 else ''
+
+    def __repr__(self):
+        return f"AGIReply({self.line!r})"
+
+
+def format_agi_command(*args):
+    """Join command words, quoting arguments that are empty or contain spaces"""
+    words = []
+    for arg in args:
+        arg = str(arg)
+        if not arg or any(ch in arg for ch in ' \t"'):
+            arg = '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        words.append(arg)
+    return ' '.join(words)
+
+
+async def read_agi_environment(reader):
+    """Read the agi_* header block up to the terminating blank line"""
+    agi_vars = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        line = line.decode('utf-8', errors='replace').strip()
+        if not line:
+            break
+        if ':' in line:
+            key, value = line.split(':', 1)
+            agi_vars[key.strip()] = value.strip()
+    return agi_vars
+
+
+class FastAGISession:
+    """Command dialog with Asterisk over one FastAGI connection"""
+
+    def __init__(self, reader, writer, agi_vars, logger=None):
+        self.reader = reader
+        self.writer = writer
+        self.env = agi_vars
+        self.logger = logger or logging.getLogger(__name__)
+        self.hung_up = False
+        # Replies still owed to commands that were cancelled mid-flight
+        self._owed_replies = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def unique_id(self):
+        return self.env.get('agi_uniqueid')
+
+    @property
+    def channel(self):
+        return self.env.get('agi_channel')
+
+    async def command(self, *args):
+        """Send one AGI command and return its AGIReply; raises AGIHangup or AGIError"""
+        line = format_agi_command(*args)
+        async with self._lock:
+            # A command cut off by the route deadline still gets its reply; skip it
+            while self._owed_replies:
+                await self._read_reply_line()
+                self._owed_replies -= 1
+
+            self._owed_replies += 1
+            self.writer.write((line + "\n").encode())
+            await self.writer.drain()
+            reply_line = await self._read_reply_line()
+            self._owed_replies -= 1
+
+        reply = AGIReply(reply_line)
+        if reply.code == 511:
+            self.hung_up = True
+            raise AGIHangup(f"Channel {self.channel} is dead: {line}")
+        if reply.code != 200:
+            raise AGIError(f"{line} failed: {reply_line}")
+        return reply
+
+    async def _read_reply_line(self):
+        while True:
+            raw = await self.reader.readline()
+            if not raw:
+                self.hung_up = True
+                raise AGIHangup(f"Asterisk closed the AGI session for {self.channel}")
+            line = raw.decode('utf-8', errors='replace').strip()
+            if line == 'HANGUP':
+                # AGISIGHUP notice; the command reply still follows
+                self.hung_up = True
+                continue
+            if line.startswith('520-'):
+                # Multi-line usage text, terminated by "520 End of proper usage."
+                while not line.startswith('520 '):
+                    raw = await self.reader.readline()
+                    if not raw:
+                        break
+                    line = raw.decode('utf-8', errors='replace').strip()
+                return '520'
+            if line:
+                return line
+
+    async def get_variable(self, name):
+        """Return a channel variable's value, or None if it is unset"""
+        reply = await self.command('GET', 'VARIABLE', name)
+        return reply.data if reply.result == 1 else None
+
+    async def set_variable(self, name, value):
+        await self.command('SET', 'VARIABLE', name, value)
+
+    async def stream_file(self, filename, escape_digits=''):
+        """Play a sound file; returns the escape digit pressed or ''"""
+        reply = await self.command('STREAM', 'FILE', filename, escape_digits)
+        self._check_channel(reply)
+        return reply.digit
+
+    async def wait_for_digit(self, timeout_ms=5000):
+        """Wait for one DTMF digit; returns it or '' on timeout"""
+        reply = await self.command('WAIT', 'FOR', 'DIGIT', timeout_ms)
+        self._check_channel(reply)
+        return reply.digit
+
+    async def exec_app(self, application, *options):
+        """Run a dialplan application, e.g. exec_app('Dial', 'PJSIP/1412', 30)"""
+        reply = await self.command('EXEC', application, ','.join(str(option) for option in options))
+        self._check_channel(reply)
+        return reply.result
+
+    async def dial(self, targets, timeout=30, options=''):
+        """EXEC Dial to one or more channels; returns DIALSTATUS"""
+        if not isinstance(targets, str):
+            targets = '&'.join(targets)
+        await self.exec_app('Dial', targets, timeout, options)
+        return await self.get_variable('DIALSTATUS')
+
+    async def answer(self):
+        await self.command('ANSWER')
+
+    async def hangup(self):
+        await self.command('HANGUP')
+
+    async def verbose(self, message, level=1):
+        await self.command('VERBOSE', message, level)
+
+    async def run_commands(self, commands):
+        """Run a list of command tuples in order, stopping at hangup"""
+        for command in commands or ():
+            if self.hung_up:
+                break
+            await self.command(*command)
+
+    def _check_channel(self, reply):
+        # Channel-level commands report a hangup during execution as result=-1
+        if reply.result == -1:
+            self.hung_up = True
+            raise AGIHangup(f"Channel {self.channel} hung up")
+
+
+class FastAGIServer:
+    """Event-loop FastAGI listener with a bounded number of in-flight sessions
+
+    handler(agi_vars) is called on the worker pool for every session and returns
+    the reply line written back to Asterisk before the connection is closed.
+    With a route coroutine the handler runs alongside it, its reply is not sent,
+    and the session becomes a command dialog instead (see FastAGISession).
+    """
+
+    def __init__(self, handler, host='0.0.0.0', port=4573, backlog=512, max_sessions=500,
+                 worker_threads=16, env_timeout=5, busy_timeout=2, route=None,
+                 route_deadline=0.25, fallback_commands=None, reuse_port=False, logger=None):
+        self.handler = handler
+        # Let several processes bind the same port (see agi_workers.py)
+        self.reuse_port = reuse_port
+        self.route = route
+        self.route_deadline = route_deadline
+        self.fallback_commands = fallback_commands or []
+        self.host = host
+        self.port = port
+        # Kernel accept queue; Asterisk retries connects that overflow it
+        self.backlog = backlog
+        self.max_sessions = max_sessions
+        self.env_timeout = env_timeout
+        # How long a session waits for a free slot before getting FAILURE_REPLY
+        self.busy_timeout = busy_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.sessions_active = 0
+        self.sessions_total = 0
+        self.sessions_rejected = 0
+        self.session_errors = 0
+        self.peak_sessions = 0
+        self.routes_decided = 0
+        self.routes_fallback = 0
+        self.route_time_max_ms = 0.0
+        self.started_at = None
+
+        self._worker_threads = worker_threads
+        self._executor = None
+        self._loop = None
+        self._server = None
+        self._slots = None
+        self._thread = None
+
+    def start(self, timeout=5):
+        """Bind the listener on a dedicated event loop thread; returns True once it is accepting"""
+        if self.running:
+            return True
+
+        ready = threading.Event()
+        outcome = {}
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            self._loop = loop
+            try:
+                loop.run_until_complete(self._bind())
+            except Exception as e:
+                outcome['error'] = e
+                ready.set()
+                loop.close()
+                return
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+
+        self._executor = ThreadPoolExecutor(max_workers=self._worker_threads, thread_name_prefix="AGI-Worker")
+        self._thread = threading.Thread(target=run, daemon=True, name="AGI-Server-Thread")
+        self._thread.start()
+
+        if not ready.wait(timeout) or 'error' in outcome:
+            self.logger.error(f"Failed to start FastAGI server on {self.host}:{self.port}: "
+                              f"{outcome.get('error', 'timed out')}")
+            self._executor.shutdown(wait=False)
+            return False
+
+        self.running = True
+        self.started_at = time.time()
+        self.logger.info(f"FastAGI server listening on {self.host}:{self.port} "
+                         f"(backlog {self.backlog}, max sessions {self.max_sessions})")
+        return True
+
+    def stop(self):
+        """Stop accepting, close the loop and release the worker pool"""
+        if not self.running:
+            return
+        self.running = False
+        loop = self._loop
+        if loop and loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+        self.logger.info("FastAGI server stopped")
+
+    def metrics(self):
+        """Session counters for health endpoints and benchmarks"""
+        return {
+            'running': self.running,
+            'host': self.host,
+            'port': self.port,
+            'backlog': self.backlog,
+            'max_sessions': self.max_sessions,
+            'sessions_active': self.sessions_active,
+            'peak_sessions': self.peak_sessions,
+            'sessions_total': self.sessions_total,
+            'sessions_rejected': self.sessions_rejected,
+            'session_errors': self.session_errors,
+            'route_deadline_ms': int(self.route_deadline * 1000),
+            'routes_decided': self.routes_decided,
+            'routes_fallback': self.routes_fallback,
+            'route_time_max_ms': round(self.route_time_max_ms, 2),
+            'uptime_seconds': int(time.time() - self.started_at) if self.started_at else 0
+        }
+
+    async def _bind(self):
+        self._slots = asyncio.Semaphore(self.max_sessions)
+        self._server = await asyncio.start_server(
+            self._on_connection, self.host, self.port,
+            backlog=self.backlog, reuse_address=True, reuse_port=self.reuse_port or None
+        )
+        # Port 0 binds an ephemeral port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _on_connection(self, reader, writer):
+        self.sessions_total += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.busy_timeout)
+        except asyncio.TimeoutError:
+            self.sessions_rejected += 1
+            self.logger.warning("FastAGI session limit reached, rejecting session")
+            await self._reply_and_close(writer, FAILURE_REPLY)
+            return
+
+        self.sessions_active += 1
+        self.peak_sessions = max(self.peak_sessions, self.sessions_active)
+        try:
+            reply = FAILURE_REPLY
+            try:
+                agi_vars = await asyncio.wait_for(read_agi_environment(reader), self.env_timeout)
+                handled = asyncio.get_running_loop().run_in_executor(self._executor, self.handler, agi_vars)
+                if self.route:
+                    # The dialog is the reply; registration keeps running beside it
+                    reply = None
+                    try:
+                        await self._route_session(FastAGISession(reader, writer, agi_vars, self.logger))
+                    finally:
+                        await handled
+                else:
+                    reply = await handled
+            except AGIHangup as e:
+                self.logger.info(f"FastAGI session ended by hangup: {e}")
+            except Exception as e:
+                self.session_errors += 1
+                self.logger.error(f"Error handling FastAGI session: {e}")
+            await self._reply_and_close(writer, reply)
+        finally:
+            self.sessions_active -= 1
+            self._slots.release()
+
+    async def _route_session(self, session):
+        """Decide within route_deadline, falling back to the default commands, then run them"""
+        started = time.perf_counter()
+        try:
+            commands = await asyncio.wait_for(self.route(session), self.route_deadline)
+            self.routes_decided += 1
+        except AGIHangup:
+            raise
+        except Exception as e:
+            reason = 'deadline exceeded' if isinstance(e, asyncio.TimeoutError) else e
+            self.logger.warning(f"Routing {session.unique_id} fell back to default: {reason}")
+            self.routes_fallback += 1
+            commands = self.fallback_commands
+        self.route_time_max_ms = max(self.route_time_max_ms, (time.perf_counter() - started) * 1000)
+        await session.run_commands(commands)
+
+    async def _reply_and_close(self, writer, reply):
+        try:
+            if reply:
+                writer.write(reply.encode())
+                await writer.drain()
+        except Exception as e:
+            self.logger.debug(f"FastAGI peer went away before reply: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Forwarding rule evaluation for AGI routing decisions
+
+Shared by the in-process AGIServer and the SO_REUSEPORT worker processes, so
+both route a call the same way. Rules come from the forwarding_rules table and
+are cached per process with a TTL; the cache is refreshed off the event loop.
+"""
+
+import asyncio
+import fnmatch
+import json
+import logging
+import time
+from datetime import datetime
+
+
+# Leave the call with the Flask app (the dialplan continues after AGI)
+FALLBACK_ROUTE = [('SET', 'VARIABLE', 'VOIP_ROUTE', 'mobile_app')]
+
+
+def load_forwarding_rules(connection_factory):
+    """Read enabled rules, highest priority first, with JSON columns decoded"""
+    connection = connection_factory()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT name, pattern, priority, forward_to, forward_to_users,
+                       schedule_enabled, schedule_start, schedule_end, schedule_days
+                FROM forwarding_rules
+                WHERE enabled = TRUE
+                ORDER BY priority DESC
+            """)
+            rules = cursor.fetchall()
+    finally:
+        connection.close()
+
+    for rule in rules:
+        rule['forward_to_users'] = [str(target) for target in json.loads(rule['forward_to_users'] or '[]')]
+        rule['schedule_days'] = [str(day).lower()[:3] for day in json.loads(rule['schedule_days'] or '[]')]
+    return rules
+
+
+def match_forwarding_rule(rules, caller_id, now):
+    """Return the first rule whose pattern and schedule match, or None"""
+    for rule in rules:
+        if not fnmatch.fnmatch(caller_id, rule['pattern'] or '*'):
+            continue
+        if rule['schedule_enabled'] and not in_schedule(rule, now):
+            continue
+        return rule
+    return None
+
+
+def in_schedule(rule, now):
+    if rule['schedule_days'] and now.strftime('%a').lower() not in rule['schedule_days'] \
+            and str(now.weekday()) not in rule['schedule_days']:
+        return False
+    # pymysql returns TIME columns as timedelta since midnight
+    seconds = now.hour * 3600 + now.minute * 60 + now.second
+    start, end = rule['schedule_start'], rule['schedule_end']
+    start = start.total_seconds() if start is not None else 0
+    end = end.total_seconds() if end is not None else 86400
+    if start <= end:
+        return start <= seconds < end
+    return seconds >= start or seconds < end
+
+
+def route_commands(rule, agi_vars, default_extension='1412'):
+    """AGI commands that apply a rule to the channel"""
+    if not rule:
+        return FALLBACK_ROUTE
+
+    commands = [
+        ('SET', 'VARIABLE', 'VOIP_ROUTE', rule['forward_to']),
+        ('SET', 'VARIABLE', 'VOIP_RULE', rule['name'])
+    ]
+    if rule['forward_to'] == 'external' and rule['forward_to_users']:
+        targets = [target if '/' in target else f"PJSIP/{target}" for target in rule['forward_to_users']]
+        commands.append(('EXEC', 'Dial', f"{'&'.join(targets)},30"))
+    elif rule['forward_to'] == 'voicemail':
+        extension = agi_vars.get('agi_extension', default_extension)
+        commands.append(('EXEC', 'VoiceMail', f"{extension}@default,u"))
+    return commands
+
+
+class ForwardingRouter:
+    """FastAGI route coroutine backed by a TTL cache of forwarding rules"""
+
+    def __init__(self, connection_factory, ttl=30, default_extension='1412', logger=None):
+        self.connection_factory = connection_factory
+        self.ttl = ttl
+        self.default_extension = default_extension
+        self.logger = logger or logging.getLogger(__name__)
+        self.rules = []
+        self.loaded_at = 0
+        self._refresh = None
+
+    def invalidate(self):
+        """Make the next routed call reload the rules"""
+        self.loaded_at = 0
+
+    async def route(self, session):
+        """Pick the forwarding rule for a call and return the AGI commands that apply it"""
+        rules = await self._get_rules()
+        rule = match_forwarding_rule(rules, session.env.get('agi_callerid', ''), datetime.now())
+        return route_commands(rule, session.env, self.default_extension)
+
+    async def _get_rules(self):
+        """Return cached rules, refreshing them off the event loop when stale"""
+        stale = time.time() - self.loaded_at > self.ttl
+        if stale and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.get_running_loop().run_in_executor(None, self._load)
+        if not self.loaded_at:
+            # Nothing cached yet: wait, bounded by the caller's route deadline
+            await asyncio.shield(self._refresh)
+        return self.rules
+
+    def _load(self):
+        try:
+            self.rules = load_forwarding_rules(self.connection_factory)
+            self.loaded_at = time.time()
+        except Exception as e:
+            self.logger.error(f"Error loading forwarding rules for AGI routing: {e}")
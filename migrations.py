@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations
+
+Each migration runs once and is recorded in the schema_version table, so a
+boot with an up-to-date schema costs one SELECT and no DDL (no metadata locks
+taken on live tables). Pending migrations run under a MySQL named lock, so two
+processes starting together do not both apply them.
+
+Column and index steps check information_schema first and the missing ones on
+a table are applied in a single ALTER TABLE. That keeps migrations safe to
+re-run on databases created by older releases (or by voip_tables.sql) that
+already have some of them, and after a migration that failed halfway (MySQL
+commits DDL implicitly).
+"""
+
+import logging
+import time
+
+
+SCHEMA_LOCK = 'voip_schema_migrations'
+
+
+def add_column(table, column, definition):
+    """Migration step: ALTER TABLE ... ADD COLUMN unless the column exists"""
+    return ('column', table, column, definition)
+
+
+def add_index(table, name, columns):
+    """Migration step: ALTER TABLE ... ADD INDEX unless an index with this name exists"""
+    return ('index', table, name, columns)
+
+
+def add_fulltext(table, name, columns):
+    """Migration step: ALTER TABLE ... ADD FULLTEXT INDEX unless an index with this name exists"""
+    return ('fulltext', table, name, columns)
+
+
+MIGRATIONS = [
+    (1, "Base tables", [
+        # users already exists in the resource_allocation database
+        """
+        CREATE TABLE IF NOT EXISTS calls (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            call_id VARCHAR(50) UNIQUE NOT NULL,
+            caller_id VARCHAR(20) NOT NULL,
+            caller_name VARCHAR(100),
+            status VARCHAR(20) DEFAULT 'ringing',
+            direction VARCHAR(20) DEFAULT 'inbound',
+            start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            end_time DATETIME,
+            duration INT,
+            user_id INT,
+            sip_channel VARCHAR(100),
+            recording_path VARCHAR(255),
+            notes TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS forwarding_rules (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            pattern VARCHAR(50) NOT NULL,
+            priority INT DEFAULT 100,
+            enabled BOOLEAN DEFAULT TRUE,
+            forward_to VARCHAR(20) DEFAULT 'mobile_app',
+            forward_to_users TEXT,
+            schedule_enabled BOOLEAN DEFAULT FALSE,
+            schedule_start TIME,
+            schedule_end TIME,
+            schedule_days TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS incidents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            incident_id VARCHAR(20) UNIQUE NOT NULL,
+            category_id INT NOT NULL,
+            title VARCHAR(200) NOT NULL,
+            description TEXT NOT NULL,
+            location_name VARCHAR(255) NOT NULL,
+            latitude DECIMAL(10,8) NOT NULL,
+            longitude DECIMAL(11,8) NOT NULL,
+            reported_by INT,
+            status ENUM('reported','assigned','in_progress','resolved','closed') DEFAULT 'reported',
+            priority ENUM('low','medium','high','critical') DEFAULT 'medium',
+            reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resolved_at TIMESTAMP NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (reported_by) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS incident_categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            priority_level ENUM('low','medium','high','critical') DEFAULT 'medium',
+            response_time_minutes INT DEFAULT 60,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            campaign_id VARCHAR(50) UNIQUE NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            context VARCHAR(50) NOT NULL,
+            extension VARCHAR(20) NOT NULL,
+            channel_template VARCHAR(100) NOT NULL,
+            caller_id VARCHAR(100),
+            max_concurrent INT DEFAULT 10,
+            calls_per_second DECIMAL(6,2) DEFAULT 2,
+            total_numbers INT DEFAULT 0,
+            status VARCHAR(20) DEFAULT 'running',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS campaign_attempts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            campaign_id VARCHAR(50) NOT NULL,
+            seq INT NOT NULL,
+            phone_number VARCHAR(20) NOT NULL,
+            status VARCHAR(20) DEFAULT 'pending',
+            reason VARCHAR(100),
+            unique_id VARCHAR(50),
+            attempted_at DATETIME NULL,
+            answered_at DATETIME NULL,
+            ended_at DATETIME NULL,
+            UNIQUE KEY uk_campaign_seq (campaign_id, seq),
+            INDEX idx_campaign_status (campaign_id, status)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS call_statistics (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            date DATE NOT NULL,
+            total_calls INT DEFAULT 0,
+            answered_calls INT DEFAULT 0,
+            missed_calls INT DEFAULT 0,
+            rejected_calls INT DEFAULT 0,
+            total_duration INT DEFAULT 0,
+            avg_duration DECIMAL(10, 2) DEFAULT 0,
+            recordings_count INT DEFAULT 0,
+            incidents_count INT DEFAULT 0,
+            peak_hour INT NULL,
+            peak_calls INT DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uk_date (date)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS call_statistics_hourly (
+            date DATE NOT NULL,
+            hour TINYINT NOT NULL,
+            total_calls INT DEFAULT 0,
+            answered_calls INT DEFAULT 0,
+            missed_calls INT DEFAULT 0,
+            rejected_calls INT DEFAULT 0,
+            total_duration INT DEFAULT 0,
+            PRIMARY KEY (date, hour)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS call_timeseries (
+            bucket_start DATETIME NOT NULL,
+            total_calls INT DEFAULT 0,
+            answered_calls INT DEFAULT 0,
+            missed_calls INT DEFAULT 0,
+            rejected_calls INT DEFAULT 0,
+            total_duration INT DEFAULT 0,
+            PRIMARY KEY (bucket_start)
+        )
+        """
+    ]),
+    (2, "Columns the call handlers write", [
+        add_column('calls', 'recording_path', "VARCHAR(255) NULL"),
+        add_column('calls', 'extension', "VARCHAR(20) NULL"),
+        add_column('calls', 'answered_time', "DATETIME NULL"),
+        add_column('calls', 'source', "VARCHAR(20) NULL"),
+        add_column('calls', 'rolled_up', "TINYINT NOT NULL DEFAULT 0"),
+        add_column('incidents', 'call_id', "VARCHAR(50) NULL")
+    ]),
+    (3, "Indexes for call lists, change feeds, rollups and incidents", [
+        add_index('calls', 'idx_caller_id', "caller_id"),
+        add_index('calls', 'idx_status', "status"),
+        add_index('calls', 'idx_start_time', "start_time"),
+        add_index('calls', 'idx_start_time_call_id', "start_time, call_id"),
+        add_index('calls', 'idx_extension_start_time', "extension, start_time, call_id"),
+        add_index('calls', 'idx_updated_at', "updated_at"),
+        add_index('calls', 'idx_rolled_up', "rolled_up, id"),
+        add_index('incidents', 'idx_call_id', "call_id"),
+        add_index('incidents', 'idx_created_at', "created_at")
+    ]),
+    # Same columns and indexes as calls (no foreign keys); later calls columns must be added to both
+    (4, "Call archive table", [
+        "CREATE TABLE IF NOT EXISTS calls_archive LIKE calls"
+    ]),
+    (5, "Full-text search indexes", [
+        add_fulltext('calls', 'ft_calls_text', "caller_name, notes"),
+        add_fulltext('calls_archive', 'ft_calls_text', "caller_name, notes"),
+        add_fulltext('incidents', 'ft_incidents_text', "title, description"),
+        # Phone number prefix searches, newest first
+        add_index('calls', 'idx_caller_id_start_time', "caller_id, start_time"),
+        add_index('calls_archive', 'idx_caller_id_start_time', "caller_id, start_time")
+    ]),
+    # /api/calls/changes pages by (updated_at, call_id)
+    (6, "Change feed cursor index", [
+        add_index('calls', 'idx_updated_at_call_id', "updated_at, call_id")
+    ])
+]
+
+
+def schema_version(cursor):
+    """Highest applied migration, 0 when schema_version does not exist yet"""
+    try:
+        cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+    except Exception as e:
+        # ER_NO_SUCH_TABLE: nothing applied yet
+        if e.args and e.args[0] == 1146:
+            return 0
+        raise
+    row = cursor.fetchone()
+    return (row['version'] or 0) if row else 0
+
+
+def pending_statements(cursor, steps):
+    """SQL for the steps of one migration that are not applied yet"""
+    statements = []
+    alters = {}     # table -> ADD clauses, applied as one ALTER TABLE
+    for step in steps:
+        if isinstance(step, str):
+            statements.append(step)
+            continue
+        kind, table, name, definition = step
+        if kind == 'column':
+            cursor.execute("""
+                SELECT 1 FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            """, (table, name))
+            clause = f"ADD COLUMN {name} {definition}"
+        else:
+            cursor.execute("""
+                SELECT 1 FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+                LIMIT 1
+            """, (table, name))
+            clause = f"ADD {'FULLTEXT ' if kind == 'fulltext' else ''}INDEX {name} ({definition})"
+        if cursor.fetchone():
+            continue
+        if kind == 'fulltext':
+            # InnoDB builds one FULLTEXT index per ALTER TABLE
+            statements.append(f"ALTER TABLE {table} {clause}")
+        else:
+            alters.setdefault(table, []).append(clause)
+    for table, clauses in alters.items():
+        statements.append(f"ALTER TABLE {table} " + ", ".join(clauses))
+    return statements
+
+
+def run_migrations(connection_factory, migrations=MIGRATIONS, lock_timeout=60, logger=None):
+    """Apply pending migrations in order and return the schema version"""
+    logger = logger or logging.getLogger(__name__)
+    latest = migrations[-1][0]
+    connection = None
+    try:
+        connection = connection_factory()
+        with connection.cursor() as cursor:
+            current = schema_version(cursor)
+            if current >= latest:
+                return current
+
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (SCHEMA_LOCK, lock_timeout))
+            if not cursor.fetchone()['acquired']:
+                raise RuntimeError(f"Timed out after {lock_timeout}s waiting for another process to migrate")
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        duration_ms INT NOT NULL
+                    )
+                """)
+                # Another process may have migrated while we waited for the lock
+                current = schema_version(cursor)
+                for version, description, steps in migrations:
+                    if version <= current:
+                        continue
+                    started = time.time()
+                    for statement in pending_statements(cursor, steps):
+                        cursor.execute(statement)
+                    duration_ms = int((time.time() - started) * 1000)
+                    cursor.execute("""
+                        INSERT INTO schema_version (version, description, duration_ms)
+                        VALUES (%s, %s, %s)
+                    """, (version, description, duration_ms))
+                    connection.commit()
+                    current = version
+                    logger.info(f"Applied schema migration {version} ({description}) in {duration_ms}ms")
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK,))
+                cursor.fetchall()
+        return current
+    finally:
+        if connection:
+            connection.close()
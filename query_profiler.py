@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Per-statement query profiling
+
+Cursors handed out by the connection pool can be wrapped in ProfiledCursor,
+which times every execute()/executemany() and records it under the
+normalized SQL (literals and placeholder lists collapsed) and the call site
+that issued it. Each entry keeps counts, total/max time, rows and a latency
+histogram, so the heaviest of the many inline cursor.execute() calls can be
+read off top(). Statements slower than the threshold are logged; their
+EXPLAIN plan is fetched on a separate connection by a background thread so
+the slow request is not delayed further.
+"""
+
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+# Frames from these files are skipped when finding the call site
+_SKIP_FILES = ('query_profiler.py', 'db_pool.py')
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Collapse literals, placeholders and IN/VALUES lists so similar statements share one key"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?...)', sql)
+    sql = _VALUES_ROWS.sub('(?...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """file:line function of the first caller outside the profiler and the pool"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.endswith(_SKIP_FILES):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class ProfiledCursor:
+    """DB-API cursor wrapper that reports every statement to a QueryProfiler"""
+
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(query, args)
+        except Exception:
+            self._profiler.record(query, args, time.perf_counter() - started, 0, failed=True)
+            raise
+        self._profiler.record(query, args, time.perf_counter() - started, self._cursor.rowcount)
+        return result
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(query, args)
+        except Exception:
+            self._profiler.record(query, None, time.perf_counter() - started, 0, failed=True)
+            raise
+        self._profiler.record(query, None, time.perf_counter() - started, self._cursor.rowcount)
+        return result
+
+
+class QueryProfiler:
+    """In-memory per-statement timing histogram with slow query logging"""
+
+    def __init__(self, slow_threshold_ms=200, explain_factory=None, explain_interval=300,
+                 max_statements=1000, logger=None):
+        self.slow_threshold_ms = slow_threshold_ms
+        # Zero-argument callable opening an unpooled connection for EXPLAIN; None disables plans
+        self.explain_factory = explain_factory
+        # Seconds before the same statement is explained again
+        self.explain_interval = explain_interval
+        self.max_statements = max_statements
+        self.logger = logger or logging.getLogger(__name__)
+        self.running = False
+
+        self.started_at = time.time()
+        self.statements_total = 0
+        self.slow_total = 0
+        self.dropped_total = 0
+
+        self._entries = {}          # (normalized sql, call site) -> stats dict
+        self._explained_at = {}     # normalized sql -> last EXPLAIN time
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the EXPLAIN thread"""
+        if self.running or not self.explain_factory:
+            return True
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Query-Profiler-Thread")
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        try:
+            self._explain_queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def wrap_cursor(self, cursor):
+        """Cursor wrapper hook for ConnectionPool(cursor_wrapper=...)"""
+        return ProfiledCursor(cursor, self)
+
+    def record(self, query, args, duration, rows, failed=False):
+        """Account one executed statement"""
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        sql = normalize_sql(query)
+        site = call_site()
+        duration_ms = duration * 1000
+        bucket = len(HISTOGRAM_BOUNDS_MS)
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if duration_ms <= bound:
+                bucket = index
+                break
+
+        with self._lock:
+            self.statements_total += 1
+            entry = self._entries.get((sql, site))
+            if entry is None:
+                if len(self._entries) >= self.max_statements:
+                    self.dropped_total += 1
+                    return
+                entry = self._entries[(sql, site)] = {
+                    'sql': sql,
+                    'call_site': site,
+                    'count': 0,
+                    'errors': 0,
+                    'slow': 0,
+                    'rows_total': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'histogram': [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                    'explain': None,
+                    'last_seen': None
+                }
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['rows_total'] += max(rows or 0, 0)
+            entry['histogram'][bucket] += 1
+            entry['last_seen'] = time.time()
+            if failed:
+                entry['errors'] += 1
+            slow = duration_ms >= self.slow_threshold_ms
+            if slow:
+                entry['slow'] += 1
+                self.slow_total += 1
+                explain = self._should_explain(sql, query)
+        if not slow:
+            return
+
+        self.logger.warning(f"Slow query {duration_ms:.1f}ms ({rows} rows) at {site}: {sql}")
+        if explain:
+            try:
+                self._explain_queue.put_nowait((sql, site, query, args))
+            except queue.Full:
+                pass
+
+    def top(self, limit=20, order_by='total_ms'):
+        """The limit most expensive statements by total_ms, max_ms, count or avg_ms"""
+        with self._lock:
+            entries = [self._summary(entry) for entry in self._entries.values()]
+        entries.sort(key=lambda entry: entry.get(order_by, 0), reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        """Forget all recorded statements"""
+        with self._lock:
+            self._entries.clear()
+            self._explained_at.clear()
+            self.statements_total = self.slow_total = self.dropped_total = 0
+            self.started_at = time.time()
+
+    def metrics(self):
+        with self._lock:
+            distinct = len(self._entries)
+        return {
+            'since': self.started_at,
+            'statements_total': self.statements_total,
+            'distinct_statements': distinct,
+            'slow_total': self.slow_total,
+            'dropped_total': self.dropped_total,
+            'slow_threshold_ms': self.slow_threshold_ms
+        }
+
+    def _summary(self, entry):
+        count = entry['count']
+        histogram = {}
+        for index, hits in enumerate(entry['histogram']):
+            if hits:
+                label = (f"<={HISTOGRAM_BOUNDS_MS[index]}ms" if index < len(HISTOGRAM_BOUNDS_MS)
+                         else f">{HISTOGRAM_BOUNDS_MS[-1]}ms")
+                histogram[label] = hits
+        return {
+            'sql': entry['sql'],
+            'call_site': entry['call_site'],
+            'count': count,
+            'errors': entry['errors'],
+            'slow': entry['slow'],
+            'rows_total': entry['rows_total'],
+            'rows_avg': round(entry['rows_total'] / count, 2) if count else 0,
+            'total_ms': round(entry['total_ms'], 2),
+            'avg_ms': round(entry['total_ms'] / count, 2) if count else 0,
+            'max_ms': round(entry['max_ms'], 2),
+            'p95_ms': self._percentile(entry['histogram'], 0.95),
+            'histogram': histogram,
+            'explain': entry['explain'],
+            'last_seen': entry['last_seen']
+        }
+
+    def _percentile(self, histogram, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (None when open-ended)"""
+        target = sum(histogram) * fraction
+        seen = 0
+        for index, hits in enumerate(histogram):
+            seen += hits
+            if hits and seen >= target:
+                return HISTOGRAM_BOUNDS_MS[index] if index < len(HISTOGRAM_BOUNDS_MS) else None
+        return None
+
+    def _should_explain(self, sql, query):
+        """Called under the lock: explain each slow statement at most once per interval"""
+        if not self.running or not query.lstrip().upper().startswith(EXPLAINABLE):
+            return False
+        now = time.time()
+        if now - self._explained_at.get(sql, 0) < self.explain_interval:
+            return False
+        self._explained_at[sql] = now
+        return True
+
+    def _run(self):
+        connection = None
+        while self.running:
+            item = self._explain_queue.get()
+            if item is None:
+                break
+            sql, site, query, args = item
+            try:
+                if connection is None:
+                    connection = self.explain_factory()
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN " + query, args)
+                    plan = [dict(row) if isinstance(row, dict) else list(row) for row in cursor.fetchall()]
+                connection.rollback()
+            except Exception as e:
+                self.logger.warning(f"Could not EXPLAIN slow query at {site}: {e}")
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    connection = None
+                continue
+
+            with self._lock:
+                entry = self._entries.get((sql, site))
+                if entry is not None:
+                    entry['explain'] = plan
+            for row in plan:
+                self.logger.warning(f"  EXPLAIN {site}: {row}")
+        if connection is not None:
+            connection.close()
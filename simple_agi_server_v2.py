@@ -1,25 +1,151 @@
 #!/usr/bin/env python3
 """
-Simple AGI server v2 - reading data in chunks with Flask integration
+Simple AGI server v2 - concurrent FastAGI sessions with batched Flask notifications
 """
 
+import queue
 import socket
 import threading
 import time
 import requests
 import json
 import logging
+from requests.adapters import HTTPAdapter
+
+from fastagi import FastAGIServer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class FlaskCallNotifier:
+    """Push call notifications to the Flask app over pooled keep-alive connections
+
+    Calls that arrive within batch_window seconds of each other are sent as one
+    JSON POST to /asterisk/extension1412/batch, so a burst costs a handful of
+    requests on warm connections instead of a TCP handshake per call.
+    """
+    
+    def __init__(self, flask_url, batch_window=0.05, max_batch=50, timeout=5, pool_size=4):
+        self.flask_url = flask_url
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        self.running = False
+        self.batch_supported = True
+        self.sent = 0
+        self.failed = 0
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = pool_size
+        self.senders = []
+    
+    def start(self):
+        """Start the sender threads"""
+        self.running = True
+        for index in range(self.pool_size):
+            sender = threading.Thread(target=self._run, daemon=True, name=f"Flask-Notifier-{index}")
+            sender.start()
+            self.senders.append(sender)
+    
+    def stop(self):
+        """Stop the sender threads after the queued notifications are sent"""
+        self.running = False
+        for _ in self.senders:
+            self.pending.put(None)
+        for sender in self.senders:
+            sender.join(timeout=self.timeout)
+        self.session.close()
+    
+    def notify(self, call_data):
+        """Queue a call notification; returns immediately"""
+        self.pending.put(call_data)
+    
+    def _run(self):
+        while True:
+            first = self.pending.get()
+            if first is None:
+                break
+            
+            # Collect whatever else arrives within the batch window
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.pending.put(None)
+                    break
+                batch.append(item)
+            
+            self._send(batch)
+    
+    def _send(self, batch):
+        try:
+            if self.batch_supported:
+                response = self.session.post(
+                    f"{self.flask_url}/asterisk/extension1412/batch",
+                    json={'calls': batch},
+                    timeout=self.timeout
+                )
+                if response.status_code == 404:
+                    logger.warning("Flask app has no batch endpoint, sending calls one by one")
+                    self.batch_supported = False
+                elif response.status_code == 200:
+                    self.sent += len(batch)
+                    logger.info(f"Notified Flask app about {len(batch)} call(s)")
+                    return
+                else:
+                    logger.warning(f"Flask app returned status {response.status_code}: {response.text}")
+                    self.failed += len(batch)
+                    return
+            
+            for call_data in batch:
+                response = self.session.post(
+                    f"{self.flask_url}/asterisk/extension1412",
+                    data=call_data,
+                    timeout=self.timeout
+                )
+                if response.status_code == 200:
+                    self.sent += 1
+                    logger.info(f"Successfully notified Flask app about call {call_data['uniqueid']}")
+                else:
+                    self.failed += 1
+                    logger.warning(f"Flask app returned status {response.status_code}: {response.text}")
+                    
+        except requests.exceptions.RequestException as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to notify Flask app: {e}")
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Unexpected error notifying Flask app: {e}")
+
+
 class SimpleAGIServerV2:
-    def __init__(self, host='0.0.0.0', port=5001, flask_url='http://127.0.0.1:5000'):
+    def __init__(self, host='0.0.0.0', port=5001, flask_url='http://127.0.0.1:5000',
+                 backlog=512, max_sessions=500):
         self.host = host
         self.port = port
         self.flask_url = flask_url
-        self.server_socket = None
+        self.notifier = FlaskCallNotifier(flask_url)
+        # Sessions are served concurrently by one asyncio loop
+        self.server = FastAGIServer(
+            self._process_agi_request,
+            host=host,
+            port=port,
+            backlog=backlog,
+            max_sessions=max_sessions,
+            logger=logger
+        )
         self.running = False
         
     def start(self):
@@ -28,87 +154,24 @@ class SimpleAGIServerV2:
             logger.info(f"Starting AGI server on {self.host}:{self.port}")
             logger.info(f"Flask integration URL: {self.flask_url}")
             
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.notifier.start()
+            self.running = self.server.start()
+            if not self.running:
+                self.notifier.stop()
+                return False
             
-            self.running = True
             logger.info(f"AGI server started successfully")
             
-            # Start server in main thread for simplicity
-            self._accept_connections()
-            
         except Exception as e:
             logger.error(f"Failed to start AGI server: {e}")
             return False
         
         return True
     
-    def _accept_connections(self):
-        """Accept incoming AGI connections"""
-        logger.info("Waiting for AGI connections...")
-        
-        while self.running:
-            try:
-                logger.debug("Calling accept()...")
-                client_socket, address = self.server_socket.accept()
-                logger.info(f"AGI connection accepted from {address}")
-                
-                # Handle connection in main thread for simplicity
-                self._handle_agi_connection(client_socket, address)
-                
-            except Exception as e:
-                if self.running:
-                    logger.error(f"Error accepting AGI connection: {e}")
-                else:
-                    break
-    
-    def _handle_agi_connection(self, client_socket, address):
-        """Handle individual AGI connection"""
+    def _process_agi_request(self, agi_vars):
+        """Handle one AGI session's environment and return the reply for Asterisk"""
         try:
-            logger.info(f"Handling AGI connection from {address}")
-            
-            # Read AGI environment variables
-            agi_vars = {}
-            logger.debug("Reading AGI environment variables...")
-            
-            # Read all data first
-            data = b""
-            while True:
-                chunk = client_socket.recv(1024)
-                if not chunk:
-                    break
-                data += chunk
-                logger.debug(f"Received chunk: {chunk}")
-                
-                # Check if we have the end marker (double newline)
-                if b'\n\n' in data:
-                    break
-            
-            logger.debug(f"Total data received: {data}")
-            
-            # Decode and split into lines
-            lines = data.decode('utf-8').split('\n')
-            logger.debug(f"Split into {len(lines)} lines")
-            
-            for line in lines:
-                line = line.strip()
-                logger.debug(f"Processing line: '{line}'")
-                
-                if not line:  # Empty line marks end of environment variables
-                    logger.debug("Empty line found, end of environment variables")
-                    break
-                
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    agi_vars[key.strip()] = value.strip()
-                    logger.debug(f"Parsed AGI variable: {key.strip()} = {value.strip()}")
-            
-            logger.info(f"AGI variables: {agi_vars}")
-            
-            # Process the AGI request
-            logger.info("Processing AGI request...")
+            logger.debug(f"AGI variables: {agi_vars}")
             
             # Extract call information
             caller_id = agi_vars.get('agi_callerid', 'Unknown')
@@ -118,62 +181,36 @@ class SimpleAGIServerV2:
             
             logger.info(f"AGI call received - Caller: {caller_id}, Extension: {extension}, Channel: {channel}")
             
-            # Notify Flask app about the incoming call
+            # Notify Flask app about the incoming call without waiting on HTTP
             self._notify_flask_app(caller_id, extension, unique_id, channel)
             
             # Return success response to Asterisk
-            response = "200 result=0\n"
-            logger.debug(f"Sending response: {response}")
-            client_socket.send(response.encode())
-            
-            logger.info("AGI request processed successfully")
+            return "200 result=0\n"
             
         except Exception as e:
-            logger.error(f"Error handling AGI connection: {e}")
+            logger.error(f"Error handling AGI request: {e}")
             import traceback
             traceback.print_exc()
-        finally:
-            logger.debug("Closing AGI connection")
-            client_socket.close()
+            return "200 result=-1\n"
     
     def _notify_flask_app(self, caller_id, extension, unique_id, channel):
-        """Notify Flask app about incoming call via HTTP"""
-        try:
-            # Prepare call data
-            call_data = {
-                'callerid': caller_id,
-                'extension': extension,
-                'uniqueid': unique_id,
-                'channel': channel,
-                'timestamp': time.time()
-            }
-            
-            logger.info(f"Notifying Flask app about call: {call_data}")
-            
-            # Send HTTP request to Flask app
-            response = requests.post(
-                f"{self.flask_url}/asterisk/extension1412",
-                data=call_data,
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully notified Flask app about call {unique_id}")
-                logger.debug(f"Flask response: {response.text}")
-            else:
-                logger.warning(f"Flask app returned status {response.status_code}: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to notify Flask app: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error notifying Flask app: {e}")
+        """Queue a notification to the Flask app about an incoming call"""
+        call_data = {
+            'callerid': caller_id,
+            'extension': extension,
+            'uniqueid': unique_id,
+            'channel': channel,
+            'timestamp': time.time()
+        }
+        logger.debug(f"Queueing Flask notification for call: {call_data}")
+        self.notifier.notify(call_data)
     
     def stop(self):
         """Stop the AGI server"""
         logger.info("Stopping AGI server...")
         self.running = False
-        if self.server_socket:
-            self.server_socket.close()
+        self.server.stop()
+        self.notifier.stop()
         logger.info("AGI server stopped")
 
 def test_simple_agi_v2():
@@ -236,7 +273,9 @@ if __name__ == "__main__":
     print()
     
     try:
-        server.start()
+        if server.start():
+            while server.running:
+                time.sleep(1)
     except KeyboardInterrupt:
         print("\n🛑 Stopping AGI server...")
         server.stop()
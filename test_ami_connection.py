@@ -4,6 +4,7 @@ Test script to verify AMI connection between Flask PC and Asterisk PC
 Run this on your Flask PC to test connectivity
 """
 
+import os
 import socket
 import sys
 import time
@@ -93,6 +94,12 @@ def main():
         AMI_USERNAME = 'admin'
         AMI_SECRET = 'your_secret'
     
+    # Environment overrides, e.g. to target a local fake_ami_server.py
+    AMI_HOST = os.getenv('ASTERISK_AMI_HOST', AMI_HOST)
+    AMI_PORT = int(os.getenv('ASTERISK_AMI_PORT', AMI_PORT))
+    AMI_USERNAME = os.getenv('ASTERISK_AMI_USERNAME', AMI_USERNAME)
+    AMI_SECRET = os.getenv('ASTERISK_AMI_SECRET', AMI_SECRET)
+    
     print(f"📍 Target: {AMI_HOST}:{AMI_PORT}")
     print(f"👤 Username: {AMI_USERNAME}")
     print(f"🔑 Secret: {'*' * len(AMI_SECRET)}")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for the calls -> calls_archive mover, against an in-memory stand-in for MySQL
+"""
+
+from datetime import datetime, timedelta
+
+from call_archive import ARCHIVE_TABLE, CallArchiver
+
+COLUMNS = ['id', 'call_id', 'caller_id', 'status', 'start_time', 'recording_path', 'notes', 'rolled_up']
+
+
+class FakeCursor:
+    """Understands just the statements CallArchiver issues"""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=()):
+        calls, archive = self.db['calls'], self.db[ARCHIVE_TABLE]
+        if 'information_schema' in sql:
+            self.result = [{'name': column, 'table_name': table}
+                           for table in ('calls', ARCHIVE_TABLE) for column in COLUMNS]
+        elif 'FOR UPDATE' in sql:
+            cutoff, statuses, limit = params[0], params[1:-1], params[-1]
+            rows = sorted((row for row in calls.values()
+                           if row['start_time'] < cutoff and row['status'] in statuses and row['rolled_up'] > 0),
+                          key=lambda row: row['start_time'])[:limit]
+            self.result = [{'id': row['id'], 'start_time': row['start_time'],
+                            'recorded': row['recording_path'] is not None} for row in rows]
+        elif sql.strip().startswith('SELECT c.id'):
+            archived = dict((row['call_id'], row) for row in archive.values())
+            self.result = [{'id': calls[id_]['id'],
+                            'archived_recorded': archived[calls[id_]['call_id']]['recording_path'] is not None}
+                           for id_ in params if calls[id_]['call_id'] in archived]
+        elif sql.strip().startswith(f'INSERT INTO {ARCHIVE_TABLE}'):
+            assert 'ON DUPLICATE KEY UPDATE' in sql
+            for id_ in params:
+                row = dict(calls[id_])
+                existing = next((old for old in archive.values() if old['call_id'] == row['call_id']), None)
+                if existing is None:
+                    archive[row['id']] = row
+                else:
+                    existing.update((key, value) for key, value in row.items() if key not in ('id', 'call_id'))
+        elif sql.strip().startswith('DELETE FROM calls'):
+            for id_ in params:
+                calls.pop(id_, None)
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def call_row(id_, call_id, start_time, notes, recording_path=None):
+    return {'id': id_, 'call_id': call_id, 'caller_id': '5551234', 'status': 'ended',
+            'start_time': start_time, 'recording_path': recording_path, 'notes': notes, 'rolled_up': 1}
+
+
+def test_reinserted_call_survives_archive_pass():
+    """A call_id already in the archive is merged with the newer hot row, not dropped"""
+    old = datetime.now() - timedelta(days=200)
+    db = {
+        'calls': {
+            10: call_row(10, 'call-a', old + timedelta(days=1), 'newer notes', 'recordings/call-a.wav'),
+            11: call_row(11, 'call-b', old + timedelta(days=2), 'only copy')
+        },
+        ARCHIVE_TABLE: {
+            3: call_row(3, 'call-a', old, 'stale notes')
+        }
+    }
+    archiver = CallArchiver(lambda: FakeConnection(db), retain_days=90)
+    archiver.running = True
+    archiver.archived_calls, archiver.archived_recordings = 1, 0
+
+    assert archiver.archive() == 2
+    assert db['calls'] == {}
+
+    by_call_id = dict((row['call_id'], row) for row in db[ARCHIVE_TABLE].values())
+    assert set(by_call_id) == {'call-a', 'call-b'}
+    assert by_call_id['call-a']['id'] == 3
+    assert by_call_id['call-a']['notes'] == 'newer notes'
+    assert by_call_id['call-a']['recording_path'] == 'recordings/call-a.wav'
+    assert by_call_id['call-b']['notes'] == 'only copy'
+
+    assert archiver.totals() == (2, 1)
+    assert archiver.metrics()['duplicates_merged'] == 1
+    print("✅ Re-inserted call_id survives an archive pass")
+
+
+if __name__ == "__main__":
+    test_reinserted_call_survives_archive_pass()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test script for the write-behind queue's deferred statements, against a fake MySQL connection
+"""
+
+from write_behind import WriteBehindQueue
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def executemany(self, sql, rows):
+        self.log.append(('insert', [row[0] for row in rows]))
+
+    def execute(self, sql, params=None):
+        self.log.append(('execute', sql, params))
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DeferAfterDrainQueue(WriteBehindQueue):
+    """Calls defer() right after the deferred statements are drained, before the batch is finished"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.late_deferred = None
+
+    def _run_deferred(self, connection, written):
+        super()._run_deferred(connection, written)
+        self.late_deferred = self.defer('call-1', "UPDATE calls SET status = 'ended'", ('call-1',))
+
+
+def test_defer_after_drain_is_not_lost():
+    """A statement deferred once the key's queue is drained is either run by the writer or handed back"""
+    log = []
+    queue = DeferAfterDrainQueue(lambda: FakeConnection(log), "INSERT INTO calls VALUES (%s)")
+    queue.submit('call-1', ('call-1',))
+    assert queue.defer('call-1', "UPDATE calls SET status = 'answered'", ('call-1',))
+
+    assert queue._flush_batch()
+
+    assert log[0] == ('insert', ['call-1'])
+    assert log[1] == ('execute', "UPDATE calls SET status = 'answered'", ('call-1',))
+    # The key is already out of flight, so the caller is told to run the late statement itself
+    assert queue.late_deferred is False
+    assert not queue.is_pending('call-1')
+    assert queue._deferred == {}
+    print("✅ Statement deferred after the drain is handed back to the caller")
+
+
+def test_defer_without_queued_row_runs_directly():
+    """defer() refuses keys that are not queued, so callers execute the statement themselves"""
+    queue = WriteBehindQueue(lambda: FakeConnection([]), "INSERT INTO calls VALUES (%s)")
+    assert queue.defer('call-2', "UPDATE calls SET status = 'ended'", ('call-2',)) is False
+    assert queue._deferred == {}
+    print("✅ defer() without a queued row runs directly")
+
+
+if __name__ == "__main__":
+    test_defer_after_drain_is_not_lost()
+    test_defer_without_queued_row_runs_directly()
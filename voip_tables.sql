@@ -19,6 +19,10 @@ CREATE TABLE IF NOT EXISTS calls (
     duration INT NULL COMMENT 'Call duration in seconds',
     user_id INT NULL COMMENT 'ID of the user who handled the call',
     sip_channel VARCHAR(100) NULL COMMENT 'SIP channel information',
+    extension VARCHAR(20) NULL COMMENT 'Dialed extension',
+    answered_time DATETIME NULL COMMENT 'When the call was answered',
+    source VARCHAR(20) NULL COMMENT 'Where the call came from: ami, phone_simulator, ...',
+    rolled_up TINYINT NOT NULL DEFAULT 0 COMMENT 'Folded into call_statistics: 0 no, 1 yes, 2 yes with recording',
     recording_path VARCHAR(255) NULL COMMENT 'Path to the recorded audio file',
     notes TEXT NULL COMMENT 'Additional notes about the call',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT 'Record creation timestamp',
@@ -26,11 +30,20 @@ CREATE TABLE IF NOT EXISTS calls (
     
     INDEX idx_call_id (call_id),
     INDEX idx_caller_id (caller_id),
+    INDEX idx_caller_id_start_time (caller_id, start_time),
     INDEX idx_status (status),
     INDEX idx_start_time (start_time),
-    INDEX idx_recording_path (recording_path)
+    INDEX idx_start_time_call_id (start_time, call_id),
+    INDEX idx_extension_start_time (extension, start_time, call_id),
+    INDEX idx_updated_at (updated_at),
+    INDEX idx_rolled_up (rolled_up, id),
+    INDEX idx_recording_path (recording_path),
+    FULLTEXT INDEX ft_calls_text (caller_name, notes)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Stores all call information and recordings';
 
+-- Calls archive - ended calls older than CALL_ARCHIVE_DAYS, moved out of calls by call_archive.py
+CREATE TABLE IF NOT EXISTS calls_archive LIKE calls;
+
 -- Forwarding rules table - manages call forwarding logic
 CREATE TABLE IF NOT EXISTS forwarding_rules (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -78,7 +91,8 @@ CREATE TABLE IF NOT EXISTS incidents (
     INDEX idx_status (status),
     INDEX idx_assigned_to (assigned_to),
     INDEX idx_created_at (created_at),
-    INDEX idx_location (latitude, longitude)
+    INDEX idx_location (latitude, longitude),
+    FULLTEXT INDEX ft_incidents_text (title, description)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Stores incident reports generated from calls';
 
 -- Incident categories table - predefined categories for incidents
@@ -145,6 +159,31 @@ CREATE TABLE IF NOT EXISTS call_statistics (
     INDEX idx_peak_hour (peak_hour)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Daily aggregated call statistics';
 
+-- Hourly call statistics - per-hour buckets behind call_statistics.peak_hour
+CREATE TABLE IF NOT EXISTS call_statistics_hourly (
+    date DATE NOT NULL COMMENT 'Date of the bucket',
+    hour TINYINT NOT NULL COMMENT 'Hour of the day (0-23)',
+    total_calls INT DEFAULT 0 COMMENT 'Calls started in this hour',
+    answered_calls INT DEFAULT 0 COMMENT 'Calls that were answered',
+    missed_calls INT DEFAULT 0 COMMENT 'Calls that were missed',
+    rejected_calls INT DEFAULT 0 COMMENT 'Calls that were rejected',
+    total_duration INT DEFAULT 0 COMMENT 'Total answered call duration in seconds',
+    
+    PRIMARY KEY (date, hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Hourly aggregated call statistics';
+
+-- Call time series - 15-minute buckets for capacity planning range queries
+CREATE TABLE IF NOT EXISTS call_timeseries (
+    bucket_start DATETIME NOT NULL COMMENT 'Start of the 15-minute bucket',
+    total_calls INT DEFAULT 0 COMMENT 'Calls started in this bucket',
+    answered_calls INT DEFAULT 0 COMMENT 'Calls that were answered',
+    missed_calls INT DEFAULT 0 COMMENT 'Calls that were missed',
+    rejected_calls INT DEFAULT 0 COMMENT 'Calls that were rejected',
+    total_duration INT DEFAULT 0 COMMENT 'Total answered call duration in seconds',
+    
+    PRIMARY KEY (bucket_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Call volume per 15 minutes';
+
 -- System logs table - stores system events and activities
 CREATE TABLE IF NOT EXISTS system_logs (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -190,6 +229,43 @@ CREATE TABLE IF NOT EXISTS sip_channels (
     INDEX idx_created_at (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='SIP channel information and status';
 
+-- Campaigns table - outbound dialing campaigns originated through AMI
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    campaign_id VARCHAR(50) UNIQUE NOT NULL COMMENT 'Unique campaign identifier',
+    name VARCHAR(100) NOT NULL COMMENT 'Campaign name',
+    context VARCHAR(50) NOT NULL COMMENT 'Dialplan context answered calls are connected to',
+    extension VARCHAR(20) NOT NULL COMMENT 'Dialplan extension answered calls are connected to',
+    channel_template VARCHAR(100) NOT NULL COMMENT 'Channel to dial, {number} is substituted',
+    caller_id VARCHAR(100) NULL COMMENT 'Caller ID presented to the called party',
+    max_concurrent INT DEFAULT 10 COMMENT 'Maximum simultaneous channels',
+    calls_per_second DECIMAL(6, 2) DEFAULT 2 COMMENT 'Originate pacing',
+    total_numbers INT DEFAULT 0 COMMENT 'Number of attempts in the campaign',
+    status VARCHAR(20) DEFAULT 'running' COMMENT 'Campaign status: running, completed, cancelled',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT 'Campaign creation timestamp',
+    finished_at DATETIME NULL COMMENT 'When the last attempt finished',
+    
+    INDEX idx_status (status),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Outbound dialing campaigns';
+
+-- Campaign attempts table - one row per number dialed by a campaign
+CREATE TABLE IF NOT EXISTS campaign_attempts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    campaign_id VARCHAR(50) NOT NULL COMMENT 'Campaign this attempt belongs to',
+    seq INT NOT NULL COMMENT 'Position of the number within the campaign',
+    phone_number VARCHAR(20) NOT NULL COMMENT 'Number dialed',
+    status VARCHAR(20) DEFAULT 'pending' COMMENT 'pending, dialing, answered, completed, busy, no_answer, congestion, failed, timeout, cancelled',
+    reason VARCHAR(100) NULL COMMENT 'Failure reason or hangup cause',
+    unique_id VARCHAR(50) NULL COMMENT 'Asterisk Uniqueid of the originated channel',
+    attempted_at DATETIME NULL COMMENT 'When the originate was sent',
+    answered_at DATETIME NULL COMMENT 'When the called party answered',
+    ended_at DATETIME NULL COMMENT 'When the attempt reached a final status',
+    
+    UNIQUE KEY uk_campaign_seq (campaign_id, seq),
+    INDEX idx_campaign_status (campaign_id, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Per-number outcomes of outbound campaigns';
+
 -- Insert default incident categories
 INSERT INTO incident_categories (name, description, color, icon) VALUES
 ('Medical Emergency', 'Medical emergencies requiring immediate attention', '#dc3545', 'fa-ambulance'),
@@ -225,8 +301,12 @@ ALTER TABLE incidents COMMENT = 'Stores incident reports generated from calls';
 ALTER TABLE incident_categories COMMENT = 'Predefined categories for incident classification';
 ALTER TABLE call_recordings COMMENT = 'Detailed metadata for call recordings';
 ALTER TABLE call_statistics COMMENT = 'Daily aggregated call statistics';
+ALTER TABLE call_statistics_hourly COMMENT = 'Hourly aggregated call statistics';
+ALTER TABLE call_timeseries COMMENT = 'Call volume per 15 minutes';
 ALTER TABLE system_logs COMMENT = 'System activity and error logs';
 ALTER TABLE sip_channels COMMENT = 'SIP channel information and status';
+ALTER TABLE campaigns COMMENT = 'Outbound dialing campaigns';
+ALTER TABLE campaign_attempts COMMENT = 'Per-number outcomes of outbound campaigns';
 
 -- Show table creation summary
 SELECT 
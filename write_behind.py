@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for latency-sensitive inserts
+
+Callers hand rows to submit() and return immediately; a background thread
+collects them and writes multi-row batches with executemany(), which pymysql
+turns into a single INSERT ... VALUES (...), (...) statement. Batches flush when
+flush_size rows are waiting or the oldest row has waited flush_interval
+seconds. Batches that fail because MySQL is unreachable or a lock wait timed
+out are put back in front of newer rows and retried with exponential backoff,
+so a slow or restarting MySQL delays durability but never the caller. Any other
+error is taken to be in the data: the batch is split until the rows that fail
+on their own are isolated, the rest are written and the bad rows are logged and
+kept in dead_letters instead of blocking the queue forever.
+
+A caller that has to change a row that may not be written yet (ensure_written()
+timed out) hands the statement to defer(); the writer runs it on the same
+connection right after the row's batch commits, so the change is neither lost
+nor applied before the row exists.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import pymysql
+
+from db_pool import PoolTimeout
+
+
+# Lost/refused connections, server gone away, lock wait timeout, deadlock
+RETRYABLE_ERROR_CODES = {1040, 1053, 1205, 1213, 2002, 2003, 2006, 2013, 2055}
+
+
+def is_retryable(error):
+    """True for errors that say nothing about the rows themselves and are worth retrying"""
+    if isinstance(error, (PoolTimeout, ConnectionError, pymysql.err.InterfaceError)):
+        return True
+    if isinstance(error, pymysql.err.OperationalError):
+        return bool(error.args) and error.args[0] in RETRYABLE_ERROR_CODES
+    return False
+
+
+class WriteBehindQueue:
+    """Batch rows keyed by id into periodic executemany() writes, retrying on failure"""
+
+    def __init__(self, connection_factory, sql, flush_size=100, flush_interval=0.05,
+                 retry_base=0.5, retry_max=30, max_pending=10000, on_flushed=None,
+                 dead_letter_size=1000, logger=None, name="Write-Behind"):
+        self.connection_factory = connection_factory
+        self.sql = sql
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        # Oldest rows are dropped (and counted) past this, rather than growing without bound
+        self.max_pending = max_pending
+        # Called with the keys of every batch once it is committed
+        self.on_flushed = on_flushed
+        self.logger = logger or logging.getLogger(__name__)
+        self.name = name
+        self.running = False
+
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_failures = 0
+        self.rows_dropped = 0
+        self.rows_rejected = 0
+        # (key, row, error) for rows the database refused; newest kept, oldest dropped
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.last_error = None
+        self.last_flush_ms = None
+
+        self._pending = OrderedDict()   # key -> row, oldest first
+        self._inflight = {}             # key -> row currently being written
+        self._deferred = {}             # key -> [(sql, params)] to run once the row is written
+        self._oldest_at = None
+        self._flush_now = False
+        self._failures_in_row = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread"""
+        if self.running:
+            return True
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"{self.name}-Thread")
+        self._thread.start()
+        self.logger.info(f"{self.name} queue started (batch {self.flush_size}, "
+                         f"interval {int(self.flush_interval * 1000)}ms)")
+        return True
+
+    def stop(self, timeout=5):
+        """Stop the writer after one last attempt to flush what is queued"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pending:
+            self._flush_batch()
+
+    def submit(self, key, row):
+        """Queue a row for writing; a newer row for the same key replaces the queued one"""
+        with self._cond:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                dropped_key, _row = self._pending.popitem(last=False)
+                self._deferred.pop(dropped_key, None)
+                self.rows_dropped += 1
+                self.logger.error(f"{self.name} queue full, dropped row for {dropped_key}")
+            self._pending[key] = row
+            if self._oldest_at is None:
+                self._oldest_at = time.monotonic()
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+
+    def ensure_written(self, key, timeout=2):
+        """Flush now and wait until the row for key is committed; True if it is (or was never queued)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if key not in self._pending and key not in self._inflight:
+                return True
+            self._flush_now = True
+            self._cond.notify_all()
+            while key in self._pending or key in self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def defer(self, key, sql, params=None):
+        """Run sql right after the queued row for key is written; False if it is not queued (run it yourself)"""
+        with self._cond:
+            if key not in self._pending and key not in self._inflight:
+                return False
+            self._deferred.setdefault(key, []).append((sql, params))
+            return True
+
+    def is_pending(self, key):
+        with self._cond:
+            return key in self._pending or key in self._inflight
+
+    def metrics(self):
+        """Queue depth and write counters"""
+        with self._cond:
+            pending = len(self._pending) + len(self._inflight)
+            oldest_ms = int((time.monotonic() - self._oldest_at) * 1000) if self._oldest_at else 0
+        return {
+            'running': self.running,
+            'pending_rows': pending,
+            'oldest_pending_ms': oldest_ms,
+            'rows_written': self.rows_written,
+            'batches_written': self.batches_written,
+            'write_failures': self.write_failures,
+            'rows_dropped': self.rows_dropped,
+            'rows_rejected': self.rows_rejected,
+            'last_flush_ms': self.last_flush_ms,
+            'last_error': self.last_error
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and not self._due():
+                    if self._pending:
+                        wait = self.flush_interval - (time.monotonic() - self._oldest_at)
+                        self._cond.wait(max(wait, 0.001))
+                    else:
+                        self._cond.wait()
+                if not self.running:
+                    return
+
+            if self._flush_batch():
+                self._failures_in_row = 0
+                continue
+
+            self._failures_in_row += 1
+            backoff = min(self.retry_max, self.retry_base * (2 ** (self._failures_in_row - 1)))
+            with self._cond:
+                self._cond.wait_for(lambda: not self.running, backoff)
+
+    def _due(self):
+        if not self._pending:
+            return False
+        return (self._flush_now or len(self._pending) >= self.flush_size
+                or time.monotonic() - self._oldest_at >= self.flush_interval)
+
+    def _flush_batch(self):
+        """Write up to flush_size queued rows in one statement; returns False if the write failed"""
+        with self._cond:
+            batch = []
+            while self._pending and len(batch) < self.flush_size:
+                batch.append(self._pending.popitem(last=False))
+            self._inflight = dict(batch)
+            self._oldest_at = time.monotonic() if self._pending else None
+            if not self._pending:
+                self._flush_now = False
+        if not batch:
+            return True
+
+        started = time.monotonic()
+        connection = None
+        try:
+            connection = self.connection_factory()
+            written, rejected = self._write(connection, batch)
+            self._run_deferred(connection, written)
+        except Exception as e:
+            self.write_failures += 1
+            self.last_error = str(e)
+            self.logger.error(f"{self.name} failed to write {len(batch)} rows, will retry: {e}")
+            with self._cond:
+                # Put the batch back ahead of newer rows, unless a key was resubmitted meanwhile
+                retry = OrderedDict((key, row) for key, row in batch if key not in self._pending)
+                retry.update(self._pending)
+                self._pending = retry
+                self._inflight = {}
+                self._oldest_at = self._oldest_at or started
+                self._cond.notify_all()
+            return False
+        finally:
+            if connection:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+        if rejected:
+            self.write_failures += 1
+            self.last_error = str(rejected[-1][2])
+            for key, row, error in rejected:
+                self.logger.error(f"{self.name} rejected row for {key}, not retrying: {error}")
+                with self._cond:
+                    dropped = self._deferred.pop(key, [])
+                    self._inflight.pop(key, None)
+                    self._cond.notify_all()
+                if dropped:
+                    self.logger.error(f"{self.name} dropped {len(dropped)} deferred statements for {key}")
+        batch = written
+        self.last_flush_ms = round((time.monotonic() - started) * 1000, 2)
+        with self._cond:
+            self._inflight = {}
+            self.rows_written += len(batch)
+            self.batches_written += 1
+            self.rows_rejected += len(rejected)
+            self.dead_letters.extend(rejected)
+            self._cond.notify_all()
+
+        if self.on_flushed and batch:
+            try:
+                self.on_flushed([key for key, _row in batch])
+            except Exception as e:
+                self.logger.error(f"{self.name} flush callback error: {e}")
+        return True
+
+    def _run_deferred(self, connection, written):
+        """Run statements deferred behind rows that are now committed, in the order they were deferred
+
+        A key leaves _inflight in the same critical section that finds its list
+        empty, so a later defer() either lands before that and is run here, or
+        after it and is told to run the statement itself.
+        """
+        for key, _row in written:
+            while True:
+                with self._cond:
+                    statements = self._deferred.get(key)
+                    if not statements:
+                        self._deferred.pop(key, None)
+                        self._inflight.pop(key, None)
+                        self._cond.notify_all()
+                        break
+                    sql, params = statements[0]
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql, params)
+                    connection.commit()
+                except Exception as e:
+                    try:
+                        connection.rollback()
+                    except Exception:
+                        pass
+                    if is_retryable(e):
+                        raise
+                    self.logger.error(f"{self.name} deferred statement for {key} failed, dropped: {e}")
+                with self._cond:
+                    statements.pop(0)
+
+    def _write(self, connection, batch):
+        """Write batch, splitting it around rows that fail for non-retryable reasons
+
+        Returns (written, rejected) with rejected as (key, row, error); a
+        retryable error is raised so the caller puts the whole batch back, halves
+        already committed included, so the statement must be idempotent (the call
+        writer's ON DUPLICATE KEY UPDATE is).
+        """
+        try:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, [row for _key, row in batch])
+            connection.commit()
+            return batch, []
+        except Exception as e:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            if is_retryable(e):
+                raise
+            if len(batch) == 1:
+                key, row = batch[0]
+                return [], [(key, row, e)]
+            error = e
+
+        self.logger.warning(f"{self.name} batch of {len(batch)} rows failed ({error}), splitting it")
+        middle = len(batch) // 2
+        written, rejected = self._write(connection, batch[:middle])
+        more_written, more_rejected = self._write(connection, batch[middle:])
+        return written + more_written, rejected + more_rejected